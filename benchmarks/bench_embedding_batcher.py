@@ -0,0 +1,67 @@
+"""
+Benchmark do agrupamento de embeddings (src/embedding_batcher.py)
+
+Usa a função de embedding falsa (src/fakes.py), sem acesso à rede, com uma
+latência simulada por chamada. Compara chamadas individuais com o
+BatchingEmbeddings em diferentes níveis de concorrência.
+
+Uso:
+    python benchmarks/bench_embedding_batcher.py --latency-ms 80 --wait-ms 10
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.embedding_batcher import BatchingEmbeddings
+from src.fakes import FakeEmbeddings
+
+
+def medir(embeddings, fake, concorrencia, total):
+    perguntas = [f"pergunta {i} sobre DMAIC" for i in range(total)]
+    latencias = []
+
+    def chamar(texto):
+        inicio = time.perf_counter()
+        embeddings.embed_query(texto)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+    chamadas_antes = fake.calls
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        list(executor.map(chamar, perguntas))
+    duracao = time.perf_counter() - inicio
+
+    return {
+        "throughput_qps": round(total / duracao, 1),
+        "p50_ms": round(float(np.percentile(latencias, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencias, 95)), 2),
+        "chamadas_api": fake.calls - chamadas_antes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Latência simulada por chamada à API")
+    parser.add_argument("--wait-ms", type=float, default=10.0, help="Janela de agrupamento")
+    parser.add_argument("--total", type=int, default=400, help="Perguntas por cenário")
+    args = parser.parse_args()
+
+    for concorrencia in (1, 8, 32, 128):
+        fake = FakeEmbeddings(latency_ms=args.latency_ms)
+        individual = medir(fake, fake, concorrencia, args.total)
+
+        fake = FakeEmbeddings(latency_ms=args.latency_ms)
+        batcher = BatchingEmbeddings(fake, max_wait_ms=args.wait_ms)
+        agrupado = medir(batcher, fake, concorrencia, args.total)
+
+        print(f"concorrência={concorrencia:<4} individual={individual}")
+        print(f"{'':17}agrupado={agrupado} lote_médio={batcher.stats()['avg_batch_size']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Microbenchmarks das etapas locais do processamento de perguntas
+
+Mede, sem chamadas à OpenAI (embeddings de src/fakes.py):
+- search_knowledge_base em bases sintéticas de diferentes tamanhos, nos
+  backends chroma e numpy e no modo híbrido, com e sem seleção por MMR
+- dividir_chunks (populate_db.py) em documentos de diferentes tamanhos
+- build_prompt com diferentes quantidades de chunks no contexto
+- serialização JSON (json da biblioteca padrão e src/http_encoding.py) e
+  compressão de respostas de diferentes tamanhos
+
+Os resultados são gravados em JSON (benchmarks/results/) para comparação
+com benchmarks/compare_results.py.
+
+Uso:
+    python benchmarks/bench_micro.py --tamanhos 100 1000 10000 --repeticoes 200
+"""
+import time
+import logging
+import argparse
+import tempfile
+
+from comum import corpus_sintetico, perguntas_sinteticas, criar_base_sintetica, percentis, salvar_resultados
+
+
+def medir(funcao, argumentos):
+    """Executa ``funcao`` para cada argumento e retorna os percentis e a vazão"""
+    latencias = []
+    for argumento in argumentos:
+        inicio = time.perf_counter()
+        funcao(argumento)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    resultado = percentis(latencias)
+    resultado["ops_s"] = round(1000 * len(latencias) / sum(latencias), 2) if sum(latencias) else 0.0
+    return resultado
+
+
+def bench_busca(tamanhos, repeticoes):
+    """search_knowledge_base por tamanho de base e backend"""
+    from langchain_chroma import Chroma
+    from src.fakes import FakeEmbeddings
+    from src.semantic_search import SemanticSearchService
+    from src.vector_index import NumpyVectorIndex
+    from src.lexical_index import LexicalIndex
+
+    embeddings = FakeEmbeddings()
+    resultados = {}
+    for tamanho in tamanhos:
+        textos = corpus_sintetico(tamanho)
+        perguntas = perguntas_sinteticas(textos, repeticoes)
+        vetores = embeddings.embed_documents(perguntas)
+
+        with tempfile.TemporaryDirectory() as pasta:
+            caminhos = criar_base_sintetica(pasta, textos, embeddings)
+            servico = SemanticSearchService()
+            servico.config.SIMILARITY_THRESHOLD = 0.0
+            servico.embedding_function = embeddings
+            servico.db = Chroma(persist_directory=caminhos["CHROMA_DB_PATH"], embedding_function=embeddings)
+            indice_numpy = NumpyVectorIndex.load(caminhos["NUMPY_INDEX_PATH"])
+            indice_lexical = LexicalIndex.load(caminhos["LEXICAL_INDEX_PATH"])
+
+            # Os cenários "+mmr" medem o custo da seleção por MMR (MMR_FETCH_K candidatos)
+            cenarios = {
+                "chroma": (None, None, False),
+                "chroma+mmr": (None, None, True),
+                "numpy": (indice_numpy, None, False),
+                "numpy+mmr": (indice_numpy, None, True),
+                "hybrid": (indice_numpy, indice_lexical, False),
+                "hybrid+mmr": (indice_numpy, indice_lexical, True),
+            }
+            for nome, (indice, lexical, mmr) in cenarios.items():
+                servico.vector_index, servico.lexical_index = indice, lexical
+                servico.config.MMR_ENABLED = mmr
+                # Aquecimento (primeira consulta abre a coleção e carrega páginas do disco)
+                servico.search_knowledge_base(perguntas[0], vetores[0])
+                resultado = medir(lambda i: servico.search_knowledge_base(perguntas[i], vetores[i]),
+                                  range(len(perguntas)))
+                resultados[f"search_knowledge_base/{nome}/chunks={tamanho}"] = resultado
+                print(f"search_knowledge_base {nome:<10} chunks={tamanho:<6} "
+                      f"p50={resultado['p50_ms']}ms p95={resultado['p95_ms']}ms")
+    return resultados
+
+
+def bench_chunks(tamanhos_documento, repeticoes):
+    """dividir_chunks por tamanho do documento (em caracteres)"""
+    from langchain_core.documents import Document
+    from populate_db import dividir_chunks
+
+    resultados = {}
+    for tamanho in tamanhos_documento:
+        texto = " ".join(corpus_sintetico(tamanho // 800 + 1))[:tamanho]
+        # Páginas de ~3000 caracteres, como as extraídas dos PDFs
+        paginas = [
+            Document(page_content=texto[inicio:inicio + 3000], metadata={"source": "sintetico.pdf", "page": i})
+            for i, inicio in enumerate(range(0, len(texto), 3000))
+        ]
+        vezes = max(3, repeticoes * 10_000 // tamanho)
+        resultado = medir(lambda _: dividir_chunks(paginas), range(vezes))
+        resultado["chunks"] = len(dividir_chunks(paginas))
+        resultado["mb_s"] = round(tamanho / 1e6 * resultado["ops_s"], 3)
+        resultados[f"dividir_chunks/caracteres={tamanho}"] = resultado
+        print(f"dividir_chunks caracteres={tamanho:<8} chunks={resultado['chunks']:<5} "
+              f"p50={resultado['p50_ms']}ms MB/s={resultado['mb_s']}")
+    return resultados
+
+
+def bench_prompt(quantidades, repeticoes):
+    """build_prompt por quantidade de chunks de 2000 caracteres no contexto"""
+    from src.semantic_search import SemanticSearchService
+
+    servico = SemanticSearchService()
+    textos = [texto[:2000] for texto in corpus_sintetico(max(quantidades), palavras_por_chunk=400)]
+    resultados = {}
+    for quantidade in quantidades:
+        contexto = textos[:quantidade]
+        resultado = medir(lambda _: servico.build_prompt("O que é DMAIC?", contexto), range(repeticoes))
+        resultados[f"build_prompt/chunks={quantidade}"] = resultado
+        print(f"build_prompt chunks={quantidade:<3} p50={resultado['p50_ms']}ms p95={resultado['p95_ms']}ms")
+    return resultados
+
+
+def bench_resposta(tamanhos_resposta, repeticoes):
+    """Serialização e compressão de respostas de /api/ask por tamanho (caracteres)"""
+    import json
+    from src.http_encoding import SUPPORTED_ENCODINGS, dumps, compress
+
+    texto = " ".join(corpus_sintetico(50, palavras_por_chunk=400))
+    resultados = {}
+    for tamanho in tamanhos_resposta:
+        resposta = {
+            "resposta": texto[:tamanho],
+            "status": "success",
+            "metadata": {"relevance_score": 0.8312, "sources_found": 4, "cache": "miss",
+                         "timings_ms": {"embedding": 120.5, "vector_search": 3.2, "llm": 2100.7}},
+        }
+        corpo = dumps(resposta)
+        cenarios = {
+            "json": lambda _: json.dumps(resposta).encode("utf-8"),
+            "http_encoding": lambda _: dumps(resposta),
+        }
+        for codificacao in SUPPORTED_ENCODINGS:
+            cenarios[codificacao] = lambda _, c=codificacao: compress(corpo, c)
+        for nome, funcao in cenarios.items():
+            resultado = medir(funcao, range(repeticoes))
+            resultado["bytes"] = len(funcao(None))
+            resultados[f"resposta/{nome}/caracteres={tamanho}"] = resultado
+            print(f"resposta {nome:<14} caracteres={tamanho:<6} bytes={resultado['bytes']:<6} "
+                  f"p50={resultado['p50_ms']}ms p95={resultado['p95_ms']}ms")
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Tamanhos da base (chunks) para search_knowledge_base")
+    parser.add_argument("--documentos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Tamanhos dos documentos (caracteres) para dividir_chunks")
+    parser.add_argument("--contextos", type=int, nargs="+", default=[1, 4, 16],
+                        help="Quantidades de chunks no prompt para build_prompt")
+    parser.add_argument("--respostas", type=int, nargs="+", default=[500, 4000, 20000],
+                        help="Tamanhos das respostas (caracteres) para serialização e compressão")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    parser.add_argument("--saida", help="Arquivo JSON de resultados")
+    args = parser.parse_args()
+
+    # Os logs por consulta do serviço distorceriam as medições
+    logging.getLogger("src.semantic_search").setLevel(logging.WARNING)
+
+    resultados = {}
+    resultados.update(bench_busca(args.tamanhos, args.repeticoes))
+    resultados.update(bench_chunks(args.documentos, args.repeticoes))
+    resultados.update(bench_prompt(args.contextos, args.repeticoes))
+    resultados.update(bench_resposta(args.respostas, args.repeticoes))
+
+    saida = salvar_resultados("bench_micro", vars(args), resultados, args.saida)
+    print(f"Resultados gravados em {saida}")
+
+
+if __name__ == "__main__":
+    main()
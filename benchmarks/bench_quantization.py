@@ -0,0 +1,168 @@
+"""
+Benchmark da quantização do índice NumPy (src/vector_index.py)
+
+Compara as buscas "none" (vetores float32), "int8" e "binary" (primeira
+passada nos códigos compactos e reordenação com os vetores exatos) com os
+resultados do Chroma na mesma base:
+- recall@k em relação ao top-k do Chroma e à busca exata
+- memória percorrida por busca (matriz float32 ou códigos) e tamanho em disco
+- latência p50/p95 de uma busca top-k
+
+A base "base" usa os PDFs da pasta base/ (chunks de populate_db.py, com os
+embeddings configurados para a ingestão); as bases "sintetico" usam vetores
+aleatórios normalizados de ``--dim`` dimensões, de vários tamanhos.
+
+Uso:
+    python benchmarks/bench_quantization.py --tamanhos 10000 100000 --fatores 4 10
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from comum import RAIZ, perguntas_sinteticas, criar_base_sintetica, percentis, salvar_resultados
+
+
+class EmbeddingsFixos:
+    """Embeddings já calculados, na interface usada por criar_base_sintetica"""
+
+    def __init__(self, textos, vetores):
+        self.vetores = dict(zip(textos, vetores))
+
+    def embed_documents(self, textos):
+        return [self.vetores[texto] for texto in textos]
+
+
+def carregar_base_pdfs(quantidade_perguntas):
+    """Chunks dos PDFs de base/, seus embeddings e perguntas sobre eles"""
+    from populate_db import carregar_pdf, dividir_chunks, criar_embeddings
+
+    pasta = os.path.join(RAIZ, "base")
+    paginas = []
+    for nome in sorted(os.listdir(pasta)):
+        if nome.endswith(".pdf"):
+            paginas.extend(carregar_pdf(os.path.join(pasta, nome))[1])
+    textos = list(dict.fromkeys(chunk.page_content for chunk in dividir_chunks(paginas)))
+
+    embeddings = criar_embeddings()
+    vetores = embeddings.embed_documents(textos)
+    perguntas = embeddings.embed_documents(perguntas_sinteticas(textos, quantidade_perguntas))
+    return textos, vetores, perguntas
+
+
+def base_sintetica(tamanho, dim, quantidade_perguntas):
+    """Vetores aleatórios e perguntas próximas de chunks sorteados"""
+    rng = np.random.default_rng(42)
+    vetores = rng.standard_normal((tamanho, dim), dtype=np.float32)
+    vetores /= np.linalg.norm(vetores, axis=1, keepdims=True)
+    perguntas = vetores[rng.integers(0, tamanho, quantidade_perguntas)] + 0.01 * rng.standard_normal(
+        (quantidade_perguntas, dim), dtype=np.float32)
+    return [f"Chunk {i}" for i in range(tamanho)], vetores.tolist(), perguntas.tolist()
+
+
+def tamanho_mb(*caminhos):
+    return round(sum(os.path.getsize(c) for c in caminhos if os.path.exists(c)) / 1e6, 3)
+
+
+def medir_base(nome, textos, vetores, perguntas, k, fatores):
+    """Recall, memória e latência de cada modo de quantização numa base"""
+    import chromadb
+    from src.vector_index import (
+        NumpyVectorIndex, VECTORS_FILENAME, INT8_CODES_FILENAME, INT8_SCALES_FILENAME, BINARY_CODES_FILENAME
+    )
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        caminhos = criar_base_sintetica(pasta, textos, EmbeddingsFixos(textos, vetores))
+        indice_path = caminhos["NUMPY_INDEX_PATH"]
+
+        # Referências: top-k do Chroma (HNSW) e da busca exata
+        colecao = chromadb.PersistentClient(path=caminhos["CHROMA_DB_PATH"]).get_collection("langchain")
+        latencias = []
+        referencia_chroma = []
+        for pergunta in perguntas:
+            inicio = time.perf_counter()
+            resposta = colecao.query(query_embeddings=[pergunta], n_results=k, include=[])
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            referencia_chroma.append(set(resposta["ids"][0]))
+        exato = NumpyVectorIndex.load(indice_path)
+        referencia_exata = [{d.id for d, _ in r} for r in exato.search_batch(perguntas, k)]
+        resultados[f"{nome}/chroma"] = {
+            **percentis(latencias),
+            "recall_exato": recall(referencia_chroma, referencia_exata),
+            "disco_mb": tamanho_mb(os.path.join(caminhos["CHROMA_DB_PATH"], "chroma.sqlite3")),
+        }
+        r = resultados[f"{nome}/chroma"]
+        print(f"{nome + '/chroma':<32} p50={r['p50_ms']}ms p95={r['p95_ms']}ms recall_exato={r['recall_exato']}")
+
+        arquivos = {
+            "none": [VECTORS_FILENAME],
+            "int8": [INT8_CODES_FILENAME, INT8_SCALES_FILENAME],
+            "binary": [BINARY_CODES_FILENAME],
+        }
+        for modo, nomes_arquivos in arquivos.items():
+            for fator in (fatores if modo != "none" else [1]):
+                indice = NumpyVectorIndex.load(indice_path, quantization=modo, rerank_factor=fator)
+                percorrido = indice.vectors if modo == "none" else indice.codes
+                indice.search_batch(perguntas[:1], k)  # aquecimento (páginas do mmap)
+
+                latencias = []
+                encontrados = []
+                for pergunta in perguntas:
+                    inicio = time.perf_counter()
+                    resultado = indice.search(pergunta, k)
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                    encontrados.append({d.id for d, _ in resultado})
+
+                caso = f"{nome}/{modo}" + (f"/fator={fator}" if modo != "none" else "")
+                resultados[caso] = {
+                    **percentis(latencias),
+                    "recall_chroma": recall(encontrados, referencia_chroma),
+                    "recall_exato": recall(encontrados, referencia_exata),
+                    "varrido_mb": round(percorrido.nbytes / 1e6, 3),
+                    "disco_mb": tamanho_mb(*[os.path.join(indice_path, n) for n in nomes_arquivos]),
+                }
+                r = resultados[caso]
+                print(f"{caso:<32} p50={r['p50_ms']}ms p95={r['p95_ms']}ms "
+                      f"recall_chroma={r['recall_chroma']} recall_exato={r['recall_exato']} "
+                      f"varrido={r['varrido_mb']}MB")
+    return resultados
+
+
+def recall(encontrados, referencias):
+    """Fração média dos ids de referência presentes nos resultados"""
+    valores = [len(e & r) / len(r) for e, r in zip(encontrados, referencias) if r]
+    return round(float(np.mean(valores)), 4) if valores else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="*", default=[10000],
+                        help="Tamanhos das bases sintéticas (chunks)")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--fatores", type=int, nargs="+", default=[4, 10],
+                        help="Valores de QUANTIZATION_RERANK_FACTOR")
+    parser.add_argument("--perguntas", type=int, default=200)
+    parser.add_argument("--sem-pdfs", action="store_true", help="Não medir a base dos PDFs de base/")
+    parser.add_argument("--saida", help="Arquivo JSON de resultados")
+    args = parser.parse_args()
+
+    resultados = {}
+    if not args.sem_pdfs:
+        textos, vetores, perguntas = carregar_base_pdfs(args.perguntas)
+        resultados.update(medir_base(f"base/chunks={len(textos)}", textos, vetores, perguntas,
+                                     args.k, args.fatores))
+    for tamanho in args.tamanhos:
+        textos, vetores, perguntas = base_sintetica(tamanho, args.dim, args.perguntas)
+        resultados.update(medir_base(f"sintetico/chunks={tamanho}", textos, vetores, perguntas,
+                                     args.k, args.fatores))
+
+    saida = salvar_resultados("bench_quantization", vars(args), resultados, args.saida)
+    print(f"Resultados gravados em {saida}")
+
+
+if __name__ == "__main__":
+    main()
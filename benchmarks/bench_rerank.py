@@ -0,0 +1,133 @@
+"""
+Benchmark da reordenação (rerank) dos resultados da busca (src/reranker.py)
+
+Para cada modo de rerank ("none", "lexical" e, se o sentence-transformers
+estiver instalado, "cross_encoder") busca ``--fetch-k`` candidatos no índice
+NumPy, reordena e envia ao modelo os ``--top-n`` melhores (sem rerank, os
+``--k`` primeiros da busca, como MAX_RESULTS). Mede:
+- acerto@N: fração das perguntas cujo chunk de origem está entre os enviados
+- MRR do chunk de origem na ordem final dos candidatos
+- tokens do contexto enviado ao modelo (média por pergunta)
+- latência p50/p95 do rerank com os scores ainda não calculados e com
+  os scores no cache (a mesma pergunta repetida)
+
+A base é sintética, com os embeddings simulados de src/fakes.py; cada
+pergunta é um trecho contínuo de ``--palavras`` palavras de um chunk
+sorteado (o chunk de origem).
+
+Uso:
+    python benchmarks/bench_rerank.py --tamanhos 1000 10000 --fetch-k 20 --top-n 3
+"""
+import time
+import random
+import argparse
+
+import numpy as np
+
+from comum import corpus_sintetico, percentis, salvar_resultados
+
+
+def perguntas_com_origem(textos, quantidade, palavras, semente=7):
+    """(pergunta, posição do chunk de origem) com trechos contínuos de chunks sorteados"""
+    rng = random.Random(semente)
+    perguntas = []
+    for _ in range(quantidade):
+        origem = rng.randrange(len(textos))
+        termos = textos[origem].rstrip(".").split()[2:]
+        inicio = rng.randrange(max(len(termos) - palavras, 1))
+        perguntas.append(("O que é " + " ".join(termos[inicio:inicio + palavras]) + "?", origem))
+    return perguntas
+
+
+def medir_modo(modo, indice, embeddings, perguntas, args):
+    """Qualidade, tokens e latência de um modo de rerank"""
+    from src.config import Config
+    from src.context_packer import count_tokens
+    from src.reranker import create_reranker
+
+    reranker = create_reranker(modo, Config.RERANK_MODEL, weight=args.peso, batch_size=args.lote)
+    vetores = embeddings.embed_documents([pergunta for pergunta, _ in perguntas])
+    candidatos = indice.search_batch(vetores, args.fetch_k)
+
+    acertos, reciprocos, tokens, frio, quente = 0, [], [], [], []
+    for (pergunta, origem), resultados in zip(perguntas, candidatos):
+        if reranker is not None:
+            inicio = time.perf_counter()
+            resultados = reranker.rerank(pergunta, resultados)
+            frio.append((time.perf_counter() - inicio) * 1000)
+            inicio = time.perf_counter()
+            reranker.rerank(pergunta, resultados)
+            quente.append((time.perf_counter() - inicio) * 1000)
+        enviados = resultados[:args.top_n if reranker is not None else args.k]
+
+        ids = [doc.id for doc, _ in resultados]
+        origem_id = f"chunk-{origem}"
+        acertos += origem_id in [doc.id for doc, _ in enviados]
+        reciprocos.append(1.0 / (ids.index(origem_id) + 1) if origem_id in ids else 0.0)
+        tokens.append(count_tokens("\n\n".join(doc.page_content for doc, _ in enviados)))
+
+    resultado = {
+        "acerto": round(acertos / len(perguntas), 4),
+        "mrr": round(float(np.mean(reciprocos)), 4),
+        "tokens_contexto": round(float(np.mean(tokens)), 1),
+    }
+    if frio:
+        resultado["rerank_frio"] = percentis(frio)
+        resultado["rerank_cache"] = percentis(quente)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000],
+                        help="Tamanhos das bases sintéticas (chunks)")
+    parser.add_argument("--perguntas", type=int, default=200)
+    parser.add_argument("--palavras", type=int, default=4, help="Palavras de cada pergunta")
+    parser.add_argument("--fetch-k", type=int, default=20, help="Candidatos avaliados pelo reranker")
+    parser.add_argument("--top-n", type=int, default=3, help="Chunks enviados ao modelo com rerank")
+    parser.add_argument("--k", type=int, default=4, help="Chunks enviados ao modelo sem rerank")
+    parser.add_argument("--peso", type=float, default=0.5, help="Peso do score do reranker (RERANK_WEIGHT)")
+    parser.add_argument("--lote", type=int, default=16, help="Pares avaliados por lote (RERANK_BATCH_SIZE)")
+    parser.add_argument("--modos", nargs="+", default=None,
+                        help="Modos de rerank (padrão: none, lexical e cross_encoder se instalado)")
+    parser.add_argument("--saida", help="Arquivo JSON de resultados")
+    args = parser.parse_args()
+
+    from src.fakes import FakeEmbeddings
+    from src.vector_index import NumpyVectorIndex
+
+    modos = args.modos
+    if modos is None:
+        modos = ["none", "lexical"]
+        try:
+            import sentence_transformers  # noqa: F401
+            modos.append("cross_encoder")
+        except ImportError:
+            print("sentence-transformers não instalado: modo cross_encoder ignorado")
+
+    embeddings = FakeEmbeddings()
+    resultados = {}
+    for tamanho in args.tamanhos:
+        textos = corpus_sintetico(tamanho)
+        vetores = np.asarray(embeddings.embed_documents(textos), dtype=np.float32)
+        indice = NumpyVectorIndex(vetores, [f"chunk-{i}" for i in range(tamanho)], textos,
+                                  [{"source": "sintetico.pdf", "page": i} for i in range(tamanho)])
+        perguntas = perguntas_com_origem(textos, args.perguntas, args.palavras)
+
+        for modo in modos:
+            resultado = medir_modo(modo, indice, embeddings, perguntas, args)
+            resultados[f"{modo}/chunks={tamanho}"] = resultado
+            latencia = ""
+            if "rerank_frio" in resultado:
+                latencia = (f" rerank p50={resultado['rerank_frio']['p50_ms']}ms "
+                            f"p95={resultado['rerank_frio']['p95_ms']}ms "
+                            f"cache p50={resultado['rerank_cache']['p50_ms']}ms")
+            print(f"{modo:<13} chunks={tamanho:<7} acerto={resultado['acerto']} mrr={resultado['mrr']} "
+                  f"tokens={resultado['tokens_contexto']}{latencia}")
+
+    saida = salvar_resultados("bench_rerank", vars(args), resultados, args.saida)
+    print(f"Resultados gravados em {saida}")
+
+
+if __name__ == "__main__":
+    main()
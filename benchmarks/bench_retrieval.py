@@ -0,0 +1,85 @@
+"""
+Benchmark dos backends de busca: Chroma x índice NumPy (src/vector_index.py)
+
+Gera corpora sintéticos de diferentes tamanhos com vetores normalizados,
+carrega os mesmos dados nos dois backends e mede a latência de uma busca
+top-k (p50/p95), além da concordância entre os resultados.
+
+Uso:
+    python benchmarks/bench_retrieval.py --tamanhos 1000 5000 20000 --dim 1536
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+import numpy as np
+from src.vector_index import NumpyVectorIndex
+
+
+def percentis(amostras):
+    return {
+        "p50_ms": round(float(np.percentile(amostras, 50)), 3),
+        "p95_ms": round(float(np.percentile(amostras, 95)), 3),
+    }
+
+
+def medir(funcao, consultas):
+    latencias = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        funcao(consulta)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return percentis(latencias)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--consultas", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    for tamanho in args.tamanhos:
+        vetores = rng.standard_normal((tamanho, args.dim), dtype=np.float32)
+        vetores /= np.linalg.norm(vetores, axis=1, keepdims=True)
+        ids = [f"chunk-{i}" for i in range(tamanho)]
+        textos = [f"texto {i}" for i in range(tamanho)]
+        consultas = vetores[rng.integers(0, tamanho, args.consultas)] + 0.01 * rng.standard_normal(
+            (args.consultas, args.dim), dtype=np.float32)
+        consultas = [c.tolist() for c in consultas]
+
+        with tempfile.TemporaryDirectory() as pasta:
+            colecao = chromadb.PersistentClient(path=pasta).get_or_create_collection("benchmark")
+            for inicio in range(0, tamanho, 5000):
+                colecao.add(
+                    ids=ids[inicio:inicio + 5000],
+                    embeddings=vetores[inicio:inicio + 5000],
+                    documents=textos[inicio:inicio + 5000]
+                )
+
+            indice = NumpyVectorIndex(vetores, ids, textos, [{} for _ in ids])
+            indice.save(os.path.join(pasta, "numpy_index"))
+            indice = NumpyVectorIndex.load(os.path.join(pasta, "numpy_index"))
+
+            resultado_chroma = medir(lambda c: colecao.query(query_embeddings=[c], n_results=args.k), consultas)
+            resultado_numpy = medir(lambda c: indice.search(c, args.k), consultas)
+
+            concordancia = np.mean([
+                set(colecao.query(query_embeddings=[c], n_results=args.k)["ids"][0])
+                == {doc.id for doc, _ in indice.search(c, args.k)}
+                for c in consultas[:50]
+            ])
+
+        print(f"chunks={tamanho:<6} chroma={resultado_chroma} numpy={resultado_numpy} "
+              f"mesmos_top{args.k}={concordancia:.0%}")
+
+
+if __name__ == "__main__":
+    main()
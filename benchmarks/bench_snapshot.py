@@ -0,0 +1,145 @@
+"""
+Benchmark da inicialização dos workers por backend de busca
+
+Para cada backend ("chroma", "numpy" e "snapshot") inicia ``--workers``
+processos novos ao mesmo tempo, como os workers do gunicorn, e mede em cada
+um:
+- tempo para abrir a base (Chroma, vectors.npy + chunks.json ou snapshot),
+  sem contar a importação dos módulos
+- latência da primeira busca e p50 das buscas seguintes
+- memória residente (RSS) e proporcional (PSS, que divide as páginas
+  compartilhadas entre os processos; apenas Linux) com todos os workers
+  abertos
+
+As bases são sintéticas, com os embeddings simulados de src/fakes.py.
+
+Uso:
+    python benchmarks/bench_snapshot.py --tamanhos 10000 50000 --workers 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from comum import RAIZ, corpus_sintetico, criar_base_sintetica, salvar_resultados
+
+BACKENDS = ("chroma", "numpy", "snapshot")
+
+# Executado em cada worker: abre a base, busca e espera os demais antes de medir a memória
+CODIGO_WORKER = """
+import json, os, sys, time
+import numpy as np
+backend, caminhos, perguntas, sinal = sys.argv[1], json.loads(sys.argv[2]), np.load(sys.argv[3]), sys.argv[4]
+
+# Importações fora da medição: o tempo de importação está em import_profile.py
+if backend == "chroma":
+    import chromadb
+else:
+    from src.vector_index import NumpyVectorIndex
+    from src.snapshot import load_snapshot
+
+inicio = time.perf_counter()
+if backend == "chroma":
+    colecao = chromadb.PersistentClient(path=caminhos["CHROMA_DB_PATH"]).get_collection("langchain")
+    buscar = lambda pergunta: colecao.query(query_embeddings=[pergunta.tolist()], n_results=4)
+elif backend == "numpy":
+    indice = NumpyVectorIndex.load(caminhos["NUMPY_INDEX_PATH"])
+    buscar = lambda pergunta: [d.page_content for d, _ in indice.search(pergunta, 4)]
+else:
+    indice = load_snapshot(caminhos["SNAPSHOT_PATH"])
+    buscar = lambda pergunta: [d.page_content for d, _ in indice.search(pergunta, 4)]
+aberto = time.perf_counter()
+buscar(perguntas[0])
+primeira = time.perf_counter()
+latencias = []
+for pergunta in perguntas[1:]:
+    t = time.perf_counter()
+    buscar(pergunta)
+    latencias.append((time.perf_counter() - t) * 1000)
+
+# Memória medida com todos os workers abertos (PSS divide as páginas compartilhadas)
+print("PRONTO", flush=True)
+while not os.path.exists(sinal):
+    time.sleep(0.01)
+memoria = {}
+try:
+    with open("/proc/self/smaps_rollup") as f:
+        for linha in f:
+            partes = linha.split()
+            if partes[0] in ("Rss:", "Pss:"):
+                memoria[partes[0][:-1].lower() + "_mb"] = round(int(partes[1]) / 1024, 1)
+except OSError:
+    pass
+print("RESULTADO " + json.dumps({
+    "abrir_ms": round((aberto - inicio) * 1000, 2),
+    "primeira_busca_ms": round((primeira - aberto) * 1000, 2),
+    "p50_ms": round(float(np.percentile(latencias, 50)), 3) if latencias else 0.0,
+    **memoria,
+}), flush=True)
+"""
+
+
+def medir_backend(backend, caminhos, arquivo_perguntas, workers, pasta):
+    """Inicia os workers ao mesmo tempo e retorna a média das medições"""
+    sinal = os.path.join(pasta, f"sinal-{backend}")
+    processos = [
+        subprocess.Popen(
+            [sys.executable, "-c", CODIGO_WORKER, backend, json.dumps(caminhos), arquivo_perguntas, sinal],
+            cwd=RAIZ, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(workers)
+    ]
+    for processo in processos:
+        processo.stdout.readline()  # PRONTO
+    open(sinal, "w").close()
+
+    medicoes = []
+    for processo in processos:
+        saida, _ = processo.communicate(timeout=600)
+        for linha in saida.splitlines():
+            if linha.startswith("RESULTADO "):
+                medicoes.append(json.loads(linha[len("RESULTADO "):]))
+    if len(medicoes) != workers:
+        raise RuntimeError(f"Falha nos workers do backend {backend}")
+    return {chave: round(float(np.mean([m[chave] for m in medicoes])), 3) for chave in medicoes[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10000],
+                        help="Tamanhos das bases sintéticas (chunks)")
+    parser.add_argument("--workers", type=int, default=4, help="Processos iniciados ao mesmo tempo")
+    parser.add_argument("--perguntas", type=int, default=50)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--saida", help="Arquivo JSON de resultados")
+    args = parser.parse_args()
+
+    from src.fakes import FakeEmbeddings
+
+    embeddings = FakeEmbeddings()
+    resultados = {}
+    for tamanho in args.tamanhos:
+        with tempfile.TemporaryDirectory() as pasta:
+            textos = corpus_sintetico(tamanho)
+            caminhos = criar_base_sintetica(pasta, textos, embeddings)
+            arquivo_perguntas = os.path.join(pasta, "perguntas.npy")
+            np.save(arquivo_perguntas, np.asarray(embeddings.embed_documents(textos[:args.perguntas]), dtype=np.float32))
+
+            for backend in args.backends:
+                resultado = medir_backend(backend, caminhos, arquivo_perguntas, args.workers, pasta)
+                resultados[f"{backend}/chunks={tamanho}"] = resultado
+                print(f"{backend:<9} chunks={tamanho:<7} abrir={resultado['abrir_ms']}ms "
+                      f"primeira={resultado['primeira_busca_ms']}ms p50={resultado['p50_ms']}ms "
+                      f"rss={resultado.get('rss_mb', '-')}MB pss={resultado.get('pss_mb', '-')}MB")
+
+    saida = salvar_resultados("bench_snapshot", vars(args), resultados, args.saida)
+    print(f"Resultados gravados em {saida}")
+
+
+if __name__ == "__main__":
+    main()
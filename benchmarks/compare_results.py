@@ -0,0 +1,78 @@
+"""
+Compara dois arquivos de resultados de benchmark (load_test ou bench_micro)
+
+Para cada caso presente nos dois arquivos, compara as métricas de latência
+(``*_ms``, quanto menor melhor) e de vazão (``throughput_rps``, ``ops_s`` e
+``mb_s``, quanto maior melhor). Variações piores que a tolerância são
+listadas como regressões e o script termina com código 1, o que permite
+usá-lo em CI.
+
+Uso:
+    python benchmarks/compare_results.py results/base.json results/novo.json --tolerancia 0.15
+"""
+import sys
+import json
+import argparse
+
+METRICAS_VAZAO = ("throughput_rps", "ops_s", "mb_s")
+
+
+def metricas(caso, prefixo=""):
+    """Achata {métrica: valor} incluindo as etapas aninhadas (etapas/embedding/p95_ms)"""
+    valores = {}
+    for nome, valor in caso.items():
+        if isinstance(valor, dict):
+            valores.update(metricas(valor, f"{prefixo}{nome}/"))
+        elif isinstance(valor, (int, float)) and (nome.endswith("_ms") or nome in METRICAS_VAZAO):
+            valores[prefixo + nome] = float(valor)
+    return valores
+
+
+def comparar(base, novo, tolerancia):
+    """
+    Returns:
+        Lista de (caso, métrica, valor base, valor novo, variação, regressão)
+    """
+    linhas = []
+    for caso in sorted(set(base) & set(novo)):
+        antes, depois = metricas(base[caso]), metricas(novo[caso])
+        for metrica in sorted(set(antes) & set(depois)):
+            if antes[metrica] == 0:
+                continue
+            variacao = (depois[metrica] - antes[metrica]) / antes[metrica]
+            maior_melhor = metrica.rsplit("/", 1)[-1] in METRICAS_VAZAO
+            regressao = -variacao > tolerancia if maior_melhor else variacao > tolerancia
+            linhas.append((caso, metrica, antes[metrica], depois[metrica], variacao, regressao))
+    return linhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("novo")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Variação aceita (0.10 = 10%%)")
+    parser.add_argument("--todas", action="store_true", help="Listar também as métricas sem regressão")
+    args = parser.parse_args()
+
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.novo, "r", encoding="utf-8") as f:
+        novo = json.load(f)
+
+    if base.get("benchmark") != novo.get("benchmark"):
+        print(f"⚠️ Benchmarks diferentes: {base.get('benchmark')} x {novo.get('benchmark')}")
+    print(f"Base: {base.get('git_commit')} ({base.get('timestamp')})  Novo: {novo.get('git_commit')} ({novo.get('timestamp')})")
+
+    linhas = comparar(base["resultados"], novo["resultados"], args.tolerancia)
+    regressoes = [linha for linha in linhas if linha[5]]
+    for caso, metrica, antes, depois, variacao, regressao in linhas:
+        if regressao or args.todas:
+            marcador = "❌" if regressao else "  "
+            print(f"{marcador} {caso} {metrica}: {antes:g} -> {depois:g} ({variacao:+.1%})")
+
+    print(f"{len(linhas)} métricas comparadas, {len(regressoes)} regressões acima de {args.tolerancia:.0%}")
+    sys.exit(1 if regressoes else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Funções compartilhadas pelos benchmarks
+
+Corpus e perguntas sintéticos (determinísticos pela semente), criação de uma
+base de conhecimento local com os embeddings simulados de src/fakes.py e
+gravação dos resultados em JSON para comparação entre versões
+(ver benchmarks/compare_results.py).
+"""
+import os
+import sys
+import json
+import random
+import platform
+import subprocess
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "results")
+
+VOCABULARIO = """
+processo controle qualidade defeito variação medição capacidade projeto
+cliente requisito amostra média desvio limite especificação causa raiz
+melhoria análise dados indicador meta produção falha risco fornecedor
+custo ciclo tempo etapa mapa fluxo valor desperdício estoque inspeção
+auditoria padrão procedimento equipe líder patrocinador escopo cronograma
+benefício ganho financeiro estatística hipótese teste regressão correlação
+gráfico histograma pareto diagrama ishikawa carta tendência estabilidade
+sigma dmaic definir medir analisar melhorar controlar belt green black
+""".split()
+
+
+def corpus_sintetico(tamanho, palavras_por_chunk=120, semente=42):
+    """Lista de ``tamanho`` textos com palavras do vocabulário de Seis Sigma"""
+    rng = random.Random(semente)
+    textos = []
+    for i in range(tamanho):
+        palavras = [rng.choice(VOCABULARIO) for _ in range(palavras_por_chunk)]
+        textos.append(f"Seção {i}. " + " ".join(palavras) + ".")
+    return textos
+
+
+def perguntas_sinteticas(textos, quantidade, palavras=6, semente=7):
+    """Perguntas formadas por palavras de chunks sorteados do corpus"""
+    rng = random.Random(semente)
+    perguntas = []
+    for _ in range(quantidade):
+        termos = [t for t in rng.choice(textos).split() if t.isalpha()]
+        perguntas.append("O que é " + " ".join(rng.sample(termos, min(palavras, len(termos)))) + "?")
+    return perguntas
+
+
+def criar_base_sintetica(pasta, textos, embeddings):
+    """
+    Cria a base Chroma e os índices NumPy e lexical em ``pasta``
+
+    Returns:
+        Dicionário com os caminhos no formato das variáveis de ambiente da API
+        (CHROMA_DB_PATH, NUMPY_INDEX_PATH, SNAPSHOT_PATH, LEXICAL_INDEX_PATH)
+    """
+    import chromadb
+    from src.kb_version import bump_kb_version
+    from src.vector_index import NumpyVectorIndex
+    from src.snapshot import save_snapshot
+    from src.lexical_index import LexicalIndex
+
+    caminhos = {
+        "CHROMA_DB_PATH": os.path.join(pasta, "db"),
+        "NUMPY_INDEX_PATH": os.path.join(pasta, "db", "numpy_index"),
+        "SNAPSHOT_PATH": os.path.join(pasta, "db", "kb_snapshot.bin"),
+        "LEXICAL_INDEX_PATH": os.path.join(pasta, "db", "lexical_index"),
+    }
+    ids = [f"chunk-{i}" for i in range(len(textos))]
+    metadados = [{"source": f"sintetico/{i // 10}.pdf", "page": i % 10, "start_index": 0} for i in range(len(textos))]
+
+    # Mesma coleção que o langchain_chroma abre por padrão
+    colecao = chromadb.PersistentClient(path=caminhos["CHROMA_DB_PATH"]).get_or_create_collection("langchain")
+    for inicio in range(0, len(textos), 1000):
+        fim = inicio + 1000
+        colecao.upsert(
+            ids=ids[inicio:fim],
+            embeddings=embeddings.embed_documents(textos[inicio:fim]),
+            documents=textos[inicio:fim],
+            metadatas=metadados[inicio:fim]
+        )
+
+    versao = bump_kb_version(caminhos["CHROMA_DB_PATH"])
+    indice = NumpyVectorIndex.from_chroma(caminhos["CHROMA_DB_PATH"], version=versao)
+    indice.save(caminhos["NUMPY_INDEX_PATH"])
+    save_snapshot(indice, caminhos["SNAPSHOT_PATH"])
+    LexicalIndex.build(indice.ids, indice.texts, indice.metadatas).save(caminhos["LEXICAL_INDEX_PATH"])
+    return caminhos
+
+
+def percentis(amostras_ms):
+    """p50/p95/p99 e média de uma lista de latências em milissegundos"""
+    if not amostras_ms:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+    p50, p95, p99 = np.percentile(amostras_ms, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(np.mean(amostras_ms)), 3),
+    }
+
+
+def versao_git():
+    """Commit atual do repositório, se disponível"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def salvar_resultados(nome, parametros, resultados, saida=None):
+    """
+    Grava os resultados de um benchmark em JSON
+
+    Args:
+        nome: Nome do benchmark
+        parametros: Parâmetros usados na execução
+        resultados: {caso: {métrica: valor}}, comparável entre execuções
+        saida: Caminho do arquivo (padrão: benchmarks/results/<nome>-<data>.json)
+
+    Returns:
+        Caminho do arquivo gravado
+    """
+    if saida is None:
+        os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+        saida = os.path.join(PASTA_RESULTADOS, f"{nome}-{datetime.now():%Y%m%d-%H%M%S}.json")
+
+    documento = {
+        "benchmark": nome,
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_commit": versao_git(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parametros": parametros,
+        "resultados": resultados,
+    }
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(documento, f, ensure_ascii=False, indent=2)
+    return saida
@@ -0,0 +1,119 @@
+"""
+Perfil do tempo de importação e de inicialização da aplicação
+
+Importa ``src.main`` (ou outro módulo) num processo novo com
+``python -X importtime`` e agrega o tempo por pacote de primeiro nível,
+listando os pacotes e módulos que mais custam. Mede também o tempo até a
+aplicação estar importada (pronta para aceitar conexões) e até o serviço
+de busca ficar pronto (/api/ready), com o tempo de cada etapa da
+inicialização.
+
+Uso:
+    python benchmarks/import_profile.py --top 15
+    UPSTREAM_PROVIDER=fake python benchmarks/import_profile.py --modulo src.asgi
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+from comum import RAIZ, salvar_resultados
+
+LINHA_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+CODIGO_MEDICAO = """
+import json, sys, time
+inicio = time.perf_counter()
+modulo = __import__({modulo!r}, fromlist=["app"])
+importado = time.perf_counter()
+from src.semantic_search import semantic_service
+pronto = semantic_service.wait_until_ready({timeout})
+fim = time.perf_counter()
+print("RESULTADO " + json.dumps({{
+    "import_ms": round((importado - inicio) * 1000, 2),
+    "ready_ms": round((fim - inicio) * 1000, 2),
+    "pronto": pronto,
+    "startup": semantic_service.startup.snapshot(),
+}}))
+"""
+
+
+def perfil_importacao(modulo, timeout):
+    """
+    Executa a importação num processo novo com -X importtime
+
+    Returns:
+        Tupla (medições do processo, [(módulo, próprio µs, acumulado µs, profundidade)])
+    """
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CODIGO_MEDICAO.format(modulo=modulo, timeout=timeout)],
+        cwd=RAIZ, capture_output=True, text=True, timeout=timeout + 60
+    )
+    medicoes = None
+    for linha in processo.stdout.splitlines():
+        if linha.startswith("RESULTADO "):
+            medicoes = json.loads(linha[len("RESULTADO "):])
+    if medicoes is None:
+        raise RuntimeError(f"Falha ao importar {modulo}:\n{processo.stderr[-2000:]}")
+
+    modulos = []
+    for linha in processo.stderr.splitlines():
+        encontrado = LINHA_IMPORTTIME.match(linha)
+        if encontrado:
+            proprio, acumulado, recuo, nome = encontrado.groups()
+            modulos.append((nome, int(proprio), int(acumulado), len(recuo) // 2))
+    return medicoes, modulos
+
+
+def por_pacote(modulos):
+    """Tempo próprio somado por pacote de primeiro nível, em ms"""
+    pacotes = defaultdict(int)
+    for nome, proprio, _, _ in modulos:
+        pacotes[nome.split(".")[0]] += proprio
+    return {pacote: round(us / 1000, 2) for pacote, us in pacotes.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modulo", default="src.main", help="Módulo da aplicação a importar")
+    parser.add_argument("--top", type=int, default=15, help="Quantidade de pacotes e módulos listados")
+    parser.add_argument("--timeout", type=float, default=120, help="Espera máxima pelo serviço pronto (s)")
+    parser.add_argument("--saida", help="Arquivo JSON de resultados")
+    args = parser.parse_args()
+
+    medicoes, modulos = perfil_importacao(args.modulo, args.timeout)
+    pacotes = por_pacote(modulos)
+
+    print(f"Importação de {args.modulo}: {medicoes['import_ms']}ms; serviço pronto em {medicoes['ready_ms']}ms "
+          f"({'ok' if medicoes['pronto'] else medicoes['startup'].get('status')})")
+    for etapa, duracao in medicoes["startup"]["steps_ms"].items():
+        print(f"  etapa {etapa:<14} {duracao:>9.1f}ms")
+
+    print(f"\nPacotes com maior tempo de importação (tempo próprio somado):")
+    for pacote, ms in sorted(pacotes.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:>9.1f}ms  {pacote}")
+
+    print(f"\nMódulos com maior tempo acumulado importados diretamente pela aplicação:")
+    raiz = args.modulo.split(".")[0]
+    diretos = [m for m in modulos if m[0].startswith(raiz + ".") or m[3] <= 1]
+    for nome, _, acumulado, _ in sorted(diretos, key=lambda m: -m[2])[:args.top]:
+        print(f"  {acumulado / 1000:>9.1f}ms  {nome}")
+
+    resultados = {
+        "aplicacao": {
+            "import_ms": medicoes["import_ms"],
+            "ready_ms": medicoes["ready_ms"],
+            "etapas": {f"{etapa}_ms": duracao for etapa, duracao in medicoes["startup"]["steps_ms"].items()},
+        },
+        "pacotes": {f"{pacote}_ms": ms for pacote, ms in sorted(pacotes.items(), key=lambda item: -item[1])[:args.top]},
+    }
+    parametros = {**vars(args), "startup_mode": os.getenv("STARTUP_MODE", "background")}
+    saida = salvar_resultados("import_profile", parametros, resultados, args.saida)
+    print(f"\nResultados gravados em {saida}")
+
+
+if __name__ == "__main__":
+    main()
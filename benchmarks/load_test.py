@@ -0,0 +1,235 @@
+"""
+Teste de carga da API com modelos simulados, sem chamadas à OpenAI
+
+Cria uma base de conhecimento sintética, sobe a aplicação (create_app) com
+UPSTREAM_PROVIDER=fake, cujos embeddings e modelo de chat têm latência
+artificial configurável, e dispara um conjunto de perguntas contra
+/api/ask em cada nível de concorrência. Para cada nível são medidos vazão,
+percentis de latência e o tempo de cada etapa (metadata.timings_ms), e o
+resultado é gravado em JSON (benchmarks/results/).
+
+Uso:
+    python benchmarks/load_test.py --concorrencia 1 8 32 --requisicoes 200
+    python benchmarks/load_test.py --servidor wsgi --stream
+    python benchmarks/load_test.py --url http://localhost:5000 --concorrencia 16
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from comum import corpus_sintetico, perguntas_sinteticas, criar_base_sintetica, percentis, salvar_resultados
+
+
+def configurar_ambiente(args, pasta):
+    """Cria a base sintética e aponta a configuração da API para ela"""
+    from src.fakes import FakeEmbeddings
+
+    textos = corpus_sintetico(args.chunks)
+    caminhos = criar_base_sintetica(pasta, textos, FakeEmbeddings())
+    os.environ.update(caminhos)
+    os.environ.update({
+        "UPSTREAM_PROVIDER": "fake",
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.latencia_embedding_ms),
+        "FAKE_LLM_FIRST_TOKEN_MS": str(args.latencia_llm_ms),
+        "FAKE_LLM_TOKEN_MS": str(args.latencia_token_ms),
+        "FAKE_LLM_RESPONSE_TOKENS": str(args.tokens),
+        # Estado persistente na pasta temporária: nada de execuções anteriores
+        # (cache, FAQ ou resultados da coalescência) entra nas medições
+        "EMBEDDING_CACHE_PATH": os.path.join(pasta, "cache", "embeddings.sqlite3"),
+        "SINGLEFLIGHT_LOCK_DIR": os.path.join(pasta, "cache", "singleflight"),
+        "SESSION_STORE_PATH": os.path.join(pasta, "cache", "sessions.sqlite3"),
+        "FAQ_INDEX_PATH": os.path.join(pasta, "db", "faq_index"),
+        "ANSWER_CACHE_ENABLED": "true" if args.com_cache else "false",
+        "EMBEDDING_CACHE_ENABLED": "true" if args.com_cache else "false",
+        "RETRIEVAL_BACKEND": args.backend,
+        "RETRIEVAL_MODE": args.modo_busca,
+        "SIMILARITY_THRESHOLD": str(args.threshold),
+        "RATE_LIMIT_ENABLED": "false",
+    })
+    return textos
+
+
+def ler_resposta(corpo, stream):
+    """Extrai os metadados (timings e cache) da resposta JSON ou SSE"""
+    if not stream:
+        dados = json.loads(corpo)
+        metadados = dados.get("metadata", {})
+        return metadados.get("timings_ms"), metadados.get("cache")
+
+    timings, cache = None, None
+    for bloco in corpo.split("\n\n"):
+        linhas = dict(linha.split(": ", 1) for linha in bloco.splitlines() if ": " in linha)
+        if linhas.get("event") == "metadata":
+            cache = json.loads(linhas["data"]).get("cache")
+        elif linhas.get("event") == "done":
+            timings = json.loads(linhas["data"]).get("timings_ms")
+    return timings, cache
+
+
+async def executar_async(cliente, perguntas, concorrencia, stream):
+    """Dispara as perguntas com no máximo ``concorrencia`` em andamento"""
+    rota = "/api/ask/stream" if stream else "/api/ask"
+    fila = asyncio.Queue()
+    for pergunta in perguntas:
+        fila.put_nowait(pergunta)
+    medidas = []
+
+    async def trabalhador():
+        while not fila.empty():
+            pergunta = fila.get_nowait()
+            inicio = time.perf_counter()
+            try:
+                resposta = await cliente.post(rota, json={"pergunta": pergunta})
+                sucesso = resposta.status_code == 200
+                timings, cache = ler_resposta(resposta.text, stream) if sucesso else (None, None)
+            except Exception:
+                sucesso, timings, cache = False, None, None
+            medidas.append(((time.perf_counter() - inicio) * 1000, sucesso, timings, cache))
+
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    return medidas
+
+
+def executar_wsgi(flask_app, perguntas, concorrencia, stream):
+    """Mesmo disparo contra a aplicação Flask, com uma thread por cliente"""
+    rota = "/api/ask/stream" if stream else "/api/ask"
+    local = threading.local()
+
+    def enviar(pergunta):
+        if not hasattr(local, "cliente"):
+            local.cliente = flask_app.test_client()
+        inicio = time.perf_counter()
+        try:
+            resposta = local.cliente.post(rota, json={"pergunta": pergunta})
+            sucesso = resposta.status_code == 200
+            timings, cache = ler_resposta(resposta.get_data(as_text=True), stream) if sucesso else (None, None)
+        except Exception:
+            sucesso, timings, cache = False, None, None
+        return (time.perf_counter() - inicio) * 1000, sucesso, timings, cache
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        return list(executor.map(enviar, perguntas))
+
+
+def resumir(medidas, duracao):
+    """Vazão, percentis de latência e tempo por etapa de um nível de concorrência"""
+    latencias = [latencia for latencia, sucesso, _, _ in medidas if sucesso]
+    etapas = {}
+    for _, sucesso, timings, _ in medidas:
+        for etapa, valor in (timings or {}).items():
+            etapas.setdefault(etapa, []).append(valor)
+
+    return {
+        "requisicoes": len(medidas),
+        "erros": sum(1 for _, sucesso, _, _ in medidas if not sucesso),
+        "throughput_rps": round(len(latencias) / duracao, 2) if duracao else 0.0,
+        **percentis(latencias),
+        "cache": dict(Counter(cache for _, sucesso, _, cache in medidas if sucesso and cache)),
+        "etapas": {etapa: percentis(valores) for etapa, valores in sorted(etapas.items())},
+    }
+
+
+def registrar_nivel(resultados, args, concorrencia, medidas, duracao):
+    """Resume um nível de concorrência, guarda em ``resultados`` e imprime a linha"""
+    modo = "url" if args.url else args.servidor
+    resumo = resumir(medidas, duracao)
+    resultados[f"{modo}/{'stream' if args.stream else 'json'}/c={concorrencia}"] = resumo
+    print(f"concorrencia={concorrencia:<4} rps={resumo['throughput_rps']:<8} "
+          f"p50={resumo['p50_ms']}ms p95={resumo['p95_ms']}ms p99={resumo['p99_ms']}ms "
+          f"erros={resumo['erros']}")
+
+
+def medir_niveis(medir, distintas, perguntas, args):
+    """Executa o aquecimento e cada nível de concorrência (servidor WSGI)"""
+    # Aquecimento: primeira consulta ao Chroma, conexões e caches de processo
+    medir(distintas[:5], 1)
+    resultados = {}
+    for concorrencia in args.concorrencia:
+        inicio = time.perf_counter()
+        medidas = medir(perguntas, concorrencia)
+        registrar_nivel(resultados, args, concorrencia, medidas, time.perf_counter() - inicio)
+    return resultados
+
+
+async def medir_niveis_async(cliente, distintas, perguntas, args):
+    """Executa o aquecimento e cada nível de concorrência (ASGI ou servidor externo)"""
+    await executar_async(cliente, distintas[:5], 1, args.stream)
+    resultados = {}
+    for concorrencia in args.concorrencia:
+        inicio = time.perf_counter()
+        medidas = await executar_async(cliente, perguntas, concorrencia, args.stream)
+        registrar_nivel(resultados, args, concorrencia, medidas, time.perf_counter() - inicio)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requisicoes", type=int, default=200, help="Requisições por nível de concorrência")
+    parser.add_argument("--perguntas-distintas", type=int, default=100)
+    parser.add_argument("--arquivo-perguntas", help="Arquivo com uma pergunta por linha (substitui as sintéticas)")
+    parser.add_argument("--servidor", choices=["asgi", "wsgi"], default="asgi")
+    parser.add_argument("--stream", action="store_true", help="Usar /api/ask/stream (SSE)")
+    parser.add_argument("--url", help="Testar um servidor já em execução em vez de subir a aplicação")
+    parser.add_argument("--chunks", type=int, default=1000, help="Tamanho da base sintética")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--modo-busca", choices=["vector", "hybrid"], default="vector")
+    parser.add_argument("--threshold", type=float, default=0.0)
+    parser.add_argument("--latencia-embedding-ms", type=float, default=20.0)
+    parser.add_argument("--latencia-llm-ms", type=float, default=300.0, help="Latência até o primeiro token")
+    parser.add_argument("--latencia-token-ms", type=float, default=10.0)
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens por resposta simulada")
+    parser.add_argument("--com-cache", action="store_true", help="Manter os caches de respostas e de embeddings ligados")
+    parser.add_argument("--saida", help="Arquivo JSON de resultados")
+    args = parser.parse_args()
+
+    import httpx
+
+    with tempfile.TemporaryDirectory() as pasta:
+        textos = corpus_sintetico(args.chunks) if args.url else configurar_ambiente(args, pasta)
+        if args.arquivo_perguntas:
+            with open(args.arquivo_perguntas, "r", encoding="utf-8") as f:
+                distintas = [linha.strip() for linha in f if linha.strip()]
+        else:
+            distintas = perguntas_sinteticas(textos, args.perguntas_distintas)
+        perguntas = [distintas[i % len(distintas)] for i in range(args.requisicoes)]
+
+        flask_app = asgi_app = None
+        if not args.url:
+            # Importado só agora: a configuração é lida do ambiente na importação
+            from src.main import app as flask_app
+            from src.asgi import app as asgi_app
+            from src.semantic_search import semantic_service
+            # A inicialização em segundo plano não entra nas medições
+            semantic_service.wait_until_ready()
+
+        modo = "url" if args.url else args.servidor
+        if modo == "wsgi":
+            resultados = medir_niveis(
+                lambda lote, concorrencia: executar_wsgi(flask_app, lote, concorrencia, args.stream),
+                distintas, perguntas, args
+            )
+        else:
+            async def rodar():
+                # Um único event loop para todos os níveis (o semáforo da aplicação ASGI é ligado a ele)
+                if args.url:
+                    cliente = httpx.AsyncClient(base_url=args.url, timeout=120)
+                else:
+                    cliente = httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app),
+                                                base_url="http://benchmark", timeout=120)
+                async with cliente:
+                    return await medir_niveis_async(cliente, distintas, perguntas, args)
+            resultados = asyncio.run(rodar())
+
+    saida = salvar_resultados("load_test", vars(args), resultados, args.saida)
+    print(f"Resultados gravados em {saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+import multiprocessing
+
+# Configuração de produção: workers Uvicorn servindo a aplicação ASGI
+# (src/asgi.py), que atende /api/ask de forma assíncrona.
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+
+# Geração de respostas pode levar dezenas de segundos
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv('LOG_LEVEL', 'info')
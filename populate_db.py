@@ -1,25 +1,67 @@
 import os
+import re
 import sys
+import json
+import time
+import random
+import hashlib
+import argparse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 # Adicionar o diretório src ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma.vectorstores import Chroma
+import chromadb
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from langchain.schema import Document
+from langchain_core.documents import Document
 from src.config import Config
+from src.kb_version import bump_kb_version, read_kb_version
+from src.embedding_cache import CachedEmbeddings
+from src.vector_index import NumpyVectorIndex
+from src.snapshot import save_snapshot
+from src.lexical_index import LexicalIndex
+from src.fakes import FakeEmbeddings
+from src.context_packer import count_tokens
+from src.faq_store import FaqStore
+from src.answer_cache import normalize_question
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
 PASTA_BASE = "base"
 
-def criar_db():
-    """Função principal para criar o banco de dados Chroma a partir de PDFs."""
+# Nome da coleção usada pelo langchain_chroma por padrão
+NOME_COLECAO = "langchain"
+ARQUIVO_MANIFESTO = "manifest.json"
+FONTE_EXEMPLOS = "exemplos"
+
+TAMANHO_LOTE_EMBEDDINGS = 100
+LOTES_SIMULTANEOS = 4
+MAX_TENTATIVAS = 6
+
+# FAQ pré-calculado: perguntas respondidas por lote e geradas por trecho
+TAMANHO_LOTE_FAQ = 50
+CHUNKS_POR_TRECHO_FAQ = 3
+PERGUNTAS_POR_TRECHO_FAQ = 5
+PROMPT_PERGUNTAS_FAQ = """
+Com base no texto abaixo, escreva {quantidade} perguntas diferentes que um aluno faria
+e que o texto responde. Escreva uma pergunta por linha, sem numeração.
+
+{texto}"""
+
+def criar_db(completo=False):
+    """
+    Função principal para criar o banco de dados Chroma a partir de PDFs.
+    
+    A ingestão é incremental: um manifesto com o hash de cada arquivo e dos
+    seus chunks permite reprocessar apenas arquivos novos ou alterados,
+    vetorizar apenas os chunks que mudaram e remover os chunks de arquivos
+    apagados. Com ``completo=True`` a coleção é recriada do zero.
+    """
     print("🚀 Iniciando criação da base de dados a partir de PDFs...")
     
     # Validar configurações
@@ -29,36 +71,256 @@ def criar_db():
         print(f"❌ Erro de configuração: {str(e)}")
         return False
 
+    db_path = Config.CHROMA_DB_PATH
+    os.makedirs(db_path, exist_ok=True)
+    manifesto = {} if completo else carregar_manifesto(db_path)
+    colecao = abrir_colecao(db_path, recriar=completo)
+    
+    # Bases criadas antes do manifesto não têm IDs determinísticos
+    if not manifesto and colecao.count() > 0:
+        print("♻️ Base existente sem manifesto, recriando a coleção do zero...")
+        colecao = abrir_colecao(db_path, recriar=True)
+    
     # Verificar se a pasta base existe e contém PDFs
-    if not os.path.exists(PASTA_BASE) or not any(Path(PASTA_BASE).glob("*.pdf")):
+    arquivos = listar_arquivos()
+    if not arquivos:
         print(f"⚠️ Aviso: A pasta \'{PASTA_BASE}\' não existe ou não contém arquivos PDF.")
         print("   Por favor, crie a pasta e adicione seus arquivos PDF nela.")
         print("   Criando documentos de exemplo para demonstração...")
-        documents = create_sample_documents()
-    else:
-        print(f"📂 Carregando documentos da pasta \'{PASTA_BASE}\'...")
-        documents = carregar_documentos()
-        if not documents:
-            print(f"❌ Erro: Nenhum documento PDF válido encontrado na pasta \'{PASTA_BASE}\'")
-            return False
-
-    print(f"📄 Documentos carregados: {len(documents)}")
-    chunks = dividir_chunks(documents)
-    print(f"✂️ Documentos divididos em {len(chunks)} chunks.")
+        documentos = create_sample_documents()
+        arquivos = {FONTE_EXEMPLOS: hash_textos(doc.page_content for doc in documentos)}
     
-    try:
-        vetorizar_chunks(chunks)
-        print("🎉 Base de Dados criada com sucesso!")
+    alterados = [fonte for fonte, hash_arquivo in arquivos.items()
+                 if manifesto.get(fonte, {}).get("hash") != hash_arquivo]
+    removidos = [fonte for fonte in manifesto if fonte not in arquivos]
+    print(f"📂 Arquivos: {len(arquivos)} ({len(alterados)} novos/alterados, {len(removidos)} removidos)")
+    
+    if not alterados and not removidos:
+        print("✅ Base de conhecimento já está atualizada.")
         return True
+    
+    embeddings = criar_embeddings()
+    try:
+        with ThreadPoolExecutor(max_workers=LOTES_SIMULTANEOS) as executor_embeddings:
+            for fonte, paginas in carregar_documentos(alterados):
+                if not paginas:
+                    print(f"⚠️ Nenhum texto extraído de {fonte}")
+                
+                chunks = dividir_chunks(paginas)
+                ids = [gerar_id_chunk(chunk) for chunk in chunks]
+                ids_anteriores = set(manifesto.get(fonte, {}).get("chunks", []))
+                
+                novos = [(id_chunk, chunk) for id_chunk, chunk in zip(ids, chunks) if id_chunk not in ids_anteriores]
+                obsoletos = list(ids_anteriores - set(ids))
+                
+                vetorizar_chunks(novos, colecao, embeddings, executor_embeddings)
+                if obsoletos:
+                    colecao.delete(ids=obsoletos)
+                
+                manifesto[fonte] = {"hash": arquivos[fonte], "chunks": ids}
+                salvar_manifesto(db_path, manifesto)
+                print(f"✂️ {fonte}: {len(chunks)} chunks ({len(novos)} vetorizados, {len(obsoletos)} removidos)")
+        
+        for fonte in removidos:
+            ids_fonte = manifesto.pop(fonte).get("chunks", [])
+            if ids_fonte:
+                colecao.delete(ids=ids_fonte)
+            salvar_manifesto(db_path, manifesto)
+            print(f"🗑️ {fonte}: {len(ids_fonte)} chunks removidos")
     except Exception as e:
         print(f"❌ Erro ao vetorizar chunks: {str(e)}")
         return False
+    
+    print(f"💾 Banco de Dados Chroma atualizado em: {os.path.abspath(db_path)} ({colecao.count()} chunks)")
+    
+    # Nova versão invalida os caches de respostas da API
+    versao = bump_kb_version(db_path)
+    print(f"🏷️ Versão da base de conhecimento: {versao}")
+    indice = exportar_indice_numpy(db_path, versao)
+    exportar_snapshot(indice)
+    construir_indice_lexical(indice)
+    print("🎉 Base de Dados criada com sucesso!")
+    return True
+
+def exportar_indice_numpy(db_path, versao=None):
+    """Exporta a coleção do Chroma para o índice NumPy (RETRIEVAL_BACKEND=numpy)."""
+    indice = NumpyVectorIndex.from_chroma(db_path, NOME_COLECAO, versao)
+    indice.save(Config.NUMPY_INDEX_PATH)
+    print(f"🧮 Índice NumPy exportado: {len(indice)} chunks em {os.path.abspath(Config.NUMPY_INDEX_PATH)}")
+    return indice
+
+def exportar_snapshot(indice):
+    """Grava o snapshot da base (RETRIEVAL_BACKEND=snapshot): índice, textos e metadados num único arquivo."""
+    cabecalho = save_snapshot(indice, Config.SNAPSHOT_PATH)
+    tamanho_mb = os.path.getsize(Config.SNAPSHOT_PATH) / 1e6
+    print(f"📦 Snapshot da versão {cabecalho['version']}: {cabecalho['count']} chunks, "
+          f"{tamanho_mb:.1f} MB em {os.path.abspath(Config.SNAPSHOT_PATH)}")
+    return cabecalho
+
+def construir_indice_lexical(indice):
+    """Constrói o índice BM25 (RETRIEVAL_MODE=hybrid) sobre os mesmos chunks."""
+    lexical = LexicalIndex.build(indice.ids, indice.texts, indice.metadatas)
+    lexical.save(Config.LEXICAL_INDEX_PATH)
+    print(f"🔤 Índice lexical construído: {len(lexical.vocabulary)} termos em {os.path.abspath(Config.LEXICAL_INDEX_PATH)}")
+    return lexical
+
+def atualizar_faq(arquivo_perguntas=None, gerar_por_fonte=0):
+    """
+    Gera o FAQ pré-calculado para a versão atual da base.
+    
+    As perguntas vêm de ``arquivo_perguntas`` (uma por linha, ou lista JSON),
+    são geradas pelo modelo a partir dos chunks de cada arquivo
+    (``gerar_por_fonte`` por arquivo) ou, sem nenhuma das duas opções, são as
+    do FAQ anterior. As respostas são calculadas em lotes pelo mesmo
+    pipeline da API e gravadas com os embeddings das perguntas em
+    FAQ_INDEX_PATH, marcadas com a versão da base.
+    """
+    from src.semantic_search import SemanticSearchService
+    
+    servico = SemanticSearchService()
+    # O FAQ anterior e os caches não podem responder pelo pipeline
+    servico.config.FAQ_ENABLED = False
+    servico.config.ANSWER_CACHE_ENABLED = False
+    servico.config.SINGLEFLIGHT_ENABLED = False
+    if not servico.initialize():
+        print("❌ Não foi possível inicializar o serviço para gerar o FAQ")
+        return False
+    
+    perguntas = []
+    if arquivo_perguntas:
+        perguntas += carregar_perguntas_faq(arquivo_perguntas)
+    if gerar_por_fonte:
+        perguntas += gerar_perguntas_faq(servico, gerar_por_fonte)
+    if not perguntas and os.path.exists(Config.FAQ_INDEX_PATH):
+        perguntas = FaqStore.load(Config.FAQ_INDEX_PATH).questions
+        print(f"♻️ Reaproveitando as {len(perguntas)} perguntas do FAQ anterior")
+    
+    # Perguntas repetidas (após normalização) são respondidas uma única vez
+    unicas = {}
+    for pergunta in perguntas:
+        unicas.setdefault(normalize_question(pergunta), pergunta.strip())
+    perguntas = [pergunta for pergunta in unicas.values() if pergunta]
+    if not perguntas:
+        print("⚠️ Nenhuma pergunta para o FAQ (use --faq-perguntas ou --faq-gerar)")
+        return True
+    
+    respondidas, respostas = [], []
+    for inicio in range(0, len(perguntas), TAMANHO_LOTE_FAQ):
+        lote = perguntas[inicio:inicio + TAMANHO_LOTE_FAQ]
+        for pergunta, resultado in zip(lote, servico.process_batch(lote)):
+            metadados = resultado.get("metadata", {})
+            # Só entram respostas completas, baseadas em trechos da base
+            if resultado.get("status") != "success" or not metadados.get("sources_found") or metadados.get("degraded"):
+                continue
+            respondidas.append(pergunta)
+            respostas.append({
+                "resposta": resultado["resposta"],
+                "status": "success",
+                "metadata": {
+                    "relevance_score": metadados.get("relevance_score"),
+                    "sources_found": metadados.get("sources_found")
+                }
+            })
+        print(f"💬 FAQ: {min(inicio + TAMANHO_LOTE_FAQ, len(perguntas))}/{len(perguntas)} perguntas processadas")
+    
+    vetores = embed_com_retentativas(servico.embedding_function, respondidas) if respondidas else []
+    faq = FaqStore.build(respondidas, vetores, respostas, read_kb_version(Config.CHROMA_DB_PATH))
+    faq.save(Config.FAQ_INDEX_PATH)
+    print(f"📚 FAQ pré-calculado: {len(faq)} de {len(perguntas)} perguntas em {os.path.abspath(Config.FAQ_INDEX_PATH)}")
+    return True
+
+def carregar_perguntas_faq(caminho):
+    """Lê as perguntas do FAQ de um arquivo texto (uma por linha) ou JSON (lista)."""
+    with open(caminho, "r", encoding="utf-8") as f:
+        if caminho.endswith(".json"):
+            return [str(pergunta) for pergunta in json.load(f)]
+        return [linha.strip() for linha in f if linha.strip() and not linha.startswith("#")]
+
+def gerar_perguntas_faq(servico, por_fonte):
+    """
+    Gera perguntas com o modelo a partir dos chunks de cada arquivo.
+    
+    Os chunks de cada arquivo são amostrados de forma espaçada, em trechos
+    de CHUNKS_POR_TRECHO_FAQ chunks, e cada trecho gera até
+    PERGUNTAS_POR_TRECHO_FAQ perguntas.
+    """
+    indice = NumpyVectorIndex.load(Config.NUMPY_INDEX_PATH)
+    por_arquivo = {}
+    for texto, metadados in zip(indice.texts, indice.metadatas):
+        por_arquivo.setdefault(metadados.get("source", ""), []).append((metadados.get("page", 0), metadados.get("start_index", 0), texto))
+    
+    pedidos = []
+    for fonte, chunks in sorted(por_arquivo.items()):
+        chunks.sort()
+        trechos = max(1, -(-por_fonte // PERGUNTAS_POR_TRECHO_FAQ))
+        passo = max(1, len(chunks) // trechos)
+        for inicio in range(0, len(chunks), passo)[:trechos]:
+            texto = "\n\n".join(texto for _, _, texto in chunks[inicio:inicio + CHUNKS_POR_TRECHO_FAQ])
+            quantidade = min(PERGUNTAS_POR_TRECHO_FAQ, por_fonte)
+            pedidos.append((fonte, PROMPT_PERGUNTAS_FAQ.format(quantidade=quantidade, texto=texto)))
+    
+    perguntas_por_fonte = {}
+    with ThreadPoolExecutor(max_workers=Config.BATCH_MAX_PARALLEL) as executor:
+        futuros = [(fonte, executor.submit(servico.llm.invoke, prompt)) for fonte, prompt in pedidos]
+        for fonte, futuro in futuros:
+            for linha in futuro.result().content.splitlines():
+                # Remove numeração e marcadores que o modelo inclua mesmo assim
+                pergunta = re.sub(r"^\s*(\d+[.)]|[-*•])\s*", "", linha).strip()
+                if pergunta:
+                    perguntas_por_fonte.setdefault(fonte, []).append(pergunta)
+    
+    perguntas = []
+    for fonte, lista in perguntas_por_fonte.items():
+        perguntas += lista[:por_fonte]
+        print(f"❓ {fonte}: {len(lista[:por_fonte])} perguntas geradas")
+    return perguntas
+
+def listar_arquivos():
+    """Retorna {caminho do PDF: hash do conteúdo} para os arquivos da pasta base."""
+    if not os.path.exists(PASTA_BASE):
+        return {}
+    return {
+        str(Path(PASTA_BASE) / caminho.name): hash_arquivo(caminho)
+        for caminho in sorted(Path(PASTA_BASE).glob("*.pdf"))
+    }
+
+def hash_arquivo(caminho):
+    """Hash SHA-256 do conteúdo de um arquivo."""
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def hash_textos(textos):
+    """Hash SHA-256 de uma sequência de textos."""
+    sha = hashlib.sha256()
+    for texto in textos:
+        sha.update(texto.encode("utf-8"))
+        sha.update(b"\x00")
+    return sha.hexdigest()
+
+def carregar_pdf(caminho):
+    """Extrai as páginas de um PDF (executado em um processo separado)."""
+    return caminho, PyPDFLoader(caminho).load()
 
-def carregar_documentos():
-    """Carrega documentos PDF da pasta base."""
-    carregador = PyPDFDirectoryLoader(PASTA_BASE, glob="*.pdf")
-    documentos = carregador.load()
-    return documentos
+def carregar_documentos(fontes):
+    """
+    Carrega os PDFs informados em paralelo, em um pool de processos.
+    
+    Gera (fonte, páginas) à medida que cada arquivo termina de ser lido, para
+    que apenas os chunks de um arquivo por vez fiquem em memória.
+    """
+    pdfs = [fonte for fonte in fontes if fonte != FONTE_EXEMPLOS]
+    if FONTE_EXEMPLOS in fontes:
+        yield FONTE_EXEMPLOS, create_sample_documents()
+    if not pdfs:
+        return
+    
+    with ProcessPoolExecutor(max_workers=min(len(pdfs), os.cpu_count() or 1)) as executor:
+        futuros = [executor.submit(carregar_pdf, caminho) for caminho in pdfs]
+        for futuro in as_completed(futuros):
+            yield futuro.result()
 
 def dividir_chunks(documentos):
     """Divide os documentos em chunks menores."""
@@ -69,18 +331,114 @@ def dividir_chunks(documentos):
         add_start_index=True
     )
     chunks = separador_documentos.split_documents(documentos)
+    
+    # Contagem de tokens guardada nos metadados para o orçamento de contexto da API
+    for chunk in chunks:
+        chunk.metadata["token_count"] = count_tokens(chunk.page_content, Config.TOKENIZER_ENCODING)
     return chunks
 
-def vetorizar_chunks(chunks):
-    """Vetoriza os chunks e os armazena no banco de dados Chroma."""
-    db_path = Config.CHROMA_DB_PATH
-    os.makedirs(db_path, exist_ok=True)
+def gerar_id_chunk(chunk):
+    """ID determinístico: muda apenas quando o conteúdo ou a posição do chunk muda."""
+    chave = "|".join([
+        str(chunk.metadata.get("source", "")),
+        str(chunk.metadata.get("page", "")),
+        str(chunk.metadata.get("start_index", "")),
+        chunk.page_content
+    ])
+    return hashlib.sha256(chave.encode("utf-8")).hexdigest()[:32]
+
+def criar_embeddings():
+    """Função de embedding usada na ingestão, com o mesmo cache da API."""
+    if Config.UPSTREAM_PROVIDER == "fake":
+        # Mesmos embeddings locais da API em modo de benchmark
+        embeddings = FakeEmbeddings(latency_ms=Config.FAKE_EMBEDDING_LATENCY_MS)
+    else:
+        # Passar a chave da OpenAI explicitamente
+        embeddings = OpenAIEmbeddings(openai_api_key=Config.OPENAI_API_KEY)
     
-    # Passar a chave da OpenAI explicitamente
-    embeddings = OpenAIEmbeddings(openai_api_key=Config.OPENAI_API_KEY)
+    # Mesmo cache da API: chunks inalterados não geram novas chamadas
+    if Config.EMBEDDING_CACHE_ENABLED:
+        embeddings = CachedEmbeddings(
+            embeddings,
+            db_path=Config.EMBEDDING_CACHE_PATH,
+            memory_entries=Config.EMBEDDING_CACHE_MEMORY_ENTRIES
+        )
+    return embeddings
+
+def vetorizar_chunks(chunks_com_ids, colecao, embeddings, executor):
+    """
+    Vetoriza os chunks em lotes concorrentes e os grava (upsert) no Chroma.
     
-    db = Chroma.from_documents(chunks, embeddings, persist_directory=db_path)
-    print(f"💾 Banco de Dados Chroma criado em: {os.path.abspath(db_path)}")
+    Args:
+        chunks_com_ids: Lista de (id, Document)
+        colecao: Coleção do Chroma
+        embeddings: Função de embedding
+        executor: Pool de threads compartilhado entre os arquivos
+    """
+    lotes = [
+        chunks_com_ids[inicio:inicio + TAMANHO_LOTE_EMBEDDINGS]
+        for inicio in range(0, len(chunks_com_ids), TAMANHO_LOTE_EMBEDDINGS)
+    ]
+    futuros = [executor.submit(gravar_lote, lote, colecao, embeddings) for lote in lotes]
+    for futuro in as_completed(futuros):
+        futuro.result()
+
+def gravar_lote(lote, colecao, embeddings):
+    """Vetoriza um lote de chunks e grava no Chroma."""
+    textos = [chunk.page_content for _, chunk in lote]
+    vetores = embed_com_retentativas(embeddings, textos)
+    colecao.upsert(
+        ids=[id_chunk for id_chunk, _ in lote],
+        embeddings=vetores,
+        documents=textos,
+        metadatas=[limpar_metadados(chunk.metadata) for _, chunk in lote]
+    )
+
+def embed_com_retentativas(embeddings, textos):
+    """Chama a API de embeddings com backoff exponencial em erros de limite de taxa."""
+    for tentativa in range(MAX_TENTATIVAS):
+        try:
+            return embeddings.embed_documents(textos)
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            limite_taxa = status == 429 or type(e).__name__ == "RateLimitError"
+            if not (limite_taxa or (status is not None and status >= 500)) or tentativa == MAX_TENTATIVAS - 1:
+                raise
+            espera = min(60, 2 ** tentativa) * (0.5 + random.random())
+            print(f"⏳ Limite de taxa da API, nova tentativa em {espera:.1f}s...")
+            time.sleep(espera)
+
+def limpar_metadados(metadados):
+    """O Chroma aceita apenas valores escalares nos metadados."""
+    return {
+        chave: valor for chave, valor in metadados.items()
+        if isinstance(valor, (str, int, float, bool))
+    }
+
+def abrir_colecao(db_path, recriar=False):
+    """Abre (ou cria) a coleção do Chroma usada pela API."""
+    cliente = chromadb.PersistentClient(path=db_path)
+    if recriar:
+        try:
+            cliente.delete_collection(NOME_COLECAO)
+        except Exception:
+            pass
+    return cliente.get_or_create_collection(NOME_COLECAO)
+
+def carregar_manifesto(db_path):
+    """Lê o manifesto da última ingestão."""
+    caminho = os.path.join(db_path, ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f).get("arquivos", {})
+
+def salvar_manifesto(db_path, manifesto):
+    """Grava o manifesto de forma atômica."""
+    caminho = os.path.join(db_path, ARQUIVO_MANIFESTO)
+    with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"arquivos": manifesto}, f, ensure_ascii=False, indent=1)
+    os.replace(caminho + ".tmp", caminho)
 
 def create_sample_documents():
     """Cria documentos de exemplo para demonstração se não houver PDFs na pasta base."""
@@ -140,12 +498,47 @@ def create_sample_documents():
     return documents
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Popula a base de dados Chroma")
+    parser.add_argument("--completo", action="store_true",
+                        help="Recria a coleção do zero em vez de atualizar incrementalmente")
+    parser.add_argument("--exportar-indice", action="store_true",
+                        help="Apenas exporta a base Chroma existente para os índices NumPy e lexical e o snapshot")
+    parser.add_argument("--faq", action="store_true",
+                        help="Gera (ou regera) o FAQ pré-calculado depois de atualizar a base")
+    parser.add_argument("--faq-perguntas", metavar="ARQUIVO",
+                        help="Arquivo com as perguntas do FAQ (uma por linha, ou lista JSON)")
+    parser.add_argument("--faq-gerar", type=int, default=0, metavar="N",
+                        help="Gera N perguntas do FAQ por arquivo da base com o modelo")
+    parser.add_argument("--colecao", metavar="NOME",
+                        help="Popula a coleção NOME (em COLLECTIONS_PATH) a partir dos PDFs de base/NOME/")
+    args = parser.parse_args()
+    
+    if args.colecao:
+        # Todas as etapas passam a usar a pasta da coleção
+        for chave, caminho in Config.collection_paths(args.colecao).items():
+            setattr(Config, chave, caminho)
+        if args.colecao != Config.DEFAULT_COLLECTION:
+            PASTA_BASE = os.path.join("base", args.colecao)
+    
+    if args.exportar_indice:
+        indice = exportar_indice_numpy(Config.CHROMA_DB_PATH, read_kb_version(Config.CHROMA_DB_PATH))
+        exportar_snapshot(indice)
+        construir_indice_lexical(indice)
+        sys.exit(0)
+    
     print("=" * 50)
     print("  POPULAÇÃO DA BASE DE DADOS CHROMA")
-    print("  (A partir de PDFs na pasta 'base/' ou dados de exemplo)")
+    print(f"  (A partir de PDFs na pasta '{PASTA_BASE}/' ou dados de exemplo)")
     print("=" * 50)
     
-    success = criar_db()
+    versao_anterior = read_kb_version(Config.CHROMA_DB_PATH)
+    success = criar_db(completo=args.completo)
+    
+    # O FAQ é regerado sempre que a base muda (com as mesmas perguntas) ou quando pedido
+    base_alterada = read_kb_version(Config.CHROMA_DB_PATH) != versao_anterior
+    pedir_faq = args.faq or args.faq_perguntas or args.faq_gerar
+    if success and (pedir_faq or (base_alterada and os.path.exists(Config.FAQ_INDEX_PATH))):
+        success = atualizar_faq(args.faq_perguntas, args.faq_gerar)
     
     if success:
         print("\n✅ Processo concluído com sucesso!")
@@ -153,5 +546,3 @@ if __name__ == "__main__":
     else:
         print("\n❌ Processo falhou. Verifique os erros acima.")
         sys.exit(1)
-
-
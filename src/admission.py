@@ -0,0 +1,440 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from src.config import Config
+from src.metrics import registry
+
+# Classes de prioridade da fila de admissão, da mais à menos prioritária
+PRIORITIES = ("interactive", "batch")
+
+# Peso da última requisição na média móvel do tempo de atendimento
+SERVICE_TIME_ALPHA = 0.1
+
+REJECTION_MESSAGES = {
+    "rate_limit": "Limite de requisições excedido, tente novamente em instantes",
+    "queue_full": "Servidor sobrecarregado, tente novamente em instantes",
+    "slo": "Servidor sobrecarregado, tente novamente em instantes",
+    "timeout": "Servidor ocupado, tente novamente em instantes",
+}
+
+
+class AdmissionRejected(Exception):
+    """
+    Requisição recusada pelo limite do cliente ou pela fila de admissão
+
+    ``reason`` é "rate_limit", "queue_full", "slo" (a espera estimada passa do
+    SLO da fila) ou "timeout" (a vaga não saiu dentro do prazo).
+    """
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(REJECTION_MESSAGES[reason])
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def status_code(self) -> int:
+        return 503 if self.reason == "timeout" else 429
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+    @property
+    def headers(self) -> dict:
+        """Cabeçalhos da resposta de recusa"""
+        return {"Retry-After": self.retry_after_header}
+
+
+def client_key(headers: dict, remote_addr: Optional[str]) -> str:
+    """
+    Chave do cliente para o limite de requisições
+
+    A chave de API do cabeçalho RATE_LIMIT_KEY_HEADER (guardada só como hash)
+    ou o IP do cliente. Com RATE_LIMIT_TRUST_FORWARDED o IP é o último de
+    X-Forwarded-For, o acrescentado pelo proxy confiável: os anteriores vêm
+    do próprio cliente e podem ser forjados.
+
+    Args:
+        headers: Cabeçalhos da requisição, com nomes em minúsculas
+        remote_addr: Endereço da conexão
+    """
+    api_key = headers.get(Config.RATE_LIMIT_KEY_HEADER.lower())
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+    forwarded = headers.get("x-forwarded-for")
+    if Config.RATE_LIMIT_TRUST_FORWARDED and forwarded:
+        return "ip:" + forwarded.split(",")[-1].strip()
+    return f"ip:{remote_addr or '-'}"
+
+
+def request_priority(default: str, headers: dict) -> str:
+    """Prioridade da requisição: o cabeçalho X-Priority só pode rebaixá-la"""
+    requested = headers.get("x-priority", "").strip().lower()
+    if requested in PRIORITIES and PRIORITIES.index(requested) > PRIORITIES.index(default):
+        return requested
+    return default
+
+
+class TokenBucketLimiter:
+    """
+    Limite de requisições por cliente (token bucket), em memória
+
+    Cada cliente tem até ``burst`` fichas, repostas à taxa de
+    ``rate_per_minute`` por minuto; cada pergunta consome uma ficha (um
+    lote, uma por pergunta, até o balde inteiro: ver ``batch_cost``). Os
+    clientes sem atividade recente saem do LRU de ``max_clients`` entradas.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: float, max_clients: int = 100000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Consome ``cost`` fichas do cliente
+
+        Returns:
+            Tupla (permitido, segundos até haver fichas suficientes)
+        """
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            allowed, tokens, retry_after = self._consume(tokens, now - updated, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def refund(self, key: str, cost: float = 1.0):
+        """Devolve ``cost`` fichas ao cliente (sem passar de ``burst``)"""
+        self.acquire(key, -cost)
+
+    def _consume(self, tokens: float, elapsed: float, cost: float) -> Tuple[bool, float, float]:
+        """Repõe as fichas do intervalo e tenta consumir ``cost`` (negativo devolve fichas)"""
+        tokens = min(self.burst, tokens + max(0.0, elapsed) * self.rate)
+        if tokens >= cost:
+            return True, min(self.burst, tokens - cost), 0.0
+        return False, tokens, (cost - tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class SqliteTokenBucketLimiter(TokenBucketLimiter):
+    """
+    Token bucket em SQLite (modo WAL), aplicado em conjunto por todos os
+    workers da máquina
+
+    Cada consumo é uma transação ``BEGIN IMMEDIATE``: os workers se revezam
+    na leitura e gravação do balde do cliente.
+    """
+
+    # Remoção de clientes com o balde cheio a cada N consumos
+    PRUNE_EVERY = 1000
+
+    def __init__(self, db_path: str, rate_per_minute: float, burst: float):
+        super().__init__(rate_per_minute, burst)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def acquire(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (self.burst, now)
+            allowed, tokens, retry_after = self._consume(tokens, now - updated, cost)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0 and self.rate > 0:
+                # Depois desse intervalo o balde estaria cheio de qualquer forma
+                conn.execute("DELETE FROM buckets WHERE updated_at < ?", (now - self.burst / self.rate,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def _connection(self) -> sqlite3.Connection:
+        # Conexões não podem atravessar um fork, por isso guardamos o pid
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+def create_rate_limiter(backend: str, rate_per_minute: float, burst: float,
+                        db_path: Optional[str] = None) -> TokenBucketLimiter:
+    """
+    Limite de requisições do backend configurado
+
+    Args:
+        backend: "memory" (por processo) ou "sqlite" (compartilhado entre workers)
+    """
+    if backend == "sqlite":
+        return SqliteTokenBucketLimiter(db_path, rate_per_minute, burst)
+    if backend == "memory":
+        return TokenBucketLimiter(rate_per_minute, burst)
+    raise ValueError(f"Backend de rate limiting desconhecido: {backend}")
+
+
+class _Waiter:
+    __slots__ = ("rank", "wake", "admitted", "cancelled")
+
+    def __init__(self, rank: int, wake):
+        self.rank = rank
+        self.wake = wake
+        self.admitted = False
+        self.cancelled = False
+
+
+class AdmissionController:
+    """
+    Fila de admissão com classes de prioridade
+
+    Até ``max_concurrent`` requisições são atendidas ao mesmo tempo; as
+    demais esperam numa fila de até ``max_queue`` posições, atendida por
+    prioridade (ver PRIORITIES) e ordem de chegada. A espera de uma nova
+    requisição é estimada pela média móvel do tempo de atendimento e pela
+    quantidade de requisições à frente; se passar de ``slo_ms``, ela é
+    recusada na hora (429) em vez de aumentar a latência de todas. Quem
+    espera mais de ``max_wait_s`` desiste com 503.
+
+    Funciona com threads (``acquire``) e com o event loop (``acquire_async``),
+    com uma única fila para as rotas Flask e ASGI do processo.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, slo_ms: float, max_wait_s: float):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.slo_ms = slo_ms
+        self.max_wait_s = max_wait_s
+        self._active = 0
+        self._queue = []
+        self._queued = [0] * len(PRIORITIES)
+        self._sequence = itertools.count()
+        self._service_ms: Optional[float] = None
+        self._lock = threading.Lock()
+        registry.register_gauge(
+            "api_admission_queue_depth",
+            lambda: {priority: float(count) for priority, count in zip(PRIORITIES, self._queued)},
+            "Requisições aguardando na fila de admissão, por prioridade"
+        )
+        registry.register_gauge(
+            "api_admission_active", lambda: {"active": float(self._active)},
+            "Requisições admitidas em atendimento"
+        )
+
+    def acquire(self, priority: str = "interactive") -> float:
+        """
+        Aguarda uma vaga, bloqueando a thread
+
+        Returns:
+            Instante da admissão, a ser passado para ``release``
+
+        Raises:
+            AdmissionRejected: Fila cheia, espera estimada acima do SLO ou prazo esgotado
+        """
+        started = time.monotonic()
+        event = threading.Event()
+        waiter = self._enqueue(priority, event.set)
+        if waiter is not None and not event.wait(self.max_wait_s) and self._cancel(waiter):
+            self._reject("timeout", 1.0)
+        return self._admitted(started)
+
+    async def acquire_async(self, priority: str = "interactive") -> float:
+        """Versão assíncrona de ``acquire``, sem ocupar uma thread durante a espera"""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(priority, wake)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait_s)
+            except asyncio.TimeoutError:
+                if self._cancel(waiter):
+                    self._reject("timeout", 1.0)
+            except asyncio.CancelledError:
+                # Cliente desconectou; uma vaga recebida enquanto isso é devolvida
+                if not self._cancel(waiter):
+                    self.release(time.monotonic())
+                raise
+        return self._admitted(started)
+
+    def release(self, admitted_at: float):
+        """Libera a vaga, passando-a para a próxima requisição da fila"""
+        held_ms = (time.monotonic() - admitted_at) * 1000
+        with self._lock:
+            if self._service_ms is None:
+                self._service_ms = held_ms
+            else:
+                self._service_ms += SERVICE_TIME_ALPHA * (held_ms - self._service_ms)
+
+            while self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.cancelled:
+                    continue
+                self._queued[waiter.rank] -= 1
+                waiter.admitted = True
+                break
+            else:
+                self._active -= 1
+                return
+        waiter.wake()
+
+    def stats(self) -> dict:
+        """Ocupação atual da fila de admissão"""
+        with self._lock:
+            return {
+                "active": self._active,
+                "max_concurrent": self.max_concurrent,
+                "queued": dict(zip(PRIORITIES, self._queued)),
+                "max_queue": self.max_queue,
+                "service_time_ms": round(self._service_ms, 3) if self._service_ms is not None else None,
+                "slo_ms": self.slo_ms,
+            }
+
+    def _enqueue(self, priority: str, wake) -> Optional[_Waiter]:
+        """Admite na hora (None) ou coloca na fila, recusando se a espera passaria do SLO"""
+        rank = PRIORITIES.index(priority)
+        with self._lock:
+            if self._active < self.max_concurrent and not any(self._queued):
+                self._active += 1
+                return None
+
+            expected_ms = self._expected_wait_ms(sum(self._queued[:rank + 1]))
+            if sum(self._queued) >= self.max_queue:
+                reason = "queue_full"
+            elif self.slo_ms > 0 and expected_ms > self.slo_ms:
+                reason = "slo"
+            else:
+                waiter = _Waiter(rank, wake)
+                heapq.heappush(self._queue, (rank, next(self._sequence), waiter))
+                self._queued[rank] += 1
+                return waiter
+        self._reject(reason, expected_ms / 1000)
+
+    def _expected_wait_ms(self, ahead: int) -> float:
+        """Espera estimada com ``ahead`` requisições à frente na fila"""
+        if self._service_ms is None:
+            return 0.0
+        return math.ceil((ahead + 1) / self.max_concurrent) * self._service_ms
+
+    def _cancel(self, waiter: _Waiter) -> bool:
+        """Retira da fila quem desistiu; False se a vaga já tinha sido concedida"""
+        with self._lock:
+            if waiter.admitted:
+                return False
+            waiter.cancelled = True
+            self._queued[waiter.rank] -= 1
+            return True
+
+    @staticmethod
+    def _admitted(started: float) -> float:
+        now = time.monotonic()
+        registry.observe("admission_wait", now - started)
+        return now
+
+    @staticmethod
+    def _reject(reason: str, retry_after: float):
+        registry.inc("api_requests_rejected_total", reason=reason)
+        raise AdmissionRejected(reason, retry_after)
+
+
+# Limite por cliente e fila de admissão do processo
+rate_limiter = create_rate_limiter(
+    Config.RATE_LIMIT_BACKEND,
+    rate_per_minute=Config.RATE_LIMIT_PER_MINUTE,
+    burst=Config.RATE_LIMIT_BURST,
+    db_path=Config.RATE_LIMIT_PATH
+) if Config.RATE_LIMIT_ENABLED else None
+
+admission = AdmissionController(
+    max_concurrent=Config.MAX_INFLIGHT_REQUESTS,
+    max_queue=Config.ADMISSION_MAX_QUEUE,
+    slo_ms=Config.ADMISSION_QUEUE_SLO_MS,
+    max_wait_s=Config.INFLIGHT_QUEUE_TIMEOUT
+)
+
+
+def batch_cost(questions: int, burst: float = Config.RATE_LIMIT_BURST) -> float:
+    """
+    Fichas consumidas por um lote: uma por pergunta, limitado ao balde inteiro
+
+    Um lote maior que o balde nunca seria admitido; com o limite ele é
+    atendido quando o balde está cheio e o esvazia, de forma que o cliente
+    espera a reposição antes da próxima requisição.
+    """
+    return float(min(max(1, questions), max(1.0, burst)))
+
+
+def validate_batch_admission():
+    """
+    Garante que um lote de BATCH_MAX_QUESTIONS perguntas pode ser admitido
+
+    Consome o custo do maior lote num balde novo com a configuração atual.
+
+    Raises:
+        ValueError: O maior lote aceito pela rota seria sempre recusado
+    """
+    if not Config.RATE_LIMIT_ENABLED:
+        return
+    limiter = TokenBucketLimiter(Config.RATE_LIMIT_PER_MINUTE, Config.RATE_LIMIT_BURST)
+    allowed, _ = limiter.acquire("batch", batch_cost(Config.BATCH_MAX_QUESTIONS, limiter.burst))
+    if not allowed:
+        raise ValueError(
+            f"Um lote de BATCH_MAX_QUESTIONS={Config.BATCH_MAX_QUESTIONS} perguntas nunca caberia "
+            f"no limite de RATE_LIMIT_BURST={Config.RATE_LIMIT_BURST} fichas"
+        )
+
+
+def check_rate_limit(key: str, cost: float = 1.0):
+    """
+    Consome as fichas do cliente
+
+    Raises:
+        AdmissionRejected: O cliente passou do limite
+    """
+    if rate_limiter is None:
+        return
+    allowed, retry_after = rate_limiter.acquire(key, cost)
+    if not allowed:
+        registry.inc("api_requests_rejected_total", reason="rate_limit")
+        raise AdmissionRejected("rate_limit", retry_after)
+
+
+def refund_rate_limit(key: str, cost: float = 1.0):
+    """Devolve as fichas de uma requisição recusada por ser inválida (400)"""
+    if rate_limiter is not None:
+        rate_limiter.refund(key, cost)
@@ -0,0 +1,167 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_question(query: str) -> str:
+    """
+    Normaliza a pergunta para uso como chave de cache
+
+    Remove espaços redundantes, caixa e pontuação final, mantendo acentos.
+    """
+    text = unicodedata.normalize("NFC", query).lower().strip()
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip(" ?!.;,")
+
+
+class _CacheEntry:
+    __slots__ = ("result", "expires_at", "slot")
+
+    def __init__(self, result: dict, expires_at: float, slot: int):
+        self.result = result
+        self.expires_at = expires_at
+        self.slot = slot
+
+
+class AnswerCache:
+    """
+    Cache de respostas em dois níveis
+
+    - Exato: chave é a pergunta normalizada.
+    - Aproximado: retorna a resposta de uma pergunta anterior cujo embedding
+      esteja a uma distância de cosseno menor que ``max_distance``.
+
+    Cada resposta fica associada ao modo de resposta pedido ("auto",
+    "completo", ...) e só é devolvida a requisições do mesmo modo.
+
+    As entradas expiram após ``ttl_seconds`` e são descartadas por LRU quando
+    o cache atinge ``max_entries``. Os embeddings ficam numa matriz
+    pré-alocada, de forma que a busca aproximada é um único produto
+    matriz-vetor.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600.0,
+                 max_distance: float = 0.05):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[Tuple[str, str]]] = [None] * max_entries
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_exact(self, key: str, mode: str = "auto") -> Optional[dict]:
+        """Busca pela pergunta normalizada, entre as respostas do modo ``mode``"""
+        key = (mode, key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.hits_exact += 1
+            return entry.result
+
+    def get_similar(self, embedding: List[float], mode: str = "auto") -> Optional[Tuple[dict, float]]:
+        """
+        Busca a pergunta mais próxima pelo embedding, entre as respostas do modo ``mode``
+
+        Returns:
+            Tupla (resultado, distância de cosseno) ou None
+        """
+        with self._lock:
+            if self._vectors is None or not self._entries:
+                self.misses += 1
+                return None
+
+            query = self._normalize(embedding)
+            if query is None or query.shape[0] != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ query
+            now = time.monotonic()
+            for slot in np.argsort(-similarities):
+                key = self._slot_keys[slot]
+                if key is None or key[0] != mode:
+                    continue
+                distance = max(0.0, 1.0 - float(similarities[slot]))
+                if distance > self.max_distance:
+                    break
+                entry = self._entries[key]
+                if entry.expires_at < now:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                self.hits_semantic += 1
+                return entry.result, distance
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, embedding: Optional[List[float]], result: dict, mode: str = "auto"):
+        """Armazena a resposta para a pergunta normalizada no modo ``mode``"""
+        key = (mode, key)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+            slot = self._free_slots.pop()
+            vector = self._normalize(embedding) if embedding is not None else None
+            if vector is not None:
+                if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                    self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._vectors[slot] = vector
+                self._slot_keys[slot] = key
+
+            self._entries[key] = _CacheEntry(result, time.monotonic() + self.ttl_seconds, slot)
+
+    def clear(self):
+        """Remove todas as entradas (ex.: após reconstrução da base)"""
+        with self._lock:
+            self._entries.clear()
+            self._vectors = None
+            self._slot_keys = [None] * self.max_entries
+            self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def stats(self) -> dict:
+        """Contadores de acertos e falhas"""
+        return {
+            "entries": len(self._entries),
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+        }
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key)
+        if self._slot_keys[entry.slot] == key:
+            self._slot_keys[entry.slot] = None
+            if self._vectors is not None:
+                self._vectors[entry.slot] = 0.0
+        self._free_slots.append(entry.slot)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
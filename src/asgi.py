@@ -0,0 +1,249 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+from datetime import datetime
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from asgiref.wsgi import WsgiToAsgi
+from src.config import Config
+from src.main import app as flask_app
+from src.semantic_search import semantic_service
+from src.knowledge_bases import CollectionNotFoundError, knowledge_bases
+from src.extractive import parse_response_options
+from src.sessions import SessionNotFoundError, lookup_session
+from src.admission import (
+    AdmissionRejected, admission, check_rate_limit, client_key, refund_rate_limit, request_priority
+)
+from src.http_encoding import dumps, encode_body, is_compressible, loads
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre verificações enquanto o serviço inicializa
+STARTUP_POLL_INTERVAL = 0.05
+
+
+class AsyncAskApp:
+    """
+    Aplicação ASGI que atende /api/ask e /api/ask/stream de forma assíncrona
+
+    As perguntas usam as APIs assíncronas do serviço de busca, então o tempo
+    gasto esperando pela OpenAI não ocupa uma thread. Cada pergunta passa
+    pelo limite do cliente e pela fila de admissão do processo (ver
+    src/admission.py), compartilhada com as rotas Flask. Todas as outras
+    rotas são repassadas para a aplicação Flask.
+    """
+
+    def __init__(self, wsgi_app, admission_controller):
+        self.fallback = WsgiToAsgi(wsgi_app)
+        self.admission = admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        if (scope["type"] == "http" and scope["method"] == "POST"
+                and scope["path"] in ("/api/ask", "/api/ask/stream")):
+            await self._ask(scope, receive, send)
+            return
+
+        await self.fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _ask(self, scope, receive, send):
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        client = scope.get("client") or ("-", 0)
+        logger.info(f"Requisição: POST {scope['path']} - IP: {client[0]}")
+
+        try:
+            body = await self._read_body(receive)
+            pergunta, data, erro = self._ler_pergunta(headers, body)
+            if erro:
+                await self._send_json(send, 400, erro)
+                return
+            colecao = data.get("colecao") or headers.get("x-collection")
+            modo, orcamento_ms, mensagem = parse_response_options(data)
+            if mensagem:
+                await self._send_json(send, 400, {"erro": mensagem, "status": "error"})
+                return
+
+            # Só perguntas válidas consomem o limite do cliente
+            cliente = client_key(headers, client[0])
+            try:
+                check_rate_limit(cliente)
+            except AdmissionRejected as e:
+                await self._send_rejection(send, scope, client, e)
+                return
+
+            if not await self._wait_until_ready():
+                await self._send_json(send, 503, {
+                    "erro": "Serviço iniciando, tente novamente em instantes",
+                    "status": "error",
+                    "startup": semantic_service.startup.snapshot(),
+                    "timestamp": datetime.utcnow().isoformat()
+                }, extra_headers=[(b"retry-after", b"5")])
+                return
+
+            # Coleções ainda fechadas são abertas numa thread auxiliar
+            try:
+                servico = await asyncio.to_thread(knowledge_bases.acquire, colecao)
+            except ValueError as e:
+                refund_rate_limit(cliente)
+                await self._send_json(send, 400, {"erro": str(e), "status": "error"})
+                return
+            except CollectionNotFoundError as e:
+                await self._send_json(send, 404, {"erro": str(e), "status": "error"})
+                return
+            except Exception as e:
+                logger.error(f"Erro ao abrir a coleção {colecao}: {str(e)}")
+                await self._send_json(send, 503, {
+                    "erro": "Não foi possível abrir a coleção",
+                    "status": "error",
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                return
+
+            # Reservado até o fim da resposta: a coleção não é fechada no meio dela
+            try:
+                try:
+                    sessao = lookup_session(servico.session_store, data.get("sessao"))
+                except ValueError as e:
+                    refund_rate_limit(cliente)
+                    await self._send_json(send, 400, {"erro": str(e), "status": "error"})
+                    return
+                except SessionNotFoundError as e:
+                    await self._send_json(send, 404, {"erro": str(e), "status": "error"})
+                    return
+
+                try:
+                    admitida_em = await self.admission.acquire_async(request_priority("interactive", headers))
+                except AdmissionRejected as e:
+                    await self._send_rejection(send, scope, client, e)
+                    return
+
+                try:
+                    stream = (scope["path"] == "/api/ask/stream"
+                              or "text/event-stream" in headers.get("accept", ""))
+                    logger.info(f"Processando pergunta: {pergunta[:100]}...")
+                    if stream:
+                        await self._send_stream(send, servico, pergunta, modo, orcamento_ms, sessao)
+                    else:
+                        resultado = await servico.aprocess_query(pergunta, modo, orcamento_ms, sessao)
+                        resultado["timestamp"] = datetime.utcnow().isoformat()
+                        status_code = 200 if resultado.get("status") == "success" else 500
+                        await self._send_json(send, status_code, resultado,
+                                              accept_encoding=headers.get("accept-encoding"))
+                finally:
+                    self.admission.release(admitida_em)
+            finally:
+                knowledge_bases.release(servico)
+
+        except Exception as e:
+            logger.error(f"Erro não tratado em {scope['path']}: {str(e)}")
+            await self._send_json(send, 500, {
+                "erro": "Erro interno do servidor",
+                "status": "error",
+                "timestamp": datetime.utcnow().isoformat()
+            })
+
+    @staticmethod
+    async def _wait_until_ready() -> bool:
+        """Aguarda a inicialização em segundo plano sem ocupar uma thread"""
+        deadline = time.monotonic() + Config.STARTUP_WAIT_TIMEOUT
+        while not semantic_service.startup.is_ready:
+            if semantic_service.startup.status == "failed" or time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(STARTUP_POLL_INTERVAL)
+        return True
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    @staticmethod
+    def _ler_pergunta(headers: dict, body: bytes):
+        """Mesmas validações da rota Flask; retorna (pergunta, corpo da requisição, erro)"""
+        if not headers.get("content-type", "").startswith("application/json"):
+            return None, None, {"erro": "Content-Type deve ser application/json", "status": "error"}
+
+        try:
+            data = loads(body or b"null")
+        except ValueError:
+            data = None
+        if not data or not isinstance(data, dict):
+            return None, None, {"erro": "Dados JSON inválidos ou vazios", "status": "error"}
+
+        pergunta = data.get("pergunta")
+        if not pergunta or not isinstance(pergunta, str) or not pergunta.strip():
+            return None, None, {
+                "erro": "Campo 'pergunta' é obrigatório e deve ser uma string não vazia",
+                "status": "error"
+            }
+        return pergunta, data, None
+
+    @staticmethod
+    async def _send_json(send, status_code: int, payload: dict, extra_headers=None, accept_encoding=None):
+        body = dumps(payload)
+        headers = [(b"content-type", b"application/json"), (b"access-control-allow-origin", b"*")]
+        if is_compressible("application/json", len(body)):
+            headers.append((b"vary", b"Accept-Encoding"))
+            body, encoding = encode_body(body, "application/json", accept_encoding)
+            if encoding is not None:
+                headers.append((b"content-encoding", encoding.encode()))
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": headers + [(b"content-length", str(len(body)).encode())] + (extra_headers or []),
+        })
+        await send({"type": "http.response.body", "body": body})
+        logger.info(f"Resposta: {status_code}")
+
+    async def _send_rejection(self, send, scope, client, error: AdmissionRejected):
+        """Resposta 429/503 (413 para lotes grandes demais) de uma pergunta recusada pelo limite do cliente ou pela fila"""
+        logger.warning(f"Requisição recusada ({error.reason}): {scope['path']} - IP: {client[0]}")
+        await self._send_json(send, error.status_code, {
+            "erro": str(error),
+            "status": "error",
+            "timestamp": datetime.utcnow().isoformat()
+        }, extra_headers=[(name.lower().encode(), value.encode()) for name, value in error.headers.items()])
+
+    @staticmethod
+    async def _send_stream(send, servico, pergunta: str, modo: str, orcamento_ms, sessao=None):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                (b"access-control-allow-origin", b"*"),
+            ],
+        })
+        async for evento in servico.aprocess_query_stream(pergunta, modo, orcamento_ms, sessao):
+            dados = evento["data"]
+            if evento["event"] in ("done", "error"):
+                dados = {**dados, "timestamp": datetime.utcnow().isoformat()}
+            chunk = b"event: %s\ndata: %s\n\n" % (evento["event"].encode(), dumps(dados))
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+
+# Aplicação ASGI usada em produção (ver gunicorn.conf.py)
+app = AsyncAskApp(flask_app, admission)
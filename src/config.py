@@ -1,4 +1,5 @@
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,20 +14,257 @@ class Config:
     # Configurações da OpenAI
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     
+    # Provedor dos modelos: "openai" ou "fake" (modelos locais de src/fakes.py,
+    # determinísticos e sem acesso à rede, usados nos benchmarks)
+    UPSTREAM_PROVIDER = os.getenv('UPSTREAM_PROVIDER', 'openai').lower()
+    FAKE_EMBEDDING_LATENCY_MS = float(os.getenv('FAKE_EMBEDDING_LATENCY_MS', '0'))
+    FAKE_LLM_FIRST_TOKEN_MS = float(os.getenv('FAKE_LLM_FIRST_TOKEN_MS', '0'))
+    FAKE_LLM_TOKEN_MS = float(os.getenv('FAKE_LLM_TOKEN_MS', '0'))
+    FAKE_LLM_RESPONSE_TOKENS = int(os.getenv('FAKE_LLM_RESPONSE_TOKENS', '40'))
+    
+    # Conexões com a OpenAI: pool keep-alive compartilhado, prazos por etapa,
+    # novas tentativas com backoff e disjuntor (src/upstream.py)
+    UPSTREAM_BASE_URL = os.getenv('UPSTREAM_BASE_URL') or None
+    UPSTREAM_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_MAX_CONNECTIONS', os.getenv('MAX_INFLIGHT_REQUESTS', '256')))
+    UPSTREAM_MAX_KEEPALIVE = int(os.getenv('UPSTREAM_MAX_KEEPALIVE', '64'))
+    UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv('UPSTREAM_KEEPALIVE_EXPIRY', '30'))
+    UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '5'))
+    UPSTREAM_EMBEDDING_TIMEOUT = float(os.getenv('UPSTREAM_EMBEDDING_TIMEOUT', '10'))
+    UPSTREAM_LLM_TIMEOUT = float(os.getenv('UPSTREAM_LLM_TIMEOUT', '60'))
+    UPSTREAM_RETRY_MAX_ATTEMPTS = int(os.getenv('UPSTREAM_RETRY_MAX_ATTEMPTS', '4'))
+    UPSTREAM_RETRY_BUDGET = float(os.getenv('UPSTREAM_RETRY_BUDGET', '30'))
+    UPSTREAM_RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '0.5'))
+    UPSTREAM_RETRY_MAX_DELAY = float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '8'))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+    # Com o circuito do modelo aberto, responder apenas com os trechos recuperados
+    UPSTREAM_FALLBACK_RETRIEVAL_ONLY = os.getenv('UPSTREAM_FALLBACK_RETRIEVAL_ONLY', 'true').lower() == 'true'
+    
     # Configurações do Chroma
-    CHROMA_DB_PATH = os.path.join(os.path.dirname(__file__), "db")
+    CHROMA_DB_PATH = os.getenv('CHROMA_DB_PATH', os.path.join(os.path.dirname(__file__), "db"))
+    
+    # Bases de conhecimento nomeadas (coleções), escolhidas por requisição com o
+    # campo "colecao" ou o cabeçalho X-Collection. Cada coleção tem uma pasta em
+    # COLLECTIONS_PATH com a mesma estrutura de CHROMA_DB_PATH; a coleção
+    # DEFAULT_COLLECTION usa os caminhos configurados acima e abaixo. Fica fora
+    # de CHROMA_DB_PATH, para que reconstruir a base padrão não afete as coleções
+    COLLECTIONS_PATH = os.getenv('COLLECTIONS_PATH', os.path.join(os.path.dirname(__file__), "collections"))
+    DEFAULT_COLLECTION = os.getenv('DEFAULT_COLLECTION', 'default')
+    # Coleções abertas ao mesmo tempo (as menos usadas são fechadas)
+    COLLECTIONS_MAX_OPEN = int(os.getenv('COLLECTIONS_MAX_OPEN', '8'))
+    # Memória residente (MB) a partir da qual uma coleção é fechada antes de abrir outra (0 desativa)
+    COLLECTIONS_MAX_MEMORY_MB = float(os.getenv('COLLECTIONS_MAX_MEMORY_MB', '0'))
+    
+    # Configurações do cache de embeddings (compartilhado entre workers)
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+    EMBEDDING_CACHE_PATH = os.getenv(
+        'EMBEDDING_CACHE_PATH',
+        os.path.join(os.path.dirname(__file__), "cache", "embeddings.sqlite3")
+    )
+    EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MEMORY_ENTRIES', '10000'))
+    
+    # Configurações do agrupamento de embeddings de perguntas concorrentes
+    EMBEDDING_BATCH_ENABLED = os.getenv('EMBEDDING_BATCH_ENABLED', 'true').lower() == 'true'
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', '64'))
+    EMBEDDING_BATCH_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_WAIT_MS', '5'))
+    
+    # Backend de busca: "chroma", "numpy" (índice em memória exportado do Chroma)
+    # ou "snapshot" (índice, textos e metadados num único arquivo mapeado em
+    # memória, sem abrir o Chroma)
+    RETRIEVAL_BACKEND = os.getenv('RETRIEVAL_BACKEND', 'chroma').lower()
+    NUMPY_INDEX_PATH = os.getenv(
+        'NUMPY_INDEX_PATH',
+        os.path.join(os.path.dirname(__file__), "db", "numpy_index")
+    )
+    SNAPSHOT_PATH = os.getenv(
+        'SNAPSHOT_PATH',
+        os.path.join(os.path.dirname(__file__), "db", "kb_snapshot.bin")
+    )
+    # Quantização do índice NumPy: "none", "int8" ou "binary" (primeira passada
+    # nos códigos compactos e reordenação de k * QUANTIZATION_RERANK_FACTOR
+    # candidatos com os vetores exatos)
+    VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'none').lower()
+    QUANTIZATION_RERANK_FACTOR = int(os.getenv('QUANTIZATION_RERANK_FACTOR', '10'))
+    
+    # Modo de busca: "vector" ou "hybrid" (vetorial + BM25 combinados por RRF)
+    RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'vector').lower()
+    LEXICAL_INDEX_PATH = os.getenv(
+        'LEXICAL_INDEX_PATH',
+        os.path.join(os.path.dirname(__file__), "db", "lexical_index")
+    )
+    HYBRID_FETCH_K = int(os.getenv('HYBRID_FETCH_K', '20'))
+    RRF_K = int(os.getenv('RRF_K', '60'))
+    # Fração mínima dos termos da pergunta presentes no melhor chunk lexical
+    LEXICAL_MIN_COVERAGE = float(os.getenv('LEXICAL_MIN_COVERAGE', '0.6'))
+    
+    # Diversidade dos resultados: busca MMR_FETCH_K candidatos e seleciona MMR_K
+    # por relevância marginal máxima, descartando quase duplicatas da mesma página
+    MMR_ENABLED = os.getenv('MMR_ENABLED', 'false').lower() == 'true'
+    MMR_K = int(os.getenv('MMR_K', os.getenv('MAX_RESULTS', '4')))
+    MMR_FETCH_K = int(os.getenv('MMR_FETCH_K', '20'))
+    # Peso da relevância (1.0) contra a diversidade (0.0)
+    MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', '0.5'))
+    # Similaridade de cosseno a partir da qual chunks da mesma página são duplicatas
+    MMR_DUPLICATE_THRESHOLD = float(os.getenv('MMR_DUPLICATE_THRESHOLD', '0.9'))
+    
+    # Reordenação (rerank) após a busca: avalia RERANK_FETCH_K candidatos contra a
+    # pergunta e envia ao modelo só os RERANK_TOP_N melhores. Modos: "none",
+    # "lexical" (termos e expressões da pergunta no chunk, sem modelo) e
+    # "cross_encoder" (modelo local em CPU, requer sentence-transformers)
+    RERANK_MODE = os.getenv('RERANK_MODE', 'none').lower()
+    RERANK_FETCH_K = int(os.getenv('RERANK_FETCH_K', '20'))
+    RERANK_TOP_N = int(os.getenv('RERANK_TOP_N', '3'))
+    # Peso do score do reranker (1.0) contra a posição na busca (0.0)
+    RERANK_WEIGHT = float(os.getenv('RERANK_WEIGHT', '0.5'))
+    RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', '16'))
+    # Scores (pergunta, chunk) mantidos em memória
+    RERANK_CACHE_ENTRIES = int(os.getenv('RERANK_CACHE_ENTRIES', '50000'))
+    RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1')
     
     # Configurações da busca semântica
     SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', '0.7'))
     MAX_RESULTS = int(os.getenv('MAX_RESULTS', '4'))
     
-    # Configurações de rate limiting (se necessário no futuro)
+    # Orçamento de tokens do contexto enviado ao modelo (chunks deduplicados por relevância)
+    CONTEXT_PACKING_ENABLED = os.getenv('CONTEXT_PACKING_ENABLED', 'true').lower() == 'true'
+    CONTEXT_MAX_TOKENS = int(os.getenv('CONTEXT_MAX_TOKENS', '3000'))
+    TOKENIZER_ENCODING = os.getenv('TOKENIZER_ENCODING', 'cl100k_base')
+    
+    # Modo "lite": resposta extrativa (as frases dos trechos recuperados com
+    # mais termos da pergunta), sem chamar o modelo nem os embeddings. Pedido
+    # com "modo": "lite" ou escolhido no modo "auto" quando o score da busca
+    # vetorial (cosseno) é de pelo menos LITE_AUTO_MIN_SCORE ou quando o "orcamento_ms" da requisição não comporta
+    # o tempo típico (p50) de geração do modelo
+    LITE_AUTO_ENABLED = os.getenv('LITE_AUTO_ENABLED', 'true').lower() == 'true'
+    LITE_AUTO_MIN_SCORE = float(os.getenv('LITE_AUTO_MIN_SCORE', '0.95'))
+    # Tempo de geração estimado enquanto não há medições no processo
+    LITE_DEFAULT_LLM_MS = float(os.getenv('LITE_DEFAULT_LLM_MS', '2000'))
+    LITE_MAX_CANDIDATES = int(os.getenv('LITE_MAX_CANDIDATES', '24'))
+    LITE_MAX_CHARS = int(os.getenv('LITE_MAX_CHARS', '400'))
+    
+    # Configurações do cache de respostas
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '1000'))
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', '3600'))
+    ANSWER_CACHE_MAX_DISTANCE = float(os.getenv('ANSWER_CACHE_MAX_DISTANCE', '0.05'))
+    
+    # Respostas pré-calculadas para perguntas frequentes (populate_db.py --faq)
+    FAQ_ENABLED = os.getenv('FAQ_ENABLED', 'true').lower() == 'true'
+    FAQ_INDEX_PATH = os.getenv(
+        'FAQ_INDEX_PATH',
+        os.path.join(os.path.dirname(__file__), "db", "faq_index")
+    )
+    # Distância de cosseno máxima entre a pergunta e uma pergunta do FAQ
+    FAQ_MAX_DISTANCE = float(os.getenv('FAQ_MAX_DISTANCE', '0.08'))
+    
+    # Sessões de conversa (campo "sessao"): "memory" (por processo) ou "sqlite"
+    # (compartilhado entre os workers da máquina)
+    SESSIONS_ENABLED = os.getenv('SESSIONS_ENABLED', 'true').lower() == 'true'
+    SESSION_STORE = os.getenv('SESSION_STORE', 'memory').lower()
+    SESSION_STORE_PATH = os.getenv(
+        'SESSION_STORE_PATH',
+        os.path.join(os.path.dirname(__file__), "cache", "sessions.sqlite3")
+    )
+    SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', '10000'))
+    SESSION_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', '1800'))
+    # Similaridade de cosseno mínima com o assunto da sessão para reaproveitar os chunks
+    SESSION_TOPIC_MIN_SIMILARITY = float(os.getenv('SESSION_TOPIC_MIN_SIMILARITY', '0.75'))
+    # Orçamento do resumo das trocas anteriores incluído no prompt
+    SESSION_HISTORY_MAX_TOKENS = int(os.getenv('SESSION_HISTORY_MAX_TOKENS', '400'))
+    SESSION_ANSWER_MAX_CHARS = int(os.getenv('SESSION_ANSWER_MAX_CHARS', '300'))
+    
+    # Coalescência de perguntas idênticas em andamento (entre workers via lock de arquivo;
+    # SINGLEFLIGHT_LOCK_DIR vazio restringe ao processo)
+    SINGLEFLIGHT_ENABLED = os.getenv('SINGLEFLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLEFLIGHT_LOCK_DIR = os.getenv(
+        'SINGLEFLIGHT_LOCK_DIR',
+        os.path.join(os.path.dirname(__file__), "cache", "singleflight")
+    )
+    SINGLEFLIGHT_WAIT_TIMEOUT = float(os.getenv('SINGLEFLIGHT_WAIT_TIMEOUT', '60'))
+    SINGLEFLIGHT_RESULT_TTL = float(os.getenv('SINGLEFLIGHT_RESULT_TTL', '10'))
+    
+    # Configurações do endpoint de perguntas em lote (/api/ask/batch)
+    BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', '500'))
+    BATCH_MAX_PARALLEL = int(os.getenv('BATCH_MAX_PARALLEL', '8'))
+    
+    # Perguntas em atendimento simultâneo por worker e espera máxima por uma vaga
+    # (fila de admissão de src/admission.py, usada pelas rotas Flask e ASGI)
+    MAX_INFLIGHT_REQUESTS = int(os.getenv('MAX_INFLIGHT_REQUESTS', '256'))
+    INFLIGHT_QUEUE_TIMEOUT = float(os.getenv('INFLIGHT_QUEUE_TIMEOUT', '10'))
+    
+    # Inicialização: "background" (a aplicação sobe na hora e o serviço é
+    # inicializado e aquecido numa thread, ver /api/ready) ou "eager"
+    STARTUP_MODE = os.getenv('STARTUP_MODE', 'background').lower()
+    # Tempo que uma pergunta espera o serviço ficar pronto antes de receber 503
+    STARTUP_WAIT_TIMEOUT = float(os.getenv('STARTUP_WAIT_TIMEOUT', '30'))
+    # Busca feita no aquecimento (vazio desativa)
+    WARMUP_QUERY = os.getenv('WARMUP_QUERY', 'O que é Seis Sigma?')
+    
+    # Limite de perguntas por cliente (token bucket por chave de API ou IP):
+    # "memory" (por processo) ou "sqlite" (aplicado em conjunto pelos workers da máquina)
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
     RATE_LIMIT_PER_MINUTE = int(os.getenv('RATE_LIMIT_PER_MINUTE', '60'))
+    RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', '20'))
+    RATE_LIMIT_KEY_HEADER = os.getenv('RATE_LIMIT_KEY_HEADER', 'X-API-Key')
+    # Usar o último IP de X-Forwarded-For, o acrescentado pelo proxy (só atrás de
+    # um proxy confiável, como no Railway: sem ele o cabeçalho é do cliente)
+    RATE_LIMIT_TRUST_FORWARDED = os.getenv('RATE_LIMIT_TRUST_FORWARDED', 'false').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+    RATE_LIMIT_PATH = os.getenv(
+        'RATE_LIMIT_PATH',
+        os.path.join(os.path.dirname(__file__), "cache", "rate_limit.sqlite3")
+    )
+    
+    # Fila de admissão (além de MAX_INFLIGHT_REQUESTS em atendimento): perguntas
+    # cuja espera estimada passe de ADMISSION_QUEUE_SLO_MS recebem 429 na hora
+    ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '512'))
+    ADMISSION_QUEUE_SLO_MS = float(os.getenv('ADMISSION_QUEUE_SLO_MS', '5000'))
+    
+    # Compressão das respostas (gzip; br com o pacote brotli instalado) a partir
+    # de COMPRESSION_MIN_BYTES, para clientes que a aceitem em Accept-Encoding
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+    # Cache dos arquivos de src/static no navegador (index.html é sempre revalidado pelo ETag)
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '86400'))
+    
+    @staticmethod
+    def collection_paths(name: str) -> dict:
+        """
+        Caminhos da base, dos índices e do FAQ de uma coleção
+        
+        Args:
+            name: Nome da coleção (letras, números, "-" e "_")
+            
+        Returns:
+            Dicionário com CHROMA_DB_PATH, NUMPY_INDEX_PATH, SNAPSHOT_PATH,
+            LEXICAL_INDEX_PATH e FAQ_INDEX_PATH
+        """
+        if name == Config.DEFAULT_COLLECTION:
+            return {
+                "CHROMA_DB_PATH": Config.CHROMA_DB_PATH,
+                "NUMPY_INDEX_PATH": Config.NUMPY_INDEX_PATH,
+                "SNAPSHOT_PATH": Config.SNAPSHOT_PATH,
+                "LEXICAL_INDEX_PATH": Config.LEXICAL_INDEX_PATH,
+                "FAQ_INDEX_PATH": Config.FAQ_INDEX_PATH
+            }
+        if not isinstance(name, str) or not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", name):
+            raise ValueError(f"Nome de coleção inválido: {name!r}")
+        
+        db_path = os.path.join(Config.COLLECTIONS_PATH, name)
+        return {
+            "CHROMA_DB_PATH": db_path,
+            "NUMPY_INDEX_PATH": os.path.join(db_path, "numpy_index"),
+            "SNAPSHOT_PATH": os.path.join(db_path, "kb_snapshot.bin"),
+            "LEXICAL_INDEX_PATH": os.path.join(db_path, "lexical_index"),
+            "FAQ_INDEX_PATH": os.path.join(db_path, "faq_index")
+        }
     
     @staticmethod
     def validate_config():
         """Valida se as configurações obrigatórias estão presentes"""
-        if not Config.OPENAI_API_KEY:
+        if Config.UPSTREAM_PROVIDER != 'fake' and not Config.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY é obrigatória")
         
         return True
@@ -0,0 +1,158 @@
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# Aproximação usada quando o tokenizer não está disponível (sem acesso à rede
+# para baixar o vocabulário do tiktoken): ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+_encodings: Dict[str, object] = {}
+
+
+def _get_encoding(name: str):
+    if name not in _encodings:
+        try:
+            import tiktoken
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception as e:
+            logger.warning(f"Tokenizer {name} indisponível, usando estimativa por caracteres: {str(e)}")
+            _encodings[name] = None
+    return _encodings[name]
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, encoding: str = DEFAULT_ENCODING) -> int:
+    """Quantidade de tokens do texto no tokenizer do modelo"""
+    tokenizer = _get_encoding(encoding)
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, encoding: str = DEFAULT_ENCODING) -> str:
+    """Corta o texto para caber em ``max_tokens``"""
+    tokenizer = _get_encoding(encoding)
+    if tokenizer is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return tokenizer.decode(tokenizer.encode(text, disallowed_special=())[:max_tokens])
+
+
+class _Passage:
+    """Trechos selecionados de uma mesma página, como intervalos de caracteres"""
+
+    __slots__ = ("rank", "pieces")
+
+    def __init__(self, rank: int):
+        self.rank = rank
+        self.pieces: List[Tuple[int, int, str]] = []
+
+    def uncovered(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """Partes de [start, end) ainda não cobertas pelos trechos selecionados"""
+        segments = [(start, end)]
+        for piece_start, piece_end, _ in self.pieces:
+            next_segments = []
+            for seg_start, seg_end in segments:
+                if piece_end <= seg_start or piece_start >= seg_end:
+                    next_segments.append((seg_start, seg_end))
+                    continue
+                if seg_start < piece_start:
+                    next_segments.append((seg_start, piece_start))
+                if piece_end < seg_end:
+                    next_segments.append((piece_end, seg_end))
+            segments = next_segments
+        return segments
+
+    def text(self, separator: str) -> str:
+        """Trechos em ordem de posição; trechos contíguos viram um único texto"""
+        parts: List[str] = []
+        last_end: Optional[int] = None
+        for start, end, text in sorted(self.pieces):
+            if last_end is not None and start == last_end:
+                parts[-1] += text
+            else:
+                parts.append(text)
+            last_end = end
+        return separator.join(parts)
+
+
+class ContextPacker:
+    """
+    Monta o contexto do prompt dentro de um orçamento de tokens
+
+    Os chunks são considerados em ordem de relevância. As regiões
+    sobrepostas entre chunks da mesma página (``chunk_overlap`` da
+    ingestão) são removidas usando o ``start_index`` dos metadados, e os
+    trechos contíguos resultantes são unidos num único texto. Um chunk só
+    entra se couber no que resta de ``max_tokens`` (o mais relevante entra
+    sempre, cortado se necessário). A contagem usa o ``token_count``
+    gravado na ingestão quando o chunk entra inteiro.
+    """
+
+    def __init__(self, max_tokens: int, separator: str = "\n\n----\n\n",
+                 encoding: str = DEFAULT_ENCODING):
+        self.max_tokens = max_tokens
+        self.separator = separator
+        self.encoding = encoding
+
+    def pack(self, results: Sequence[Tuple[Document, float]]) -> List[str]:
+        """
+        Seleciona e deduplica os textos do contexto
+
+        Args:
+            results: Lista de (Document, score), do mais ao menos relevante
+
+        Returns:
+            Textos do contexto, na ordem de relevância do seu melhor chunk
+        """
+        passages: Dict[object, _Passage] = {}
+        separator_tokens = count_tokens(self.separator, self.encoding)
+        used_tokens = 0
+
+        for rank, (doc, _) in enumerate(results):
+            text = doc.page_content
+            start = doc.metadata.get("start_index")
+            if isinstance(start, int) and start >= 0:
+                key = (doc.metadata.get("source"), doc.metadata.get("page"))
+            else:
+                # Sem posição conhecida o chunk é tratado isoladamente
+                key, start = ("chunk", rank), 0
+
+            passage = passages.get(key) or _Passage(rank)
+            segments = passage.uncovered(start, start + len(text))
+            pieces = [(s, e, text[s - start:e - start]) for s, e in segments]
+            pieces = [piece for piece in pieces if piece[2].strip()]
+            if not pieces:
+                continue
+
+            if len(pieces) == 1 and len(pieces[0][2]) == len(text):
+                cost = self._chunk_tokens(doc)
+            else:
+                cost = sum(count_tokens(piece_text, self.encoding) for _, _, piece_text in pieces)
+            cost += separator_tokens * len(pieces)
+            if used_tokens + cost > self.max_tokens:
+                if passages:
+                    continue
+                # O chunk mais relevante entra sempre, cortado no orçamento
+                s, _, piece_text = pieces[0]
+                piece_text = truncate_tokens(piece_text, max(self.max_tokens - separator_tokens, 0), self.encoding)
+                pieces = [(s, s + len(piece_text), piece_text)]
+                cost = self.max_tokens
+
+            used_tokens += cost
+            passage.pieces.extend(pieces)
+            passages[key] = passage
+
+        ordered = sorted(passages.values(), key=lambda p: p.rank)
+        return [passage.text(self.separator) for passage in ordered]
+
+    def _chunk_tokens(self, doc: Document) -> int:
+        stored = doc.metadata.get("token_count")
+        if isinstance(stored, int) and stored >= 0:
+            return stored
+        return count_tokens(doc.page_content, self.encoding)
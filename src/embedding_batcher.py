@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Agrupa chamadas de embed_query concorrentes num único embed_documents
+
+    Perguntas que chegam dentro de uma janela de ``max_wait_ms`` (ou até
+    ``max_batch_size`` textos) são enviadas juntas para a API e cada chamador
+    recebe o seu vetor. Vários lotes podem estar em andamento ao mesmo tempo
+    (``max_concurrent_batches``). Chamadas canceladas antes do envio do lote
+    são descartadas, e ``embed_query`` desiste após ``result_timeout``
+    segundos.
+    """
+
+    def __init__(self, underlying: Embeddings, max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, max_concurrent_batches: int = 4,
+                 result_timeout: Optional[float] = 60.0):
+        self.underlying = underlying
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_concurrent_batches = max_concurrent_batches
+        self.result_timeout = result_timeout
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.batches = 0
+        self.texts = 0
+
+    @property
+    def model(self) -> Optional[str]:
+        return getattr(self.underlying, "model", None)
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        return getattr(self.underlying, "dimensions", None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Lotes explícitos já vão direto para a API"""
+        return self.underlying.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Enfileira o texto e aguarda o resultado do lote"""
+        future = self.submit(text)
+        try:
+            return future.result(timeout=self.result_timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Enfileira o texto sem bloquear o event loop"""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def submit(self, text: str) -> Future:
+        """Enfileira um texto e retorna o Future com o seu embedding"""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def stats(self) -> dict:
+        """Lotes enviados e tamanho médio"""
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def _ensure_worker(self):
+        # A thread coletora não sobrevive a um fork: recriamos por processo
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_batches,
+                thread_name_prefix="embedding-batch"
+            )
+            threading.Thread(target=self._collect, name="embedding-batcher", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _collect(self):
+        pending = self._queue
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: List[Tuple[str, Future]]):
+        # Chamadas já canceladas (ex.: corrotina cancelada) ficam fora do lote
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # Textos repetidos no mesmo lote são enviados uma única vez
+        unique = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = dict(zip(unique, self.underlying.embed_documents(unique)))
+        except Exception as e:
+            for _, future in batch:
+                self._resolve(future, exception=e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.texts += len(unique)
+        for text, future in batch:
+            self._resolve(future, result=vectors[text])
+
+    @staticmethod
+    def _resolve(future: Future, result=None, exception: Optional[BaseException] = None):
+        # Um chamador com problema não pode impedir que os demais do lote recebam o resultado
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError as e:
+            logger.warning(f"Resultado de embedding descartado: {str(e)}")
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Cache de embeddings em dois níveis em volta de outra função de embedding
+
+    A chave é o nome do modelo mais o hash SHA-256 do texto. Os vetores ficam
+    num LRU em memória e são persistidos em SQLite (modo WAL), o que permite
+    que vários processos (workers do gunicorn, populate_db.py) compartilhem
+    o mesmo arquivo e que o cache sobreviva a reinicializações.
+    """
+
+    def __init__(self, underlying: Embeddings, db_path: Optional[str] = None,
+                 memory_entries: int = 10000, model_name: Optional[str] = None):
+        self.underlying = underlying
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.model_name = model_name or self._model_name(underlying)
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL)"
+            )
+            conn.commit()
+
+    @property
+    def model(self) -> str:
+        return self.model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings de vários textos, chamando a API só para os ausentes"""
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        if missing:
+            # Textos repetidos no mesmo lote são enviados uma única vez
+            unique: Dict[str, str] = {}
+            for i in missing:
+                unique.setdefault(keys[i], texts[i])
+            vectors = self.underlying.embed_documents(list(unique.values()))
+            new_entries = dict(zip(unique.keys(), vectors))
+            self._store(new_entries)
+            found.update(new_entries)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embedding da pergunta, consultando o cache antes da API"""
+        key = self._key(text)
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+
+        vector = self.underlying.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        if missing:
+            unique: Dict[str, str] = {}
+            for i in missing:
+                unique.setdefault(keys[i], texts[i])
+            vectors = await self.underlying.aembed_documents(list(unique.values()))
+            new_entries = dict(zip(unique.keys(), vectors))
+            self._store(new_entries)
+            found.update(new_entries)
+
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+
+        vector = await self.underlying.aembed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        """Contadores de acertos e falhas"""
+        return {
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{digest}"
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+        pending = [key for key in set(keys) if key not in found]
+        if pending and self.db_path:
+            conn = self._connection()
+            # Limite de variáveis por consulta do SQLite
+            for start in range(0, len(pending), 500):
+                batch = pending[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            self._remember({key: found[key] for key in pending if key in found})
+
+        hits = sum(1 for key in keys if key in found)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def _store(self, entries: Dict[str, List[float]]):
+        self._remember(entries)
+        if not self.db_path or not entries:
+            return
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [
+                (key, np.asarray(vector, dtype=np.float32).tobytes())
+                for key, vector in entries.items()
+            ]
+        )
+        conn.commit()
+
+    def _remember(self, entries: Dict[str, List[float]]):
+        with self._lock:
+            for key, vector in entries.items():
+                self._memory[key] = vector
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Conexões não podem atravessar um fork, por isso guardamos o pid
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _model_name(embeddings: Embeddings) -> str:
+        model = getattr(embeddings, "model", None) or type(embeddings).__name__
+        dimensions = getattr(embeddings, "dimensions", None)
+        return f"{model}@{dimensions}" if dimensions else str(model)
@@ -0,0 +1,114 @@
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from src.lexical_index import tokenize
+from src.reranker import LexicalOverlapReranker
+
+# Modos de resposta aceitos no campo "modo" das rotas de perguntas
+MODES = ("auto", "lite", "completo")
+
+# Fim de frase: pontuação final seguida de espaço, ou quebra de parágrafo
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+|\n\s*\n")
+MIN_SENTENCE_CHARS = 20
+
+
+def parse_response_options(data: dict) -> Tuple[str, Optional[float], Optional[str]]:
+    """
+    Lê o modo de resposta e o orçamento de latência do corpo da requisição
+
+    Returns:
+        Tupla (modo, orçamento em ms ou None, mensagem de erro ou None)
+    """
+    mode = data.get("modo") or "auto"
+    if mode not in MODES:
+        return mode, None, f"Campo 'modo' deve ser um de: {', '.join(MODES)}"
+
+    budget_ms = data.get("orcamento_ms")
+    if budget_ms is not None and (isinstance(budget_ms, bool) or not isinstance(budget_ms, (int, float)) or budget_ms <= 0):
+        return mode, None, "Campo 'orcamento_ms' deve ser um número positivo"
+    return mode, budget_ms, None
+
+
+def split_sentences(text: str) -> List[str]:
+    """Divide um trecho em frases; frases muito curtas são unidas à seguinte"""
+    sentences: List[str] = []
+    pending = ""
+    for part in _SENTENCE_END_RE.split(text):
+        part = " ".join(part.split())
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= MIN_SENTENCE_CHARS:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+class ExtractiveAnswerer:
+    """
+    Resposta extrativa: o trecho recuperado que melhor responde à pergunta
+
+    Os trechos do contexto são divididos em frases; as ``max_candidates``
+    frases com mais termos da pergunta recebem o score do reranker lexical
+    (cobertura dos termos mais os pares de termos consecutivos, ver
+    src/reranker.py) e a melhor é devolvida junto das frases vizinhas do
+    mesmo trecho, até ``max_chars`` caracteres. Nada é enviado ao serviço
+    de embeddings, então o modo lite responde mesmo com o circuito aberto.
+    """
+
+    def __init__(self, max_candidates: int = 24, max_chars: int = 400):
+        self.max_candidates = max_candidates
+        self.max_chars = max_chars
+        self.scorer = LexicalOverlapReranker()
+
+    def candidates(self, query: str, passages: Sequence[str]) -> List[Tuple[int, int, str]]:
+        """
+        Frases candidatas, com mais termos da pergunta primeiro
+
+        Returns:
+            Lista de (índice do trecho, índice da frase no trecho, frase)
+        """
+        query_terms = set(tokenize(query))
+        scored = []
+        for passage_index, passage in enumerate(passages):
+            for sentence_index, sentence in enumerate(split_sentences(passage)):
+                overlap = len(query_terms.intersection(tokenize(sentence)))
+                # Em caso de empate, preferir os trechos mais relevantes e o início do trecho
+                scored.append((-overlap, passage_index, sentence_index, sentence))
+        scored.sort(key=lambda item: item[:3])
+        return [(passage_index, sentence_index, sentence)
+                for _, passage_index, sentence_index, sentence in scored[:self.max_candidates]]
+
+    def select(self, query: str, passages: Sequence[str],
+               candidates: List[Tuple[int, int, str]]) -> Tuple[str, float]:
+        """
+        Escolhe a frase mais relevante para a pergunta e a expande com as vizinhas
+
+        Returns:
+            Tupla (resposta, score lexical da frase escolhida)
+        """
+        scores = self.scorer.score_batch(query, [sentence for _, _, sentence in candidates])
+        # max devolve o primeiro empatado: os candidatos já vêm na ordem de relevância dos trechos
+        best = max(range(len(candidates)), key=scores.__getitem__)
+        score = scores[best]
+        passage_index, sentence_index, _ = candidates[best]
+
+        # Expandir com as frases seguintes e anteriores do mesmo trecho
+        sentences = split_sentences(passages[passage_index])
+        start, end = sentence_index, sentence_index + 1
+        length = len(sentences[sentence_index])
+        while True:
+            if end < len(sentences) and length + len(sentences[end]) + 1 <= self.max_chars:
+                length += len(sentences[end]) + 1
+                end += 1
+            elif start > 0 and length + len(sentences[start - 1]) + 1 <= self.max_chars:
+                start -= 1
+                length += len(sentences[start]) + 1
+            else:
+                break
+        return " ".join(sentences[start:end]), score
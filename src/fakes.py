@@ -0,0 +1,341 @@
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Função de embedding local e determinística, sem acesso à rede
+
+    Cada texto vira a soma normalizada de vetores pseudoaleatórios das suas
+    palavras, de forma que textos com palavras em comum ficam próximos. A
+    latência de cada chamada é simulada por ``latency_ms`` mais
+    ``per_text_latency_ms`` por texto, como numa API de embeddings real.
+    """
+
+    def __init__(self, dimensions: int = 256, latency_ms: float = 0.0,
+                 per_text_latency_ms: float = 0.0, model: str = "fake-embedding"):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+        self.per_text_latency_ms = per_text_latency_ms
+        self.model = model
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._latency(len(texts)))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._latency(len(texts)))
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def _latency(self, count: int) -> float:
+        with self._lock:
+            self.calls += 1
+            self.texts += count
+        return (self.latency_ms + self.per_text_latency_ms * count) / 1000.0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in text.lower().split():
+            word = word.strip(".,;:!?()[]\"'")
+            if not word:
+                continue
+            seed = int.from_bytes(hashlib.sha1(word.encode("utf-8")).digest()[:4], "little")
+            vector += np.random.default_rng(seed).standard_normal(self.dimensions, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+
+def fake_answer(prompt: str, response_tokens: int) -> Tuple[List[str], dict]:
+    """
+    Resposta simulada para um prompt
+
+    Returns:
+        Tupla (tokens da resposta, uso de tokens no formato usage_metadata)
+    """
+    words = [word for word in prompt.split() if word.isalpha()] or ["resposta"]
+    seed = int.from_bytes(hashlib.sha1(prompt.encode("utf-8")).digest()[:4], "little")
+    rng = random.Random(seed)
+    tokens = [rng.choice(words) + " " for _ in range(response_tokens)]
+    usage = {
+        "input_tokens": len(prompt.split()),
+        "output_tokens": len(tokens),
+        "total_tokens": len(prompt.split()) + len(tokens),
+    }
+    return tokens, usage
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Modelo de chat local e determinístico, sem acesso à rede
+
+    A resposta é uma sequência de ``response_tokens`` palavras sorteadas do
+    próprio prompt, com semente derivada do prompt (a mesma pergunta gera
+    sempre a mesma resposta). Simula a latência até o primeiro token
+    (``first_token_latency_ms``) e entre tokens (``per_token_latency_ms``),
+    tanto em ``invoke`` quanto em ``stream``, e informa o uso de tokens em
+    ``usage_metadata`` como a API da OpenAI.
+    """
+
+    first_token_latency_ms: float = 0.0
+    per_token_latency_ms: float = 0.0
+    response_tokens: int = 40
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens, usage = self._answer(messages)
+        time.sleep(self._total_latency(len(tokens)))
+        message = AIMessage(content="".join(tokens), usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens, usage = self._answer(messages)
+        await asyncio.sleep(self._total_latency(len(tokens)))
+        message = AIMessage(content="".join(tokens), usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens, usage = self._answer(messages)
+        for position, token in enumerate(tokens):
+            time.sleep(self._token_latency(position))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tokens, usage = self._answer(messages)
+        for position, token in enumerate(tokens):
+            await asyncio.sleep(self._token_latency(position))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+    def _answer(self, messages: List[BaseMessage]) -> Tuple[List[str], dict]:
+        self.calls += 1
+        prompt = "\n".join(str(message.content) for message in messages)
+        return fake_answer(prompt, self.response_tokens)
+
+    def _total_latency(self, count: int) -> float:
+        return (self.first_token_latency_ms + self.per_token_latency_ms * max(count - 1, 0)) / 1000.0
+
+    def _token_latency(self, position: int) -> float:
+        return (self.first_token_latency_ms if position == 0 else self.per_token_latency_ms) / 1000.0
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Fila de conexões grande o bastante para os testes de carga
+    request_queue_size = 1024
+
+
+class FakeOpenAIServer:
+    """
+    Servidor HTTP local que imita os endpoints da OpenAI usados pela API
+
+    Atende ``/v1/embeddings`` (com os vetores de FakeEmbeddings) e
+    ``/v1/chat/completions`` (com e sem streaming, respostas de
+    fake_answer), para exercitar os clientes reais da OpenAI e a camada de
+    src/upstream.py sem acesso à rede. Falhas podem ser injetadas com
+    ``fail_next`` e a latência de cada resposta com ``latency_ms``.
+
+    Uso:
+        with FakeOpenAIServer() as server:
+            os.environ["UPSTREAM_BASE_URL"] = server.base_url
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 response_tokens: int = 40):
+        self.latency_ms = latency_ms
+        self.response_tokens = response_tokens
+        self.embeddings = FakeEmbeddings()
+        self.requests: Dict[str, int] = {}
+        self._failures: List[Tuple[Optional[str], int, Optional[float]]] = []
+        self._lock = threading.Lock()
+        self._server = _FakeHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fail_next(self, status: int = 503, times: int = 1, retry_after: Optional[float] = None,
+                  path: Optional[str] = None):
+        """Faz as próximas ``times`` requisições (opcionalmente só de ``path``) responderem ``status``"""
+        with self._lock:
+            self._failures.extend([(path, status, retry_after)] * times)
+
+    def _take_failure(self, path: str) -> Optional[Tuple[int, Optional[float]]]:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            for position, (failure_path, status, retry_after) in enumerate(self._failures):
+                if failure_path is None or path.endswith(failure_path):
+                    del self._failures[position]
+                    return status, retry_after
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                # Clientes fecham conexões keep-alive a qualquer momento
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                time.sleep(server.latency_ms / 1000.0)
+                failure = server._take_failure(self.path)
+                if failure is not None:
+                    status, retry_after = failure
+                    headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+                    self._json(status, {"error": {"message": "falha simulada", "type": "server_error"}}, headers)
+                elif self.path.endswith("/embeddings"):
+                    self._json(200, server._embeddings_response(body))
+                elif self.path.endswith("/chat/completions"):
+                    if body.get("stream"):
+                        self._stream(server._chat_chunks(body))
+                    else:
+                        self._json(200, server._chat_response(body))
+                else:
+                    self._json(404, {"error": {"message": f"Rota desconhecida: {self.path}"}})
+
+            def _json(self, status: int, payload: dict, headers: Optional[dict] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, chunks: Iterator[dict]):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for chunk in chunks:
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        return Handler
+
+    def _embeddings_response(self, body: dict) -> dict:
+        inputs = body.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        # Entradas já tokenizadas viram texto com os ids dos tokens como palavras
+        texts = [text if isinstance(text, str) else " ".join(map(str, text)) for text in inputs]
+        vectors = self.embeddings.embed_documents(texts)
+        data = []
+        for index, vector in enumerate(vectors):
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(text.split()) for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _answer(self, body: dict) -> Tuple[List[str], dict]:
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        return fake_answer(prompt, self.response_tokens)
+
+    def _chat_response(self, body: dict) -> dict:
+        tokens, usage = self._answer(body)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-chat"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": usage["input_tokens"],
+                "completion_tokens": usage["output_tokens"],
+                "total_tokens": usage["total_tokens"],
+            },
+        }
+
+    def _chat_chunks(self, body: dict) -> Iterator[dict]:
+        tokens, usage = self._answer(body)
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": body.get("model", "fake-chat")}
+        for position, token in enumerate(tokens):
+            delta = {"role": "assistant", "content": token} if position == 0 else {"content": token}
+            yield {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield {**base, "choices": [], "usage": {
+                "prompt_tokens": usage["input_tokens"],
+                "completion_tokens": usage["output_tokens"],
+                "total_tokens": usage["total_tokens"],
+            }}
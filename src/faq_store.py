@@ -0,0 +1,104 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.answer_cache import normalize_question
+
+VECTORS_FILENAME = "questions.npy"
+ANSWERS_FILENAME = "answers.json"
+
+
+class FaqStore:
+    """
+    Respostas pré-calculadas para perguntas frequentes
+
+    Gerado offline pelo populate_db.py (``--faq``) para uma versão da base
+    de conhecimento. Cada pergunta canônica tem o seu embedding numa matriz
+    float32 normalizada e a resposta completa (com metadados) no JSON. Uma
+    pergunta é atendida pelo FAQ quando a versão normalizada coincide com a
+    de uma pergunta canônica ou quando a distância de cosseno entre os
+    embeddings é no máximo ``max_distance``.
+    """
+
+    def __init__(self, vectors: np.ndarray, questions: List[str], answers: List[dict],
+                 version: Optional[str] = None, max_distance: float = 0.08):
+        self.vectors = vectors
+        self.questions = questions
+        self.answers = answers
+        self.version = version
+        self.max_distance = max_distance
+        self._positions: Dict[str, int] = {
+            normalize_question(question): position for position, question in enumerate(questions)
+        }
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def get_exact(self, cache_key: str) -> Optional[Tuple[str, dict]]:
+        """
+        Resposta da pergunta canônica com a mesma forma normalizada
+
+        Returns:
+            Tupla (pergunta canônica, resposta) ou None
+        """
+        position = self._positions.get(cache_key)
+        if position is None:
+            return None
+        return self.questions[position], self.answers[position]
+
+    def get_similar(self, query_embedding: List[float]) -> Optional[Tuple[str, dict, float]]:
+        """
+        Resposta da pergunta canônica mais próxima, se estiver dentro de ``max_distance``
+
+        Returns:
+            Tupla (pergunta canônica, resposta, distância de cosseno) ou None
+        """
+        if len(self) == 0 or query_embedding is None:
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm == 0.0 or query.shape[0] != self.vectors.shape[1]:
+            return None
+
+        similarities = self.vectors @ (query / norm)
+        position = int(np.argmax(similarities))
+        distance = 1.0 - float(similarities[position])
+        if distance > self.max_distance:
+            return None
+        return self.questions[position], self.answers[position], distance
+
+    def save(self, path: str):
+        """Grava o FAQ em ``path`` (questions.npy + answers.json)"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, VECTORS_FILENAME + ".tmp.npy"), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        os.replace(os.path.join(path, VECTORS_FILENAME + ".tmp.npy"), os.path.join(path, VECTORS_FILENAME))
+
+        answers_path = os.path.join(path, ANSWERS_FILENAME)
+        with open(answers_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "version": self.version,
+                "questions": self.questions,
+                "answers": self.answers
+            }, f, ensure_ascii=False)
+        os.replace(answers_path + ".tmp", answers_path)
+
+    @classmethod
+    def load(cls, path: str, max_distance: float = 0.08) -> "FaqStore":
+        """Carrega o FAQ gravado por ``save``"""
+        vectors = np.load(os.path.join(path, VECTORS_FILENAME))
+        with open(os.path.join(path, ANSWERS_FILENAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(vectors, data["questions"], data["answers"], data.get("version"), max_distance)
+
+    @classmethod
+    def build(cls, questions: List[str], embeddings: List[List[float]], answers: List[dict],
+              version: Optional[str] = None) -> "FaqStore":
+        """Monta o FAQ a partir das perguntas, dos seus embeddings e das respostas"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if len(vectors):
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        else:
+            vectors = vectors.reshape(0, 0)
+        return cls(vectors, list(questions), list(answers), version)
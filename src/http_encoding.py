@@ -0,0 +1,244 @@
+import gzip
+import json
+import hashlib
+import logging
+import mimetypes
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask.json.provider import DefaultJSONProvider
+
+from src.config import Config
+from src.metrics import registry
+
+try:
+    import orjson
+except ImportError:  # Sem orjson: json da biblioteca padrão
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Sem brotli: apenas gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Tipos de conteúdo que valem a pena comprimir (imagens e fontes já são comprimidas)
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+    "text/xml",
+}
+
+# Codificações suportadas, da preferida para a menos preferida em caso de empate
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Arquivos estáticos que o navegador deve revalidar a cada uso (os demais
+# ficam em cache por STATIC_MAX_AGE segundos)
+REVALIDATE_SUFFIXES = (".html",)
+
+
+def dumps(obj, default=None) -> bytes:
+    """
+    Serializa ``obj`` em JSON (UTF-8, sem escapes de caracteres acentuados)
+
+    Usa o orjson quando instalado; valores que ele não serializa (como
+    Decimal) caem para o json da biblioteca padrão com a função ``default``.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default,
+                                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, default=default).encode("utf-8")
+
+
+def loads(data):
+    """Lê JSON de bytes ou str (ValueError se inválido)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Provider JSON do Flask (jsonify) que usa ``dumps`` deste módulo"""
+
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, self.default).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, self.default) + b"\n", mimetype=self.mimetype)
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Iterable[str] = SUPPORTED_ENCODINGS) -> Optional[str]:
+    """
+    Codificação a usar segundo o cabeçalho Accept-Encoding
+
+    Args:
+        accept_encoding: Valor do cabeçalho (ex.: "gzip, deflate, br;q=0.9")
+        available: Codificações disponíveis, da preferida para a menos preferida
+
+    Returns:
+        A codificação aceita com maior q (None para enviar sem compressão)
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Comprime ``body`` com "gzip" ou "br" (nível padrão da configuração)"""
+    if encoding == "br":
+        return brotli.compress(body, quality=Config.COMPRESSION_BROTLI_QUALITY if level is None else level)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=Config.COMPRESSION_GZIP_LEVEL if level is None else level, mtime=0)
+    raise ValueError(f"Codificação não suportada: {encoding}")
+
+
+def is_compressible(mimetype: Optional[str], size: int) -> bool:
+    """Se uma resposta desse tipo e tamanho deve ser comprimida"""
+    return (Config.COMPRESSION_ENABLED and size >= Config.COMPRESSION_MIN_BYTES
+            and mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def encode_body(body: bytes, mimetype: str, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    Corpo da resposta comprimido na codificação negociada
+
+    Returns:
+        (corpo, codificação); a codificação é None quando a resposta é
+        pequena demais, não é comprimível ou o cliente não aceita compressão
+    """
+    if not is_compressible(mimetype, len(body)):
+        return body, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    compressed = compress(body, encoding)
+    if len(compressed) >= len(body):
+        return body, None
+    registry.inc("api_compression_saved_bytes_total", len(body) - len(compressed), encoding=encoding)
+    return compressed, encoding
+
+
+def compress_response(response, accept_encoding: Optional[str]):
+    """
+    Comprime uma resposta Flask já montada (after_request)
+
+    Respostas em streaming (SSE) e arquivos enviados diretamente são mantidos
+    como estão, assim como as que já têm Content-Encoding.
+    """
+    if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers):
+        return response
+    body = response.get_data()
+    if not is_compressible(response.mimetype, len(body)):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    body, encoding = encode_body(body, response.mimetype, accept_encoding)
+    if encoding is not None:
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+class StaticAsset:
+    """Arquivo estático em memória, com ETag e variantes comprimidas"""
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self.mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.etag = hashlib.sha256(data).hexdigest()[:20]
+        self.variants: Dict[Optional[str], bytes] = {None: data}
+        if is_compressible(self.mimetype, len(data)):
+            # Comprimidas uma única vez, então com o nível máximo
+            for encoding in SUPPORTED_ENCODINGS:
+                compressed = compress(data, encoding, level=11 if encoding == "br" else 9)
+                if len(compressed) < len(data):
+                    self.variants[encoding] = compressed
+
+    def variant_etag(self, encoding: Optional[str]) -> str:
+        return self.etag if encoding is None else f"{self.etag}-{encoding}"
+
+
+class StaticAssets:
+    """
+    Arquivos de src/static carregados na inicialização
+
+    Cada arquivo tem um ETag (hash do conteúdo) e variantes gzip/br
+    pré-comprimidas, então as requisições não leem o disco nem comprimem
+    nada, e as revalidações (If-None-Match) respondem 304 sem corpo.
+    """
+
+    def __init__(self, folder: Optional[str], max_age: int = 86400):
+        self.folder = folder
+        self.max_age = max_age
+        self.assets: Dict[str, StaticAsset] = {}
+        if folder and os.path.isdir(folder):
+            self._load(folder)
+
+    def _load(self, folder: str):
+        for root, _, files in os.walk(folder):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, folder).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    self.assets[name] = StaticAsset(name, f.read())
+        logger.info(f"Arquivos estáticos carregados: {len(self.assets)}")
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        return self.assets.get(name)
+
+    def response(self, asset: StaticAsset, request, response_class):
+        """Resposta 200 (na melhor variante aceita) ou 304 para o arquivo"""
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"), [
+            encoding for encoding in SUPPORTED_ENCODINGS if encoding in asset.variants
+        ])
+        headers = {
+            "Cache-Control": "no-cache" if asset.name.endswith(REVALIDATE_SUFFIXES)
+            else f"public, max-age={self.max_age}",
+        }
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+
+        etag = asset.variant_etag(encoding)
+        if request.if_none_match.contains_weak(etag):
+            response = response_class(status=304, headers=headers)
+        else:
+            response = response_class(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+            if encoding is not None:
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        return response
@@ -0,0 +1,78 @@
+import os
+import time
+import uuid
+from typing import Optional
+
+VERSION_FILENAME = "kb_version.txt"
+
+
+def version_file_path(db_path: str) -> str:
+    """Caminho do arquivo que marca a versão da base de conhecimento"""
+    return os.path.join(db_path, VERSION_FILENAME)
+
+
+def read_kb_version(db_path: str) -> Optional[str]:
+    """
+    Lê a versão atual da base de conhecimento
+
+    Args:
+        db_path: Diretório da base Chroma
+
+    Returns:
+        Identificador da versão ou None se a base nunca foi versionada
+    """
+    try:
+        with open(version_file_path(db_path), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def bump_kb_version(db_path: str) -> str:
+    """
+    Gera uma nova versão para a base de conhecimento
+
+    Deve ser chamada sempre que a base Chroma for reconstruída, para que os
+    caches derivados dela sejam invalidados.
+
+    Args:
+        db_path: Diretório da base Chroma
+
+    Returns:
+        Identificador da nova versão
+    """
+    os.makedirs(db_path, exist_ok=True)
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    tmp_path = version_file_path(db_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, version_file_path(db_path))
+    return version
+
+
+class KnowledgeBaseVersionWatcher:
+    """
+    Detecta, com custo de um stat, quando a base foi reconstruída
+
+    Com ``filename`` observa outro arquivo do diretório (por exemplo, as
+    respostas do FAQ pré-calculado, regeradas depois da base).
+    """
+
+    def __init__(self, db_path: str, filename: str = VERSION_FILENAME):
+        self.db_path = db_path
+        self.filename = filename
+        self._last_mtime = self._current_mtime()
+
+    def _current_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.db_path, self.filename)).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed(self) -> bool:
+        """Retorna True uma única vez após cada reconstrução da base"""
+        mtime = self._current_mtime()
+        if mtime != self._last_mtime:
+            self._last_mtime = mtime
+            return True
+        return False
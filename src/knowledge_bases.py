@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from src.config import Config
+from src.metrics import registry
+from src.semantic_search import SemanticSearchService, semantic_service
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionNotFoundError(LookupError):
+    """Coleção pedida não existe em COLLECTIONS_PATH"""
+
+
+def _resident_memory_mb() -> Optional[float]:
+    """Memória residente do processo em MB (None fora do Linux)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class KnowledgeBaseRegistry:
+    """
+    Serviços de busca por coleção, abertos sob demanda
+
+    A coleção padrão é o ``semantic_service`` global. As demais são abertas
+    na primeira pergunta (base Chroma, índices e FAQ da pasta da coleção),
+    reaproveitando os clientes HTTP, os embeddings e o modelo do serviço
+    padrão, e ficam num LRU de até ``max_open`` coleções. Antes de abrir uma
+    nova coleção, a menos usada sai do LRU se o limite de coleções ou de
+    memória residente (``max_memory_mb``) tiver sido atingido.
+
+    Cada requisição recebe o serviço com ``acquire`` e o devolve com
+    ``release``: uma coleção retirada do LRU só é fechada quando as
+    requisições que ainda a usam terminam.
+    """
+
+    def __init__(self, default_service: SemanticSearchService, max_open: int = 8,
+                 max_memory_mb: float = 0.0):
+        self.default_service = default_service
+        self.max_open = max(1, max_open)
+        self.max_memory_mb = max_memory_mb
+        self._open: "OrderedDict[str, SemanticSearchService]" = OrderedDict()
+        self._opening: Dict[str, threading.Lock] = {}
+        # Requisições em andamento por serviço e serviços retirados do LRU à espera delas
+        self._leases: Dict[SemanticSearchService, int] = {}
+        self._retired: Set[SemanticSearchService] = set()
+        self._lock = threading.Lock()
+        registry.register_gauge(
+            "api_collections_open", lambda: {"open": float(len(self._open))},
+            "Coleções nomeadas abertas no processo"
+        )
+
+    def acquire(self, name: Optional[str] = None) -> SemanticSearchService:
+        """
+        Serviço da coleção, abrindo-a se necessário
+
+        O serviço fica reservado para a requisição até ``release``, mesmo que
+        a coleção saia do LRU nesse meio tempo.
+
+        Args:
+            name: Nome da coleção (vazio ou DEFAULT_COLLECTION para a padrão)
+
+        Raises:
+            ValueError: Nome de coleção inválido
+            CollectionNotFoundError: A coleção não existe
+            RuntimeError: Falha ao abrir a coleção
+        """
+        if not name or name == Config.DEFAULT_COLLECTION:
+            return self.default_service
+
+        with self._lock:
+            service = self._lease_open(name)
+            if service is not None:
+                return service
+            opening = self._opening.setdefault(name, threading.Lock())
+
+        # Uma única abertura por coleção; as demais perguntas aguardam
+        with opening:
+            with self._lock:
+                service = self._lease_open(name)
+                if service is not None:
+                    return service
+            service = self._open_collection(name)
+            with self._lock:
+                self._open[name] = service
+                self._opening.pop(name, None)
+                self._leases[service] = self._leases.get(service, 0) + 1
+            return service
+
+    def release(self, service: SemanticSearchService):
+        """Devolve o serviço obtido com ``acquire``, fechando-o se já saiu do LRU e ninguém mais o usa"""
+        if service is self.default_service:
+            return
+        with self._lock:
+            leases = self._leases.get(service, 0) - 1
+            if leases > 0:
+                self._leases[service] = leases
+                return
+            self._leases.pop(service, None)
+            if service not in self._retired:
+                return
+            self._retired.discard(service)
+        service.close()
+        logger.info(f"Coleção {service.collection} fechada após as requisições em andamento")
+
+    def _lease_open(self, name: str) -> Optional[SemanticSearchService]:
+        """Reserva o serviço da coleção se ela estiver aberta (chamado com o lock)"""
+        service = self._open.get(name)
+        if service is not None:
+            self._open.move_to_end(name)
+            self._leases[service] = self._leases.get(service, 0) + 1
+        return service
+
+    def _open_collection(self, name: str) -> SemanticSearchService:
+        db_path = Config.collection_paths(name)["CHROMA_DB_PATH"]
+        if not os.path.isdir(db_path):
+            raise CollectionNotFoundError(f"Coleção '{name}' não encontrada")
+
+        self._evict()
+        service = SemanticSearchService(collection=name)
+        if not service.initialize(shared=self.default_service):
+            raise RuntimeError(f"Falha ao abrir a coleção '{name}': {service.startup.snapshot().get('erro')}")
+        service.startup.mark_ready()
+        registry.inc("api_collection_loads_total", collection=name)
+        logger.info(f"Coleção {name} aberta em {service.startup.snapshot()['elapsed_ms']}ms")
+        return service
+
+    def _evict(self):
+        """
+        Retira a coleção menos usada do LRU se o limite de coleções ou de
+        memória foi atingido
+
+        Ela é fechada na hora se não houver requisições em andamento; caso
+        contrário, quando a última delas chamar ``release``.
+        """
+        memory_mb = _resident_memory_mb() if self.max_memory_mb > 0 else None
+        over_memory = memory_mb is not None and memory_mb >= self.max_memory_mb
+        with self._lock:
+            if not self._open or (len(self._open) < self.max_open and not over_memory):
+                return
+            name, service = self._open.popitem(last=False)
+            in_use = self._leases.get(service, 0) > 0
+            if in_use:
+                self._retired.add(service)
+
+        registry.inc("api_collection_evictions_total", reason="memory" if over_memory else "max_open")
+        reason = 'memória' if over_memory else 'limite de coleções'
+        if in_use:
+            logger.info(f"Coleção {name} retirada ({reason}), fechada ao fim das requisições em andamento")
+            return
+        service.close()
+        logger.info(f"Coleção {name} fechada ({reason})")
+
+    def available(self) -> List[str]:
+        """Coleções existentes em COLLECTIONS_PATH (além da padrão)"""
+        if not os.path.isdir(Config.COLLECTIONS_PATH):
+            return []
+        return sorted(
+            name for name in os.listdir(Config.COLLECTIONS_PATH)
+            if os.path.isdir(os.path.join(Config.COLLECTIONS_PATH, name))
+        )
+
+    def open_collections(self) -> List[str]:
+        """Coleções abertas, da menos à mais usada recentemente"""
+        with self._lock:
+            return list(self._open)
+
+
+# Coleções da instância global do serviço
+knowledge_bases = KnowledgeBaseRegistry(
+    semantic_service,
+    max_open=Config.COLLECTIONS_MAX_OPEN,
+    max_memory_mb=Config.COLLECTIONS_MAX_MEMORY_MB
+)
@@ -0,0 +1,206 @@
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+POSTINGS_FILENAME = "postings.npz"
+CHUNKS_FILENAME = "chunks.json"
+
+# Stopwords do português (sem acentos, já que a tokenização os remove)
+STOPWORDS = frozenset("""
+a ao aos as ate com como da das de dela dele deles do dos e ela elas ele eles em
+entre era eram essa essas esse esses esta estao estas este estes eu foi foram ha
+isso isto ja lhe lhes mais mas me mesmo meu minha muito na nao nas nem no nos
+nossa nosso num numa o os ou para pela pelas pelo pelos por qual quando que quem
+se sem ser seu seus sao so sua suas tambem te tem ter teu tu tua um uma umas uns
+voce voces vos quais sobre sera sendo sido
+""".split())
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Regras de redução de plural, aplicadas na ordem (sufixo, substituto, tamanho mínimo)
+_PLURAL_RULES = (
+    ("coes", "cao", 5),
+    ("oes", "ao", 4),
+    ("aes", "ao", 4),
+    ("ais", "al", 4),
+    ("eis", "el", 4),
+    ("ois", "ol", 4),
+    ("ns", "m", 4),
+    ("res", "r", 4),
+    ("s", "", 4),
+)
+
+
+def _strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _stem(token: str) -> str:
+    if token.isdigit():
+        return token
+    for suffix, replacement, min_length in _PLURAL_RULES:
+        if len(token) >= min_length and token.endswith(suffix):
+            if suffix == "s" and token.endswith(("ss", "us", "is")):
+                return token
+            return token[: -len(suffix)] + replacement
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenização para português
+
+    Converte para minúsculas, remove acentos e stopwords e reduz plurais, de
+    forma que "Gráficos de Controle" e "grafico controle" gerem os mesmos
+    termos.
+    """
+    tokens = _TOKEN_RE.findall(_strip_accents(text.lower()))
+    return [_stem(t) for t in tokens if (len(t) > 1 or t.isdigit()) and t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Índice invertido BM25 sobre os mesmos chunks da base vetorial
+
+    As listas de postings ficam em arrays NumPy contíguos (offsets, ids de
+    documento e peso BM25 do termo no documento já calculado), e o IDF de
+    cada termo é pré-computado. Uma consulta soma ``idf * peso`` sobre as
+    postings dos seus termos.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], offsets: np.ndarray, doc_ids: np.ndarray,
+                 weights: np.ndarray, idf: np.ndarray, ids: List[str], texts: List[str],
+                 metadatas: List[dict]):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.idf = idf
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[dict],
+              k1: float = 1.2, b: float = 0.75) -> "LexicalIndex":
+        """Constrói o índice a partir dos chunks"""
+        term_docs: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                term_docs.setdefault(term, []).append((doc, tf))
+
+        avg_length = float(lengths.mean()) if len(texts) else 0.0
+        vocabulary = {term: i for i, term in enumerate(sorted(term_docs))}
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        doc_ids = np.zeros(sum(len(p) for p in term_docs.values()), dtype=np.int32)
+        weights = np.zeros(len(doc_ids), dtype=np.float32)
+        idf = np.zeros(len(vocabulary), dtype=np.float32)
+
+        position = 0
+        for term, term_id in vocabulary.items():
+            postings = term_docs[term]
+            docs = np.array([d for d, _ in postings], dtype=np.int32)
+            tfs = np.array([tf for _, tf in postings], dtype=np.float32)
+            norm = k1 * (1 - b + b * lengths[docs] / max(avg_length, 1e-9))
+            doc_ids[position:position + len(docs)] = docs
+            weights[position:position + len(docs)] = tfs * (k1 + 1) / (tfs + norm)
+            idf[term_id] = np.log(1 + (len(texts) - len(docs) + 0.5) / (len(docs) + 0.5))
+            position += len(docs)
+            offsets[term_id + 1] = position
+
+        return cls(vocabulary, offsets, doc_ids, weights, idf, list(ids), list(texts),
+                   [dict(m or {}) for m in metadatas])
+
+    def search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """
+        Busca BM25
+
+        Returns:
+            Lista de (Document, cobertura), onde cobertura é a fração dos
+            termos da pergunta presentes no chunk (0 a 1)
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        terms = [self.vocabulary[t] for t in tokens if t in self.vocabulary]
+        if not terms or not len(self):
+            return []
+
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched = np.zeros(len(self), dtype=np.int16)
+        for term_id in terms:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            scores[docs] += self.idf[term_id] * self.weights[start:end]
+            matched[docs] += 1
+
+        candidates = np.flatnonzero(scores)
+        k = min(k, len(candidates))
+        if k < len(candidates):
+            top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        else:
+            top = candidates
+        top = top[np.argsort(-scores[top])]
+        return [(self.document(int(i)), float(matched[i]) / len(tokens)) for i in top]
+
+    def document(self, position: int) -> Document:
+        """Documento do chunk na posição informada"""
+        return Document(
+            id=self.ids[position],
+            page_content=self.texts[position],
+            metadata=self.metadatas[position]
+        )
+
+    def save(self, path: str):
+        """Grava o índice em ``path`` (postings.npz + chunks.json)"""
+        os.makedirs(path, exist_ok=True)
+        vocabulary = np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str)
+        tmp_path = os.path.join(path, "postings.tmp.npz")
+        np.savez(tmp_path, vocabulary=vocabulary, offsets=self.offsets,
+                 doc_ids=self.doc_ids, weights=self.weights, idf=self.idf)
+        os.replace(tmp_path, os.path.join(path, POSTINGS_FILENAME))
+
+        chunks_path = os.path.join(path, CHUNKS_FILENAME)
+        with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "texts": self.texts, "metadatas": self.metadatas}, f, ensure_ascii=False)
+        os.replace(chunks_path + ".tmp", chunks_path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        """Carrega o índice gravado por ``save``"""
+        with np.load(os.path.join(path, POSTINGS_FILENAME)) as data:
+            vocabulary = {str(term): i for i, term in enumerate(data["vocabulary"])}
+            arrays = (data["offsets"], data["doc_ids"], data["weights"], data["idf"])
+        with open(os.path.join(path, CHUNKS_FILENAME), "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        return cls(vocabulary, *arrays, chunks["ids"], chunks["texts"], chunks["metadatas"])
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Tuple[Document, float]]],
+                           k: int = 60) -> List[Tuple[Document, float]]:
+    """
+    Combina rankings pela fusão de posições recíprocas (RRF)
+
+    Cada documento recebe a soma de 1 / (k + posição) nas listas em que
+    aparece; documentos são identificados pelo id do chunk.
+    """
+    fused: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, (doc, _) in enumerate(results, start=1):
+            key = doc.id or doc.page_content
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return [(documents[key], score) for key, score in ranked]
@@ -6,10 +6,19 @@ from datetime import datetime
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory, request, jsonify
+from flask import Flask, Response, send_from_directory, request, jsonify, stream_with_context, g
 from flask_cors import CORS
 from src.config import Config
 from src.semantic_search import semantic_service
+from src.knowledge_bases import CollectionNotFoundError, knowledge_bases
+from src.extractive import parse_response_options
+from src.sessions import SessionNotFoundError, lookup_session
+from src.admission import (
+    AdmissionRejected, admission, batch_cost, check_rate_limit, client_key, refund_rate_limit,
+    request_priority, validate_batch_admission
+)
+from src.http_encoding import FastJSONProvider, StaticAssets, compress_response, dumps
+from src.metrics import registry, track_request
 
 # Configurar logging
 logging.basicConfig(
@@ -18,14 +27,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Rotas de perguntas sujeitas ao limite por cliente e à fila de admissão, com a prioridade padrão
+ADMISSION_PRIORITIES = {
+    "/api/ask": "interactive",
+    "/api/ask/stream": "interactive",
+    "/api/ask/batch": "batch",
+}
+
 def create_app():
     """Factory function para criar a aplicação Flask"""
     
     app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.json = FastJSONProvider(app)
     
     # Configurações
     try:
         Config.validate_config()
+        validate_batch_admission()
         app.config.from_object(Config)
         logger.info("Configurações carregadas com sucesso")
     except Exception as e:
@@ -35,24 +53,80 @@ def create_app():
     # CORS
     CORS(app, origins="*")
     
-    # Inicializar serviço de busca semântica
-    if not semantic_service.initialize():
+    # Arquivos estáticos em memória, com ETag e variantes pré-comprimidas
+    static_assets = StaticAssets(app.static_folder, Config.STATIC_MAX_AGE)
+    
+    # Inicializar serviço de busca semântica (em segundo plano, ver /api/ready)
+    if not semantic_service.start(background=Config.STARTUP_MODE != 'eager'):
         logger.error("Falha ao inicializar serviço de busca semântica")
         # Em produção, você pode querer falhar aqui ou usar um fallback
     
     @app.before_request
     def log_request_info():
         """Log das requisições recebidas"""
-        if request.endpoint != 'health_check':  # Evitar spam de health checks
+        if request.endpoint not in ('health_check', 'readiness_check', 'metrics', 'estado_admissao'):  # Evitar spam de health checks e coletas
             logger.info(f"Requisição: {request.method} {request.path} - IP: {request.remote_addr}")
     
+    @app.before_request
+    def admitir_requisicao():
+        """Limite por cliente e fila de admissão das rotas de perguntas"""
+        prioridade = ADMISSION_PRIORITIES.get(request.path)
+        if prioridade is None or request.method != 'POST':
+            return None
+        
+        headers = {nome.lower(): valor for nome, valor in request.headers.items()}
+        try:
+            # Cada pergunta de um lote consome uma ficha (até o balde inteiro)
+            data = request.get_json(silent=True)
+            perguntas = data.get('perguntas') if isinstance(data, dict) else None
+            custo = batch_cost(len(perguntas)) if request.path == '/api/ask/batch' and isinstance(perguntas, list) else 1
+            cliente = client_key(headers, request.remote_addr)
+            check_rate_limit(cliente, custo)
+            g.cobranca = (cliente, custo)
+            g.admissao = admission.acquire(request_priority(prioridade, headers))
+        except AdmissionRejected as e:
+            logger.warning(f"Requisição recusada ({e.reason}): {request.path} - IP: {request.remote_addr}")
+            return jsonify({
+                "erro": str(e),
+                "status": "error",
+                "timestamp": datetime.utcnow().isoformat()
+            }), e.status_code, e.headers
+        return None
+    
+    @app.teardown_request
+    def liberar_admissao(error):
+        """Libera a vaga da fila de admissão (nas respostas SSE, ao fim do stream)"""
+        admitida_em = g.pop('admissao', None)
+        if admitida_em is not None:
+            admission.release(admitida_em)
+    
+    @app.after_request
+    def devolver_fichas(response):
+        """Requisições inválidas (400) não consomem o limite do cliente"""
+        cobranca = g.pop('cobranca', None)
+        if cobranca is not None and response.status_code == 400:
+            refund_rate_limit(*cobranca)
+        return response
+    
+    @app.teardown_request
+    def liberar_colecao(error):
+        """Devolve o serviço da coleção usado pela requisição (nas respostas SSE, ao fim do stream)"""
+        servico = g.pop('servico', None)
+        if servico is not None:
+            knowledge_bases.release(servico)
+    
     @app.after_request
     def after_request(response):
         """Log das respostas enviadas"""
-        if request.endpoint != 'health_check':
+        if request.endpoint not in ('health_check', 'readiness_check', 'metrics', 'estado_admissao'):
             logger.info(f"Resposta: {response.status_code} para {request.method} {request.path}")
         return response
     
+    @app.after_request
+    def comprimir_resposta(response):
+        """Compressão gzip/br negociada pelo Accept-Encoding (exceto streaming)"""
+        return compress_response(response, request.headers.get('Accept-Encoding'))
+    
     @app.errorhandler(404)
     def not_found(error):
         """Handler para erro 404"""
@@ -72,9 +146,187 @@ def create_app():
             "code": 500
         }), 500
     
+    def ler_pergunta():
+        """Valida o corpo da requisição e retorna (pergunta, resposta de erro)"""
+        # Validar Content-Type
+        if not request.is_json:
+            return None, (jsonify({
+                "erro": "Content-Type deve ser application/json",
+                "status": "error"
+            }), 400)
+        
+        data = request.get_json()
+        
+        if not data:
+            return None, (jsonify({
+                "erro": "Dados JSON inválidos ou vazios",
+                "status": "error"
+            }), 400)
+
+        pergunta = data.get('pergunta')
+        if not pergunta or not isinstance(pergunta, str) or not pergunta.strip():
+            return None, (jsonify({
+                "erro": "Campo 'pergunta' é obrigatório e deve ser uma string não vazia",
+                "status": "error"
+            }), 400)
+        
+        return pergunta, None
+    
+    def ler_opcoes():
+        """Modo de resposta ("modo") e orçamento de latência ("orcamento_ms"); retorna (opções, resposta de erro)"""
+        data = request.get_json(silent=True)
+        modo, orcamento_ms, mensagem = parse_response_options(data if isinstance(data, dict) else {})
+        if mensagem:
+            return None, (jsonify({"erro": mensagem, "status": "error"}), 400)
+        return {"mode": modo, "budget_ms": orcamento_ms}, None
+    
+    def aguardar_servico():
+        """Aguarda a inicialização do serviço; retorna a resposta 503 se ele não ficar pronto"""
+        if semantic_service.wait_until_ready(Config.STARTUP_WAIT_TIMEOUT):
+            return None
+        return (jsonify({
+            "erro": "Serviço iniciando, tente novamente em instantes",
+            "status": "error",
+            "startup": semantic_service.startup.snapshot(),
+            "timestamp": datetime.utcnow().isoformat()
+        }), 503, {"Retry-After": "5"})
+    
+    def obter_servico():
+        """
+        Serviço da coleção pedida (campo 'colecao' ou cabeçalho X-Collection); retorna (serviço, resposta de erro)
+        
+        O serviço fica reservado até o fim da requisição (liberar_colecao).
+        """
+        data = request.get_json(silent=True)
+        colecao = (data.get('colecao') if isinstance(data, dict) else None) or request.headers.get('X-Collection')
+        try:
+            g.servico = knowledge_bases.acquire(colecao)
+            return g.servico, None
+        except ValueError as e:
+            return None, (jsonify({"erro": str(e), "status": "error"}), 400)
+        except CollectionNotFoundError as e:
+            return None, (jsonify({"erro": str(e), "status": "error"}), 404)
+        except Exception as e:
+            logger.error(f"Erro ao abrir a coleção {colecao}: {str(e)}")
+            return None, (jsonify({
+                "erro": "Não foi possível abrir a coleção",
+                "status": "error",
+                "timestamp": datetime.utcnow().isoformat()
+            }), 503)
+    
+    def obter_sessao(servico):
+        """Sessão de conversa do campo 'sessao'; retorna (sessão ou None, resposta de erro)"""
+        data = request.get_json(silent=True)
+        try:
+            return lookup_session(servico.session_store, data.get('sessao') if isinstance(data, dict) else None), None
+        except ValueError as e:
+            return None, (jsonify({"erro": str(e), "status": "error"}), 400)
+        except SessionNotFoundError as e:
+            return None, (jsonify({"erro": str(e), "status": "error"}), 404)
+    
+    def resposta_sse(servico, pergunta, opcoes):
+        """Resposta em Server-Sent Events com os eventos do processamento"""
+        def eventos():
+            for evento in servico.process_query_stream(pergunta, **opcoes):
+                dados = evento["data"]
+                if evento["event"] in ("done", "error"):
+                    dados = {**dados, "timestamp": datetime.utcnow().isoformat()}
+                yield b"event: %s\ndata: %s\n\n" % (evento["event"].encode(), dumps(dados))
+        
+        return Response(
+            stream_with_context(eventos()),
+            mimetype='text/event-stream',
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"
+            }
+        )
+    
     @app.route('/api/ask', methods=['POST'])
     def perguntar():
         """Endpoint principal para fazer perguntas à base de conhecimento"""
+        try:
+            pergunta, erro = ler_pergunta()
+            if erro:
+                return erro
+            
+            opcoes, erro = ler_opcoes()
+            if erro:
+                return erro
+            
+            erro = aguardar_servico()
+            if erro:
+                return erro
+            
+            servico, erro = obter_servico()
+            if erro:
+                return erro
+            
+            opcoes["session"], erro = obter_sessao(servico)
+            if erro:
+                return erro
+            
+            # Clientes que aceitam text/event-stream recebem a resposta em streaming
+            if request.accept_mimetypes.best == 'text/event-stream':
+                logger.info(f"Processando pergunta (streaming): {pergunta[:100]}...")
+                return resposta_sse(servico, pergunta, opcoes)
+
+            # Processar pergunta
+            logger.info(f"Processando pergunta: {pergunta[:100]}...")
+            resultado = servico.process_query(pergunta, **opcoes)
+            
+            # Adicionar timestamp
+            resultado['timestamp'] = datetime.utcnow().isoformat()
+            
+            status_code = 200 if resultado.get('status') == 'success' else 500
+            return jsonify(resultado), status_code
+
+        except Exception as e:
+            logger.error(f"Erro não tratado em /api/ask: {str(e)}")
+            return jsonify({
+                "erro": "Erro interno do servidor",
+                "status": "error",
+                "timestamp": datetime.utcnow().isoformat()
+            }), 500
+
+    @app.route('/api/ask/stream', methods=['POST'])
+    def perguntar_stream():
+        """Faz uma pergunta e recebe a resposta token a token via SSE"""
+        try:
+            pergunta, erro = ler_pergunta()
+            if erro:
+                return erro
+            
+            opcoes, erro = ler_opcoes()
+            if erro:
+                return erro
+            
+            erro = aguardar_servico()
+            if erro:
+                return erro
+            
+            servico, erro = obter_servico()
+            if erro:
+                return erro
+            
+            opcoes["session"], erro = obter_sessao(servico)
+            if erro:
+                return erro
+            
+            logger.info(f"Processando pergunta (streaming): {pergunta[:100]}...")
+            return resposta_sse(servico, pergunta, opcoes)
+
+        except Exception as e:
+            logger.error(f"Erro não tratado em /api/ask/stream: {str(e)}")
+            return jsonify({
+                "erro": "Erro interno do servidor",
+                "status": "error",
+                "timestamp": datetime.utcnow().isoformat()
+            }), 500
+
+    @app.route('/api/ask/batch', methods=['POST'])
+    def perguntar_lote():
+        """Faz várias perguntas de uma vez, com um resultado (ou erro) por pergunta"""
         try:
             # Validar Content-Type
             if not request.is_json:
@@ -84,44 +336,99 @@ def create_app():
                 }), 400
             
             data = request.get_json()
-            
-            if not data:
+            perguntas = data.get('perguntas') if isinstance(data, dict) else None
+            if not perguntas or not isinstance(perguntas, list):
                 return jsonify({
-                    "erro": "Dados JSON inválidos ou vazios",
+                    "erro": "Campo 'perguntas' é obrigatório e deve ser uma lista não vazia",
                     "status": "error"
                 }), 400
-
-            pergunta = data.get('pergunta')
-            if not pergunta or not isinstance(pergunta, str) or not pergunta.strip():
+            
+            if len(perguntas) > Config.BATCH_MAX_QUESTIONS:
                 return jsonify({
-                    "erro": "Campo 'pergunta' é obrigatório e deve ser uma string não vazia",
+                    "erro": f"Máximo de {Config.BATCH_MAX_QUESTIONS} perguntas por lote",
                     "status": "error"
                 }), 400
-
-            # Processar pergunta
-            logger.info(f"Processando pergunta: {pergunta[:100]}...")
-            resultado = semantic_service.process_query(pergunta)
             
-            # Adicionar timestamp
-            resultado['timestamp'] = datetime.utcnow().isoformat()
+            opcoes, erro = ler_opcoes()
+            if erro:
+                return erro
             
-            status_code = 200 if resultado.get('status') == 'success' else 500
-            return jsonify(resultado), status_code
+            erro = aguardar_servico()
+            if erro:
+                return erro
+            
+            servico, erro = obter_servico()
+            if erro:
+                return erro
+            
+            logger.info(f"Processando lote de {len(perguntas)} perguntas...")
+            with track_request() as timings:
+                resultados = servico.process_batch(perguntas, mode=opcoes["mode"])
+            
+            return jsonify({
+                "resultados": [
+                    {"pergunta": pergunta, **resultado}
+                    for pergunta, resultado in zip(perguntas, resultados)
+                ],
+                "status": "success",
+                "metadata": {
+                    "total": len(resultados),
+                    "erros": sum(1 for resultado in resultados if resultado.get("status") != "success"),
+                    "timings_ms": dict(timings)
+                },
+                "timestamp": datetime.utcnow().isoformat()
+            })
 
         except Exception as e:
-            logger.error(f"Erro não tratado em /api/ask: {str(e)}")
+            logger.error(f"Erro não tratado em /api/ask/batch: {str(e)}")
             return jsonify({
                 "erro": "Erro interno do servidor",
                 "status": "error",
                 "timestamp": datetime.utcnow().isoformat()
             }), 500
 
+    @app.route('/api/sessions', methods=['POST'])
+    def criar_sessao():
+        """Cria uma sessão de conversa para perguntas de continuação"""
+        erro = aguardar_servico()
+        if erro:
+            return erro
+        
+        servico, erro = obter_servico()
+        if erro:
+            return erro
+        
+        if servico.session_store is None:
+            return jsonify({"erro": "Sessões de conversa desativadas", "status": "error"}), 400
+        
+        sessao = servico.session_store.create(servico.collection)
+        return jsonify({
+            "sessao": sessao.id,
+            "colecao": servico.collection,
+            "expira_apos_s": servico.session_store.ttl_seconds,
+            "status": "success",
+            "timestamp": datetime.utcnow().isoformat()
+        }), 201
+
+    @app.route('/api/sessions/<sessao_id>', methods=['DELETE'])
+    def encerrar_sessao(sessao_id):
+        """Encerra uma sessão de conversa"""
+        store = semantic_service.session_store
+        if store is None or not store.delete(sessao_id):
+            return jsonify({"erro": f"Sessão '{sessao_id}' não encontrada ou expirada", "status": "error"}), 404
+        return jsonify({"status": "success", "timestamp": datetime.utcnow().isoformat()})
+
     @app.route('/api/health', methods=['GET'])
     def health_check():
         """Endpoint para verificar se a API está funcionando"""
         try:
             # Verificar se o serviço de busca está funcionando
-            service_status = "healthy" if semantic_service.db is not None else "degraded"
+            if semantic_service.startup.is_ready:
+                service_status = "healthy"
+            elif semantic_service.startup.status == "failed":
+                service_status = "degraded"
+            else:
+                service_status = "starting"
             
             return jsonify({
                 "status": "healthy",
@@ -138,6 +445,41 @@ def create_app():
                 "timestamp": datetime.utcnow().isoformat()
             }), 500
 
+    @app.route('/api/ready', methods=['GET'])
+    def readiness_check():
+        """Readiness probe: 200 só depois de o serviço ser inicializado e aquecido"""
+        startup = semantic_service.startup.snapshot()
+        return jsonify({
+            "status": "ready" if semantic_service.startup.is_ready else startup["status"],
+            "startup": startup,
+            "timestamp": datetime.utcnow().isoformat()
+        }), 200 if semantic_service.startup.is_ready else 503
+
+    @app.route('/api/collections', methods=['GET'])
+    def listar_colecoes():
+        """Coleções disponíveis e coleções abertas neste processo"""
+        return jsonify({
+            "padrao": Config.DEFAULT_COLLECTION,
+            "colecoes": [Config.DEFAULT_COLLECTION] + knowledge_bases.available(),
+            "abertas": knowledge_bases.open_collections(),
+            "status": "success",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    @app.route('/api/admission', methods=['GET'])
+    def estado_admissao():
+        """Ocupação da fila de admissão deste processo"""
+        return jsonify({
+            **admission.stats(),
+            "status": "success",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics():
+        """Métricas de latência por etapa e de cache no formato do Prometheus"""
+        return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
     @app.route('/api/info', methods=['GET'])
     def api_info():
         """Informações sobre a API"""
@@ -147,7 +489,15 @@ def create_app():
             "description": "API para busca semântica usando LangChain e OpenAI",
             "endpoints": {
                 "POST /api/ask": "Fazer uma pergunta à base de conhecimento",
+                "POST /api/ask/stream": "Fazer uma pergunta e receber a resposta via Server-Sent Events",
+                "POST /api/ask/batch": "Fazer várias perguntas de uma vez",
                 "GET /api/health": "Verificar status da API",
+                "GET /api/ready": "Verificar se o serviço terminou de inicializar (readiness probe)",
+                "GET /api/collections": "Listar as bases de conhecimento (coleções) disponíveis",
+                "POST /api/sessions": "Criar uma sessão de conversa (campo 'sessao' das perguntas)",
+                "DELETE /api/sessions/<id>": "Encerrar uma sessão de conversa",
+                "GET /api/admission": "Ocupação da fila de admissão (perguntas em atendimento e na fila)",
+                "GET /api/metrics": "Métricas de latência e cache (formato Prometheus)",
                 "GET /api/info": "Informações sobre a API"
             },
             "timestamp": datetime.utcnow().isoformat()
@@ -159,12 +509,16 @@ def create_app():
         """Servir arquivos estáticos ou informações da API"""
         static_folder_path = app.static_folder
         
+        asset = static_assets.get(path or 'index.html')
+        if asset is not None:
+            return static_assets.response(asset, request, app.response_class)
         if static_folder_path and path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            # Arquivo criado depois da inicialização
             return send_from_directory(static_folder_path, path)
         else:
-            index_path = os.path.join(static_folder_path, 'index.html') if static_folder_path else None
-            if index_path and os.path.exists(index_path):
-                return send_from_directory(static_folder_path, 'index.html')
+            index = static_assets.get('index.html')
+            if index is not None:
+                return static_assets.response(index, request, app.response_class)
             else:
                 # Retornar informações da API como fallback
                 return jsonify({
@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Tempos da requisição em andamento (propagado para threads via asyncio.to_thread)
+_current_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("current_timings", default=None)
+
+
+class _StageStats:
+    """Contagem, soma e uma janela das últimas amostras para os percentis"""
+
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+
+
+class RequestTimings(dict):
+    """Tempos por etapa de uma requisição, em milissegundos"""
+
+    def __init__(self):
+        super().__init__()
+        self.start = time.perf_counter()
+
+    def snapshot(self) -> Dict[str, float]:
+        """Cópia dos tempos incluindo o total decorrido até agora"""
+        return {**self, "total": round((time.perf_counter() - self.start) * 1000, 3)}
+
+
+class MetricsRegistry:
+    """
+    Métricas em memória do processo, exportadas no formato do Prometheus
+
+    Registrar uma amostra custa um append numa deque sob lock; os percentis
+    (p50/p95/p99) só são calculados na leitura, sobre as últimas ``window``
+    amostras de cada etapa.
+    """
+
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self._stages: Dict[str, _StageStats] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        """Registra a duração de uma etapa"""
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = _StageStats(self.window)
+            stats.count += 1
+            stats.total += seconds
+            stats.samples.append(seconds)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str):
+        """Incrementa um contador"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def register_gauge(self, name: str, collect: Callable[[], Dict[str, float]], help_text: str = ""):
+        """
+        Registra um gauge calculado na leitura
+
+        Args:
+            name: Nome da métrica
+            collect: Função que retorna {valor do label "name": valor}
+            help_text: Descrição da métrica
+        """
+        self._gauges[name] = collect
+        self._help[name] = help_text
+
+    def stage_quantile(self, stage: str, quantile: float) -> Optional[float]:
+        """Percentil recente de uma etapa, em milissegundos (None sem amostras)"""
+        with self._lock:
+            stats = self._stages.get(stage)
+            samples = list(stats.samples) if stats is not None else []
+        if not samples:
+            return None
+        return float(np.quantile(samples, quantile)) * 1000
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Percentis por etapa, em milissegundos"""
+        with self._lock:
+            snapshot = {stage: (s.count, s.total, list(s.samples)) for stage, s in self._stages.items()}
+
+        summary = {}
+        for stage, (count, total, samples) in snapshot.items():
+            values = np.quantile(samples, QUANTILES) if samples else [0.0] * len(QUANTILES)
+            summary[stage] = {
+                "count": count,
+                "sum_ms": round(total * 1000, 3),
+                **{f"p{int(q * 100)}_ms": round(float(v) * 1000, 3) for q, v in zip(QUANTILES, values)},
+            }
+        return summary
+
+    def render_prometheus(self) -> str:
+        """Texto no formato de exposição do Prometheus"""
+        lines = [
+            "# HELP api_stage_latency_seconds Latência por etapa do processamento de perguntas",
+            "# TYPE api_stage_latency_seconds summary",
+        ]
+        with self._lock:
+            snapshot = {stage: (s.count, s.total, list(s.samples)) for stage, s in self._stages.items()}
+            counters = dict(self._counters)
+
+        for stage, (count, total, samples) in sorted(snapshot.items()):
+            values = np.quantile(samples, QUANTILES) if samples else [0.0] * len(QUANTILES)
+            for q, v in zip(QUANTILES, values):
+                lines.append(f'api_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {float(v):.6f}')
+            lines.append(f'api_stage_latency_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'api_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+
+        declared = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+
+        for name, collect in sorted(self._gauges.items()):
+            try:
+                values = collect()
+            except Exception:
+                continue
+            if self._help.get(name):
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            for label, value in sorted(values.items()):
+                lines.append(f'{name}{{name="{label}"}} {float(value):.6f}')
+
+        return "\n".join(lines) + "\n"
+
+
+# Registro global do processo
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(stage: str):
+    """Mede uma etapa, registrando no histograma e nos tempos da requisição atual"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_stage(stage: str, seconds: float):
+    """Registra a duração de uma etapa medida manualmente"""
+    registry.observe(stage, seconds)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 3)
+
+
+def collect_timings(timings: Dict[str, float], fn: Callable, *args):
+    """
+    Executa ``fn`` com os tempos das etapas gravados em ``timings``
+
+    Para trabalho numa thread auxiliar, que não herda os tempos da
+    requisição: cada tarefa grava no próprio dicionário, somado depois à
+    requisição com ``merge_timings``.
+    """
+    token = _current_timings.set(timings)
+    try:
+        return fn(*args)
+    finally:
+        _current_timings.reset(token)
+
+
+def merge_timings(*collected: Dict[str, float]):
+    """Soma aos tempos da requisição atual os coletados com ``collect_timings``"""
+    timings = _current_timings.get()
+    if timings is None:
+        return
+    for stage_timings in collected:
+        for stage, ms in stage_timings.items():
+            timings[stage] = round(timings.get(stage, 0.0) + ms, 3)
+
+
+@contextmanager
+def track_request():
+    """
+    Coleta os tempos por etapa de uma requisição
+
+    Produz o dicionário {etapa: milissegundos} que é preenchido pelos spans
+    executados dentro do bloco; ao final, registra a etapa "total".
+    """
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        elapsed = time.perf_counter() - timings.start
+        timings["total"] = round(elapsed * 1000, 3)
+        registry.observe("total", elapsed)
+        try:
+            _current_timings.reset(token)
+        except ValueError:
+            # Geradores de streaming podem ser finalizados em outro contexto
+            _current_timings.set(None)
+
+
+def record_token_usage(message):
+    """Contabiliza os tokens informados na resposta do modelo, se houver"""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    registry.inc("api_llm_tokens_total", usage.get("input_tokens", 0), type="input")
+    registry.inc("api_llm_tokens_total", usage.get("output_tokens", 0), type="output")
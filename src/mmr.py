@@ -0,0 +1,67 @@
+from typing import Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+def maximal_marginal_relevance(candidate_vectors: np.ndarray, relevance: Sequence[float], k: int,
+                               lambda_mult: float = 0.5, groups: Optional[Sequence[Hashable]] = None,
+                               duplicate_threshold: float = 0.9) -> List[int]:
+    """
+    Seleciona ``k`` candidatos por relevância marginal máxima (MMR)
+
+    A cada passo é escolhido o candidato que maximiza
+    ``lambda_mult * relevância - (1 - lambda_mult) * similaridade máxima com os já escolhidos``.
+    A relevância (score da busca, em qualquer escala) é normalizada para
+    [0, 1] e as similaridades entre candidatos são calculadas de uma vez,
+    numa matriz de cossenos ``fetch_k x fetch_k``.
+
+    Candidatos do mesmo grupo (fonte e página) com similaridade de cosseno
+    de pelo menos ``duplicate_threshold`` com um já escolhido são descartados
+    como quase duplicatas, como as janelas sobrepostas de um mesmo trecho.
+
+    Args:
+        candidate_vectors: Embeddings dos candidatos, uma linha por candidato
+        relevance: Score de relevância de cada candidato
+        k: Quantidade de candidatos selecionados
+        lambda_mult: Peso da relevância (1.0) contra a diversidade (0.0)
+        groups: Grupo de cada candidato para a remoção de duplicatas (opcional)
+        duplicate_threshold: Similaridade a partir da qual candidatos do mesmo grupo são duplicatas
+
+    Returns:
+        Posições dos candidatos selecionados, na ordem de seleção
+    """
+    count = len(candidate_vectors)
+    if count == 0 or k <= 0:
+        return []
+
+    vectors = np.asarray(candidate_vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarities = vectors @ vectors.T
+
+    scores = np.asarray(relevance, dtype=np.float32)
+    spread = float(scores.max() - scores.min())
+    scores = (scores - scores.min()) / spread if spread > 0 else np.ones(count, dtype=np.float32)
+
+    if groups is not None:
+        group_ids = {}
+        codes = np.array([group_ids.setdefault(group, len(group_ids)) for group in groups])
+        duplicates = (codes[:, None] == codes[None, :]) & (similarities >= duplicate_threshold)
+    else:
+        duplicates = np.zeros((count, count), dtype=bool)
+
+    available = np.ones(count, dtype=bool)
+    max_similarity = np.full(count, -np.inf, dtype=np.float32)
+    selected: List[int] = []
+    while len(selected) < k and available.any():
+        if selected:
+            marginal = lambda_mult * scores - (1.0 - lambda_mult) * max_similarity
+        else:
+            marginal = scores.copy()
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+
+        selected.append(best)
+        available[best] = False
+        available &= ~duplicates[best]
+        np.maximum(max_similarity, similarities[best], out=max_similarity)
+    return selected
@@ -0,0 +1,166 @@
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.answer_cache import normalize_question
+from src.lexical_index import tokenize
+from src.metrics import registry
+
+RERANK_MODES = ("none", "lexical", "cross_encoder")
+
+
+class Reranker(ABC):
+    """
+    Reordena os candidatos da busca pela relevância para a pergunta
+
+    Os pares (pergunta, chunk) ainda sem score são avaliados em lotes de
+    ``batch_size`` por ``score_batch``, e os scores ficam num LRU de
+    ``cache_entries`` pares, já que as mesmas perguntas e chunks se repetem.
+    A ordem final combina o score do reranker com a posição do candidato na
+    busca, ambos normalizados para [0, 1], com peso ``weight`` para o
+    reranker (1.0 = só o reranker).
+    """
+
+    name: str
+
+    def __init__(self, weight: float = 0.5, batch_size: int = 16, cache_entries: int = 50000):
+        self.weight = weight
+        self.batch_size = max(1, batch_size)
+        self.cache_entries = cache_entries
+        self._cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rerank(self, query: str, candidates: Sequence[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """
+        Candidatos reordenados, do mais ao menos relevante
+
+        Returns:
+            Lista de (Document, score combinado)
+        """
+        if len(candidates) <= 1:
+            return list(candidates)
+
+        normalized = normalize_question(query)
+        keys = [(normalized, doc.id, hash(doc.page_content)) for doc, _ in candidates]
+        scores: List[Optional[float]] = [None] * len(candidates)
+        with self._lock:
+            for position, key in enumerate(keys):
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                    scores[position] = score
+
+        missing = [position for position, score in enumerate(scores) if score is None]
+        registry.inc("api_rerank_pairs_total", len(candidates) - len(missing), cache="hit")
+        registry.inc("api_rerank_pairs_total", len(missing), cache="miss")
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            batch_scores = self.score_batch(query, [candidates[position][0].page_content for position in batch])
+            with self._lock:
+                for position, score in zip(batch, batch_scores):
+                    scores[position] = float(score)
+                    self._cache[keys[position]] = float(score)
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+
+        combined = (self.weight * _min_max(np.asarray(scores, dtype=np.float32))
+                    + (1.0 - self.weight) * (1.0 - np.arange(len(candidates)) / len(candidates)))
+        # Ordenação estável: em caso de empate vale a ordem da busca
+        order = np.argsort(-combined, kind="stable")
+        return [(candidates[int(i)][0], float(combined[i])) for i in order]
+
+    @abstractmethod
+    def score_batch(self, query: str, texts: List[str]) -> List[float]:
+        """Scores de relevância (maior é melhor) de cada texto para a pergunta"""
+
+
+class LexicalOverlapReranker(Reranker):
+    """
+    Reranker sem modelo: termos e expressões da pergunta presentes no chunk
+
+    O score é a fração dos termos da pergunta (tokenização de
+    src/lexical_index.py, sem acentos, stopwords e plurais) encontrados no
+    chunk, mais metade da fração dos pares de termos consecutivos da
+    pergunta que aparecem juntos no chunk, o que favorece expressões como
+    "carta de controle" sobre chunks que só citam as palavras soltas.
+    """
+
+    name = "lexical"
+
+    def score_batch(self, query: str, texts: List[str]) -> List[float]:
+        query_terms = tokenize(query)
+        if not query_terms:
+            return [0.0] * len(texts)
+        unique_terms = set(query_terms)
+        query_pairs = set(zip(query_terms, query_terms[1:]))
+        scores = []
+        for text in texts:
+            terms, pairs = _chunk_terms(text)
+            coverage = len(unique_terms & terms) / len(unique_terms)
+            phrases = len(query_pairs & pairs) / len(query_pairs) if query_pairs else 0.0
+            scores.append(coverage + 0.5 * phrases)
+        return scores
+
+
+@lru_cache(maxsize=4096)
+def _chunk_terms(text: str) -> Tuple[frozenset, frozenset]:
+    """Termos e pares de termos consecutivos de um chunk (os chunks se repetem entre perguntas)"""
+    terms = tokenize(text)
+    return frozenset(terms), frozenset(zip(terms, terms[1:]))
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Reranker com um cross-encoder local, executado em CPU
+
+    Requer o pacote sentence-transformers; o modelo é baixado na primeira
+    execução e avalia cada lote de pares (pergunta, chunk) numa única
+    chamada.
+    """
+
+    name = "cross_encoder"
+
+    def __init__(self, model_name: str, weight: float = 0.5, batch_size: int = 16, cache_entries: int = 50000):
+        super().__init__(weight, batch_size, cache_entries)
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score_batch(self, query: str, texts: List[str]) -> List[float]:
+        scores = self.model.predict([(query, text) for text in texts], batch_size=len(texts),
+                                    show_progress_bar=False)
+        return [float(score) for score in scores]
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    value_range = float(values.max() - values.min())
+    if value_range <= 0:
+        return np.zeros_like(values)
+    return (values - values.min()) / value_range
+
+
+def create_reranker(mode: str, model_name: Optional[str] = None, weight: float = 0.5,
+                    batch_size: int = 16, cache_entries: int = 50000) -> Optional[Reranker]:
+    """
+    Reranker do modo configurado
+
+    Args:
+        mode: "none", "lexical" ou "cross_encoder"
+        model_name: Modelo do cross-encoder (para "cross_encoder")
+
+    Returns:
+        O reranker, ou None com o modo "none"
+    """
+    if mode == "none":
+        return None
+    if mode == "lexical":
+        return LexicalOverlapReranker(weight, batch_size, cache_entries)
+    if mode == "cross_encoder":
+        return CrossEncoderReranker(model_name, weight, batch_size, cache_entries)
+    raise ValueError(f"Reranker desconhecido: {mode} (use {', '.join(RERANK_MODES)})")
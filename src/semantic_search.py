@@ -1,9 +1,31 @@
+import asyncio
 import logging
-from typing import List, Tuple, Optional
-from langchain_chroma.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Tuple, Optional
+from langchain_core.documents import Document
 from src.config import Config
+from src.answer_cache import AnswerCache, normalize_question
+from src.embedding_cache import CachedEmbeddings
+from src.embedding_batcher import BatchingEmbeddings
+from src.kb_version import KnowledgeBaseVersionWatcher, read_kb_version
+from src.vector_index import NumpyVectorIndex
+from src.snapshot import load_snapshot
+from src.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from src.context_packer import ContextPacker, count_tokens
+from src.singleflight import PROCESS, SingleFlight
+from src.upstream import UpstreamClients
+from src.startup import StartupTracker
+from src.faq_store import ANSWERS_FILENAME, FaqStore
+from src.mmr import maximal_marginal_relevance
+from src.reranker import LexicalOverlapReranker, create_reranker
+from src.extractive import ExtractiveAnswerer
+from src.sessions import Session, create_session_store
+from src.metrics import (
+    registry, span, record_stage, track_request, record_token_usage, collect_timings, merge_timings
+)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -12,111 +34,659 @@ logger = logging.getLogger(__name__)
 class SemanticSearchService:
     """Serviço para busca semântica usando LangChain e Chroma"""
     
-    def __init__(self):
+    def __init__(self, collection: Optional[str] = None):
         self.config = Config()
+        # Coleções nomeadas usam a própria pasta da base, dos índices e do FAQ
+        self.collection = collection or Config.DEFAULT_COLLECTION
+        for name, path in Config.collection_paths(self.collection).items():
+            setattr(self.config, name, path)
         self.embedding_function = None
         self.db = None
+        self.vector_index = None
+        self.lexical_index = None
+        self.reranker = None
+        self.context_packer = None
+        self.extractive = None
         self.llm = None
+        self.upstream = None
+        self.answer_cache = None
+        self.faq_store = None
+        self.singleflight = None
+        self.kb_watcher = None
+        self.kb_version = None
+        self.faq_watcher = None
+        self.snapshot_watcher = None
+        self.session_store = None
+        self.startup = StartupTracker()
         self.prompt_template = """
 Responda a pergunta do usuário:
 {pergunta} 
 
 com base nessas informações abaixo:
 
+{base_conhecimento}"""
+        # Perguntas de uma sessão de conversa levam o resumo das trocas anteriores
+        self.conversation_prompt_template = """
+Conversa até aqui:
+{historico}
+
+Responda a nova pergunta do usuário, considerando a conversa:
+{pergunta} 
+
+com base nessas informações abaixo:
+
 {base_conhecimento}"""
         
-    def initialize(self):
-        """Inicializa os componentes necessários"""
+    def initialize(self, shared: Optional["SemanticSearchService"] = None):
+        """
+        Inicializa os componentes necessários
+        
+        Args:
+            shared: Serviço já inicializado cujos clientes HTTP, embeddings e
+                modelo são reaproveitados (coleções abertas sob demanda)
+        """
+        self.startup.begin()
         try:
-            logger.info("Inicializando serviço de busca semântica...")
+            logger.info(f"Inicializando serviço de busca semântica (coleção {self.collection})...")
+            
+            if shared is not None:
+                self.upstream = shared.upstream
+                self.embedding_function = shared.embedding_function
+                self.llm = shared.llm
+            
+            # Clientes HTTP compartilhados (pool, prazos, novas tentativas e disjuntor)
+            if self.config.UPSTREAM_PROVIDER != "fake" and shared is None:
+                with self.startup.step("upstream"):
+                    self.upstream = UpstreamClients(self.config)
+                registry.register_gauge(
+                    "api_upstream_circuit_state", self.upstream.circuit_states,
+                    "Estado do disjuntor por etapa (0 fechado, 1 meio aberto, 2 aberto)"
+                )
             
             # Inicializar função de embedding com a chave da API
-            self.embedding_function = OpenAIEmbeddings(openai_api_key=self.config.OPENAI_API_KEY)
+            if shared is None:
+                with self.startup.step("embeddings"):
+                    self.embedding_function = self._create_embeddings()
+                    if self.config.EMBEDDING_BATCH_ENABLED:
+                        self.embedding_function = BatchingEmbeddings(
+                            self.embedding_function,
+                            max_batch_size=self.config.EMBEDDING_BATCH_MAX_SIZE,
+                            max_wait_ms=self.config.EMBEDDING_BATCH_WAIT_MS,
+                            # Prazo de uma chamada com todas as novas tentativas
+                            result_timeout=self.config.UPSTREAM_EMBEDDING_TIMEOUT + self.config.UPSTREAM_RETRY_BUDGET
+                        )
+                    if self.config.EMBEDDING_CACHE_ENABLED:
+                        self.embedding_function = CachedEmbeddings(
+                            self.embedding_function,
+                            db_path=self.config.EMBEDDING_CACHE_PATH,
+                            memory_entries=self.config.EMBEDDING_CACHE_MEMORY_ENTRIES
+                        )
+            
+            if self.config.RETRIEVAL_BACKEND == "snapshot":
+                # Snapshot mapeado em memória: dispensa o Chroma (aberto só se falhar)
+                with self.startup.step("snapshot"):
+                    self._load_vector_index()
+            else:
+                with self.startup.step("vector_store"):
+                    self._open_vector_store()
+            
+            # Índice NumPy em memória como backend alternativo de busca
+            if self.config.RETRIEVAL_BACKEND == "numpy":
+                with self.startup.step("vector_index"):
+                    self._load_vector_index()
+            
+            # Índice lexical (BM25) para a busca híbrida
+            if self.config.RETRIEVAL_MODE == "hybrid":
+                with self.startup.step("lexical_index"):
+                    self._load_lexical_index()
+            
+            # Reordenação dos candidatos da busca (o modelo é carregado uma vez por processo)
+            if shared is not None:
+                self.reranker = shared.reranker
+            elif self.config.RERANK_MODE != "none":
+                with self.startup.step("reranker"):
+                    self._create_reranker()
+            
+            # Contexto do prompt limitado por um orçamento de tokens
+            if self.config.CONTEXT_PACKING_ENABLED:
+                self.context_packer = ContextPacker(
+                    max_tokens=self.config.CONTEXT_MAX_TOKENS,
+                    encoding=self.config.TOKENIZER_ENCODING
+                )
             
-            # Inicializar banco de dados Chroma
-            self.db = Chroma(
-                persist_directory=self.config.CHROMA_DB_PATH,
-                embedding_function=self.embedding_function
+            # Respostas extrativas do modo "lite", sem chamar o modelo
+            self.extractive = ExtractiveAnswerer(
+                max_candidates=self.config.LITE_MAX_CANDIDATES,
+                max_chars=self.config.LITE_MAX_CHARS
             )
             
             # Inicializar modelo de linguagem com a chave da API
-            self.llm = ChatOpenAI(openai_api_key=self.config.OPENAI_API_KEY, temperature=0)
+            if shared is None:
+                with self.startup.step("llm"):
+                    self.llm = self._create_llm()
+            
+            # Inicializar cache de respostas
+            if self.config.ANSWER_CACHE_ENABLED:
+                self.answer_cache = AnswerCache(
+                    max_entries=self.config.ANSWER_CACHE_MAX_ENTRIES,
+                    ttl_seconds=self.config.ANSWER_CACHE_TTL_SECONDS,
+                    max_distance=self.config.ANSWER_CACHE_MAX_DISTANCE
+                )
+            # Respostas pré-calculadas para perguntas frequentes
+            if self.config.FAQ_ENABLED:
+                with self.startup.step("faq"):
+                    self._load_faq_store()
+            # Coalescência de perguntas idênticas em andamento
+            if self.config.SINGLEFLIGHT_ENABLED:
+                lock_dir = self.config.SINGLEFLIGHT_LOCK_DIR or None
+                if lock_dir and self.collection != Config.DEFAULT_COLLECTION:
+                    # Perguntas iguais em coleções diferentes têm respostas diferentes
+                    lock_dir = os.path.join(lock_dir, "collections", self.collection)
+                self.singleflight = SingleFlight(
+                    lock_dir=lock_dir,
+                    wait_timeout=self.config.SINGLEFLIGHT_WAIT_TIMEOUT,
+                    result_ttl=self.config.SINGLEFLIGHT_RESULT_TTL
+                )
+            # Sessões de conversa, compartilhadas por todas as coleções
+            if shared is not None:
+                self.session_store = shared.session_store
+            elif self.config.SESSIONS_ENABLED:
+                self.session_store = create_session_store(
+                    self.config.SESSION_STORE,
+                    db_path=self.config.SESSION_STORE_PATH,
+                    max_sessions=self.config.SESSION_MAX_SESSIONS,
+                    ttl_seconds=self.config.SESSION_TTL_SECONDS
+                )
+                registry.register_gauge(
+                    "api_sessions_active", lambda: {"active": float(len(self.session_store))},
+                    "Sessões de conversa ativas"
+                )
+            self.kb_watcher = KnowledgeBaseVersionWatcher(self.config.CHROMA_DB_PATH)
+            self.kb_version = read_kb_version(self.config.CHROMA_DB_PATH)
+            if self.config.FAQ_ENABLED:
+                self.faq_watcher = KnowledgeBaseVersionWatcher(self.config.FAQ_INDEX_PATH, ANSWERS_FILENAME)
+            if self.config.RETRIEVAL_BACKEND == "snapshot":
+                self.snapshot_watcher = KnowledgeBaseVersionWatcher(
+                    os.path.dirname(self.config.SNAPSHOT_PATH), os.path.basename(self.config.SNAPSHOT_PATH)
+                )
+            if shared is None:
+                registry.register_gauge(
+                    "api_cache_hit_ratio", self._cache_hit_ratios,
+                    "Fração de acertos dos caches desde o início do processo"
+                )
             
             logger.info("Serviço de busca semântica inicializado com sucesso")
             return True
             
         except Exception as e:
             logger.error(f"Erro ao inicializar serviço de busca semântica: {str(e)}")
+            self.startup.mark_failed(str(e))
             return False
     
-    def search_knowledge_base(self, query: str) -> Tuple[List[str], float]:
+    def warm_up(self):
+        """
+        Aquece o serviço antes das primeiras perguntas
+        
+        Carrega o tokenizer e faz uma busca com WARMUP_QUERY, o que abre as
+        conexões com a API de embeddings e carrega o índice do Chroma em
+        memória. Falhas aqui não impedem o serviço de ficar pronto.
+        """
+        try:
+            if self.context_packer is not None:
+                with self.startup.step("tokenizer"):
+                    count_tokens("aquecimento", self.config.TOKENIZER_ENCODING)
+            if self.config.WARMUP_QUERY:
+                with self.startup.step("warmup_query"):
+                    self._search_with_embedding(self.config.WARMUP_QUERY, self._embed_query(self.config.WARMUP_QUERY))
+        except Exception as e:
+            logger.warning(f"Falha no aquecimento do serviço: {str(e)}")
+    
+    def start(self, background: bool = True) -> bool:
+        """
+        Inicializa e aquece o serviço
+        
+        Args:
+            background: Executar numa thread, sem bloquear a importação da aplicação
+            
+        Returns:
+            False se a inicialização síncrona falhar
+        """
+        def run():
+            if self.initialize():
+                self.warm_up()
+                self.startup.mark_ready()
+            return self.startup.is_ready
+        
+        if not background:
+            return run()
+        threading.Thread(target=run, name="semantic-service-startup", daemon=True).start()
+        return True
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda a inicialização; True se o serviço está pronto para perguntas"""
+        return self.startup.wait(timeout)
+    
+    def close(self):
+        """
+        Fecha a base Chroma e libera os índices da coleção
+        
+        Os clientes HTTP, os embeddings e o modelo não são fechados, pois
+        podem ser compartilhados com outras coleções.
+        """
+        try:
+            if self.db is not None:
+                self.db._client.close()
+        except Exception as e:
+            logger.warning(f"Erro ao fechar a coleção {self.collection}: {str(e)}")
+        self.db = None
+        self.vector_index = None
+        self.lexical_index = None
+        self.faq_store = None
+        self.answer_cache = None
+    
+    def _create_embeddings(self):
+        """Função de embedding do provedor configurado (OpenAI ou local)"""
+        if self.config.UPSTREAM_PROVIDER == "fake":
+            from src.fakes import FakeEmbeddings
+            
+            logger.warning("Usando embeddings locais simulados (UPSTREAM_PROVIDER=fake)")
+            return FakeEmbeddings(latency_ms=self.config.FAKE_EMBEDDING_LATENCY_MS)
+        from langchain_openai import OpenAIEmbeddings
+        
+        # As novas tentativas ficam a cargo do transporte (src/upstream.py)
+        return OpenAIEmbeddings(
+            openai_api_key=self.config.OPENAI_API_KEY,
+            openai_api_base=self.config.UPSTREAM_BASE_URL,
+            http_client=self.upstream.http_client,
+            http_async_client=self.upstream.http_async_client,
+            request_timeout=self.upstream.timeout("embedding"),
+            max_retries=0
+        )
+    
+    def _create_reranker(self):
+        """Reranker do modo configurado (o lexical se o cross-encoder não carregar)"""
+        options = dict(
+            weight=self.config.RERANK_WEIGHT,
+            batch_size=self.config.RERANK_BATCH_SIZE,
+            cache_entries=self.config.RERANK_CACHE_ENTRIES
+        )
+        try:
+            self.reranker = create_reranker(self.config.RERANK_MODE, self.config.RERANK_MODEL, **options)
+        except Exception as e:
+            logger.error(f"Erro ao carregar o reranker {self.config.RERANK_MODE}: {str(e)}")
+            self.reranker = LexicalOverlapReranker(**options)
+        if self.reranker is not None:
+            logger.info(f"Reranker: {self.reranker.name}")
+    
+    def _create_llm(self):
+        """Modelo de linguagem do provedor configurado (OpenAI ou local)"""
+        if self.config.UPSTREAM_PROVIDER == "fake":
+            from src.fakes import FakeChatModel
+            
+            logger.warning("Usando modelo de linguagem local simulado (UPSTREAM_PROVIDER=fake)")
+            return FakeChatModel(
+                first_token_latency_ms=self.config.FAKE_LLM_FIRST_TOKEN_MS,
+                per_token_latency_ms=self.config.FAKE_LLM_TOKEN_MS,
+                response_tokens=self.config.FAKE_LLM_RESPONSE_TOKENS
+            )
+        from langchain_openai import ChatOpenAI
+        
+        return ChatOpenAI(
+            openai_api_key=self.config.OPENAI_API_KEY,
+            openai_api_base=self.config.UPSTREAM_BASE_URL,
+            temperature=0,
+            stream_usage=True,
+            http_client=self.upstream.http_client,
+            http_async_client=self.upstream.http_async_client,
+            request_timeout=self.upstream.timeout("llm"),
+            max_retries=0
+        )
+    
+    def search_knowledge_base(self, query: str, query_embedding: Optional[List[float]] = None) -> Tuple[List[str], float]:
         """
         Busca na base de conhecimento
         
         Args:
             query: Pergunta do usuário
+            query_embedding: Embedding já calculado da pergunta (opcional)
             
         Returns:
             Tuple com lista de textos relevantes e score de relevância
         """
+        if query_embedding is None:
+            query_embedding = self._embed_query(query)
+        return self._search_with_embedding(query, query_embedding)
+    
+    def _search_with_embedding(self, query: str, query_embedding: Optional[List[float]],
+                               vector_results: Optional[List[Tuple[Document, float]]] = None) -> Tuple[List[str], float]:
+        """
+        Busca com o embedding já calculado (None quando o serviço de embeddings falhou)
+        
+        ``vector_results`` permite reaproveitar o resultado de uma busca
+        vetorial feita em lote (ver process_batch).
+        """
+        relevant_texts, best_score, _ = self._search_documents(query, query_embedding, vector_results)
+        return relevant_texts, best_score
+    
+    def _search_documents(self, query: str, query_embedding: Optional[List[float]],
+                          vector_results: Optional[List[Tuple[Document, float]]] = None) -> Tuple[List[str], float, List[Optional[str]]]:
+        """
+        Corpo de _search_with_embedding
+        
+        Returns:
+            Tupla (textos relevantes, melhor score, ids dos chunks recuperados)
+        """
         try:
-            if not self.db:
+            if self.db is None and self.vector_index is None:
                 raise ValueError("Base de dados não inicializada")
             
             # Realizar busca por similaridade
-            results = self.db.similarity_search_with_relevance_scores(
-                query, 
-                k=self.config.MAX_RESULTS
-            )
+            results, best_score, relevant = self._retrieve(query, query_embedding, vector_results)
             
             if not results:
                 logger.warning(f"Nenhum resultado encontrado para: {query}")
-                return [], 0.0
+                return [], 0.0, []
             
             # Verificar se os resultados são relevantes
-            best_score = results[0][1] if results else 0.0
-            
-            if best_score < self.config.SIMILARITY_THRESHOLD:
+            if not relevant:
                 logger.info(f"Resultados abaixo do threshold ({best_score} < {self.config.SIMILARITY_THRESHOLD})")
-                return [], best_score
+                return [], best_score, []
             
-            # Extrair textos dos resultados
-            relevant_texts = [result[0].page_content for result in results]
+            # Extrair textos dos resultados, sem sobreposições e dentro do orçamento de tokens
+            if self.context_packer is not None:
+                with span("context_packing"):
+                    relevant_texts = self.context_packer.pack(results)
+            else:
+                relevant_texts = [result[0].page_content for result in results]
             
             logger.info(f"Encontrados {len(relevant_texts)} resultados relevantes (score: {best_score})")
-            return relevant_texts, best_score
+            return relevant_texts, best_score, [doc.id for doc, _ in results]
             
         except Exception as e:
             logger.error(f"Erro na busca: {str(e)}")
             raise
     
-    def generate_response(self, query: str, knowledge_base: List[str]) -> str:
+    def _retrieve(self, query: str, query_embedding: Optional[List[float]],
+                  vector_results: Optional[List[Tuple[Document, float]]] = None) -> Tuple[List[Tuple[Document, float]], float, bool]:
         """
-        Gera resposta usando o modelo de linguagem
+        Executa a busca no modo configurado
+        
+        No modo "hybrid" as buscas vetorial e lexical (BM25) são combinadas
+        por RRF; sem embedding, apenas a busca lexical é usada. Os candidatos
+        passam pelo reranker (RERANK_MODE), que limita o resultado aos
+        RERANK_TOP_N melhores, e com MMR_ENABLED são reordenados por
+        relevância marginal máxima antes do corte em k.
+        
+        Returns:
+            Tupla (resultados ordenados, melhor score, se passou no threshold)
+        """
+        if self.reranker is not None:
+            k = self.config.RERANK_TOP_N
+        else:
+            k = self.config.MMR_K if self.config.MMR_ENABLED else self.config.MAX_RESULTS
+        
+        if self.lexical_index is not None and query_embedding is None:
+            # Serviço de embeddings indisponível: responder só com a busca lexical
+            with span("lexical_search"):
+                results = self.lexical_index.search(query, k)
+            best_score = results[0][1] if results else 0.0
+            return results, best_score, best_score >= self.config.LEXICAL_MIN_COVERAGE
+        
+        if vector_results is None:
+            with span("vector_search"):
+                vector_results = self._similarity_search(query_embedding, self._vector_fetch_k())
+        
+        if self.lexical_index is None:
+            best_score = vector_results[0][1] if vector_results else 0.0
+            return self._select(query, vector_results, k), best_score, best_score >= self.config.SIMILARITY_THRESHOLD
+        
+        with span("lexical_search"):
+            lexical_results = self.lexical_index.search(query, self._vector_fetch_k())
+        fused = reciprocal_rank_fusion([vector_results, lexical_results], k=self.config.RRF_K)
+        results = self._select(query, fused[:self._vector_fetch_k()], k)
+        
+        # Termos exatos da pergunta no topo da busca lexical também contam como relevância
+        best_score = vector_results[0][1] if vector_results else 0.0
+        lexical_match = bool(lexical_results) and lexical_results[0][1] >= self.config.LEXICAL_MIN_COVERAGE
+        return results, best_score, best_score >= self.config.SIMILARITY_THRESHOLD or lexical_match
+    
+    def _vector_fetch_k(self) -> int:
+        """Quantidade de resultados pedida à busca vetorial (maior no modo híbrido, com MMR e com rerank)"""
+        fetch_k = self.config.MAX_RESULTS
+        if self.lexical_index is not None:
+            fetch_k = max(fetch_k, self.config.HYBRID_FETCH_K)
+        if self.config.MMR_ENABLED:
+            fetch_k = max(fetch_k, self.config.MMR_K, self.config.MMR_FETCH_K)
+        if self.reranker is not None:
+            fetch_k = max(fetch_k, self.config.RERANK_TOP_N, self.config.RERANK_FETCH_K)
+        return fetch_k
+    
+    def _select(self, query: str, candidates: List[Tuple[Document, float]], k: int) -> List[Tuple[Document, float]]:
+        """
+        Seleciona os k resultados finais entre os candidatos ordenados
+        
+        Com reranker os candidatos são antes reordenados pela relevância para
+        a pergunta (ver src/reranker.py). Sem MMR são os k primeiros. Com
+        MMR_ENABLED a seleção equilibra o score de cada candidato com a
+        similaridade aos já escolhidos e descarta quase duplicatas da mesma
+        fonte e página (ver src/mmr.py).
+        """
+        if self.reranker is not None and len(candidates) > 1:
+            with span("rerank"):
+                candidates = self.reranker.rerank(query, candidates)
+        
+        if not self.config.MMR_ENABLED or len(candidates) <= 1:
+            return candidates[:k]
+        
+        with span("mmr"):
+            vectors = self._candidate_vectors([doc.id for doc, _ in candidates])
+            if vectors is None:
+                return candidates[:k]
+            selected = maximal_marginal_relevance(
+                vectors,
+                [score for _, score in candidates],
+                k,
+                lambda_mult=self.config.MMR_LAMBDA,
+                groups=[(doc.metadata.get("source"), doc.metadata.get("page")) for doc, _ in candidates],
+                duplicate_threshold=self.config.MMR_DUPLICATE_THRESHOLD
+            )
+        return [candidates[position] for position in selected]
+    
+    def _candidate_vectors(self, ids: List[Optional[str]]) -> Optional[List[List[float]]]:
+        """Embeddings dos chunks candidatos, na ordem de ``ids``; None se algum não for encontrado"""
+        if any(doc_id is None for doc_id in ids):
+            return None
+        if self.vector_index is not None:
+            return self.vector_index.vectors_for(ids)
+        
+        found = self.db._collection.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(found["ids"], found["embeddings"]))
+        if len(by_id) != len(set(ids)):
+            return None
+        return [by_id[doc_id] for doc_id in ids]
+    
+    def _embed_query(self, query: str) -> Optional[List[float]]:
+        """Embedding da pergunta; None se falhar e houver busca lexical como alternativa"""
+        try:
+            with span("embedding"):
+                return self.embedding_function.embed_query(query)
+        except Exception as e:
+            if self.lexical_index is None:
+                raise
+            logger.warning(f"Falha no serviço de embeddings, usando apenas busca lexical: {str(e)}")
+            return None
+    
+    async def _aembed_query(self, query: str) -> Optional[List[float]]:
+        """Versão assíncrona de _embed_query"""
+        try:
+            with span("embedding"):
+                return await self.embedding_function.aembed_query(query)
+        except Exception as e:
+            if self.lexical_index is None:
+                raise
+            logger.warning(f"Falha no serviço de embeddings, usando apenas busca lexical: {str(e)}")
+            return None
+    
+    def _similarity_search(self, query_embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+        """Busca no backend configurado, retornando (documento, relevância)"""
+        if self.vector_index is not None:
+            return self.vector_index.search(query_embedding, k)
+        
+        relevance_fn = self.db._select_relevance_score_fn()
+        return [
+            (doc, relevance_fn(distance))
+            for doc, distance in self.db.similarity_search_by_vector_with_relevance_scores(query_embedding, k=k)
+        ]
+    
+    def _similarity_search_batch(self, query_embeddings: List[List[float]], k: int) -> List[List[Tuple[Document, float]]]:
+        """Busca de várias perguntas numa única consulta ao backend"""
+        if self.vector_index is not None:
+            return self.vector_index.search_batch(query_embeddings, k)
+        
+        relevance_fn = self.db._select_relevance_score_fn()
+        found = self.db._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(id=doc_id, page_content=text, metadata=metadata or {}), relevance_fn(distance))
+                for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+            ]
+            for ids, texts, metadatas, distances in zip(
+                found["ids"], found["documents"], found["metadatas"], found["distances"]
+            )
+        ]
+    
+    def _embed_batch(self, queries: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings de várias perguntas numa única chamada; None se falhar e houver busca lexical"""
+        try:
+            with span("embedding"):
+                return self.embedding_function.embed_documents(queries)
+        except Exception as e:
+            if self.lexical_index is None:
+                raise
+            logger.warning(f"Falha no serviço de embeddings, usando apenas busca lexical: {str(e)}")
+            return [None] * len(queries)
+    
+    def _open_vector_store(self):
+        """Abre a base Chroma (importada só aqui: é o módulo mais pesado)"""
+        from langchain_chroma.vectorstores import Chroma
+        self.db = Chroma(
+            persist_directory=self.config.CHROMA_DB_PATH,
+            embedding_function=self.embedding_function
+        )
+    
+    def _load_vector_index(self):
+        """Carrega (ou recarrega) o índice NumPy ou o snapshot exportados da base Chroma"""
+        try:
+            if self.config.RETRIEVAL_BACKEND == "snapshot":
+                self.vector_index = load_snapshot(
+                    self.config.SNAPSHOT_PATH,
+                    quantization=self.config.VECTOR_QUANTIZATION,
+                    rerank_factor=self.config.QUANTIZATION_RERANK_FACTOR
+                )
+                kb_version = read_kb_version(self.config.CHROMA_DB_PATH)
+                if kb_version is not None and self.vector_index.version != kb_version:
+                    logger.warning(f"Snapshot da versão {self.vector_index.version}, base na versão {kb_version}: "
+                                   f"execute populate_db.py --exportar-indice")
+            else:
+                self.vector_index = NumpyVectorIndex.load(
+                    self.config.NUMPY_INDEX_PATH,
+                    quantization=self.config.VECTOR_QUANTIZATION,
+                    rerank_factor=self.config.QUANTIZATION_RERANK_FACTOR
+                )
+            logger.info(f"Índice {self.config.RETRIEVAL_BACKEND} carregado: {len(self.vector_index)} chunks "
+                        f"(quantização: {self.vector_index.quantization})")
+        except Exception as e:
+            logger.error(f"Erro ao carregar índice {self.config.RETRIEVAL_BACKEND}, usando Chroma: {str(e)}")
+            self.vector_index = None
+            if self.db is None:
+                self._open_vector_store()
+    
+    def _load_lexical_index(self):
+        """Carrega (ou recarrega) o índice lexical usado no modo híbrido"""
+        try:
+            self.lexical_index = LexicalIndex.load(self.config.LEXICAL_INDEX_PATH)
+            logger.info(f"Índice lexical carregado: {len(self.lexical_index)} chunks")
+        except Exception as e:
+            logger.error(f"Erro ao carregar índice lexical, usando apenas busca vetorial: {str(e)}")
+            self.lexical_index = None
+    
+    def _load_faq_store(self):
+        """Carrega (ou recarrega) o FAQ pré-calculado, se for da versão atual da base"""
+        self.faq_store = None
+        if not os.path.exists(self.config.FAQ_INDEX_PATH):
+            return
+        try:
+            store = FaqStore.load(self.config.FAQ_INDEX_PATH, max_distance=self.config.FAQ_MAX_DISTANCE)
+        except Exception as e:
+            logger.error(f"Erro ao carregar FAQ pré-calculado: {str(e)}")
+            return
+        kb_version = read_kb_version(self.config.CHROMA_DB_PATH)
+        if store.version != kb_version:
+            logger.warning(
+                f"FAQ pré-calculado ignorado: gerado para a versão {store.version} da base "
+                f"(atual: {kb_version}); execute populate_db.py --faq"
+            )
+            return
+        self.faq_store = store
+        logger.info(f"FAQ pré-calculado carregado: {len(store)} perguntas")
+    
+    def build_prompt(self, query: str, knowledge_base: List[str], history: Optional[str] = None):
+        """
+        Monta o prompt enviado ao modelo de linguagem
         
         Args:
             query: Pergunta do usuário
             knowledge_base: Lista de textos relevantes da base de conhecimento
+            history: Resumo da conversa, em perguntas de uma sessão (opcional)
             
         Returns:
-            Resposta gerada pelo modelo
+            Prompt formatado
         """
-        try:
-            if not self.llm:
-                raise ValueError("Modelo de linguagem não inicializado")
-            
+        with span("prompt_build"):
             # Combinar textos da base de conhecimento
             combined_knowledge = "\n\n----\n\n".join(knowledge_base)
             
-            # Criar prompt
+            # Criar prompt (langchain_core.prompts é importado na primeira pergunta)
+            from langchain_core.prompts import ChatPromptTemplate
+            if history:
+                prompt = ChatPromptTemplate.from_template(self.conversation_prompt_template)
+                return prompt.invoke({
+                    "historico": history,
+                    "pergunta": query,
+                    "base_conhecimento": combined_knowledge
+                })
             prompt = ChatPromptTemplate.from_template(self.prompt_template)
-            formatted_prompt = prompt.invoke({
+            return prompt.invoke({
                 "pergunta": query,
                 "base_conhecimento": combined_knowledge
             })
+    
+    def generate_response(self, query: str, knowledge_base: List[str], history: Optional[str] = None) -> str:
+        """
+        Gera resposta usando o modelo de linguagem
+        
+        Args:
+            query: Pergunta do usuário
+            knowledge_base: Lista de textos relevantes da base de conhecimento
+            history: Resumo da conversa, em perguntas de uma sessão (opcional)
+            
+        Returns:
+            Resposta gerada pelo modelo
+        """
+        try:
+            if not self.llm:
+                raise ValueError("Modelo de linguagem não inicializado")
+            
+            formatted_prompt = self.build_prompt(query, knowledge_base, history)
             
             # Gerar resposta
-            response = self.llm.invoke(formatted_prompt)
+            with span("llm_generation"):
+                response = self.llm.invoke(formatted_prompt)
+            record_token_usage(response)
             
             logger.info("Resposta gerada com sucesso")
             return response.content
@@ -125,16 +695,66 @@ com base nessas informações abaixo:
             logger.error(f"Erro na geração de resposta: {str(e)}")
             raise
     
-    def process_query(self, query: str) -> dict:
+    def stream_response(self, query: str, knowledge_base: List[str], history: Optional[str] = None) -> Iterator[str]:
+        """
+        Gera resposta usando o modelo de linguagem, token a token
+        
+        Args:
+            query: Pergunta do usuário
+            knowledge_base: Lista de textos relevantes da base de conhecimento
+            history: Resumo da conversa, em perguntas de uma sessão (opcional)
+            
+        Returns:
+            Iterador com os trechos da resposta à medida que chegam
+        """
+        try:
+            if not self.llm:
+                raise ValueError("Modelo de linguagem não inicializado")
+            
+            formatted_prompt = self.build_prompt(query, knowledge_base, history)
+            
+            started = time.perf_counter()
+            first_token = True
+            with span("llm_generation"):
+                for chunk in self.llm.stream(formatted_prompt):
+                    record_token_usage(chunk)
+                    if chunk.content:
+                        if first_token:
+                            record_stage("llm_first_token", time.perf_counter() - started)
+                            first_token = False
+                        yield chunk.content
+            
+            logger.info("Resposta gerada com sucesso (streaming)")
+            
+        except Exception as e:
+            logger.error(f"Erro na geração de resposta: {str(e)}")
+            raise
+    
+    def process_query(self, query: str, mode: str = "auto", budget_ms: Optional[float] = None,
+                      session: Optional[Session] = None) -> dict:
         """
         Processa uma pergunta completa
         
         Args:
             query: Pergunta do usuário
+            mode: "completo" (sempre gera com o modelo), "lite" (resposta
+                extrativa, sem o modelo) ou "auto" (lite quando o score da
+                busca é muito alto ou o orçamento não comporta a geração)
+            budget_ms: Orçamento de latência da requisição, em ms (opcional)
+            session: Sessão de conversa (opcional); a pergunta é respondida
+                no contexto das anteriores e a sessão é atualizada
             
         Returns:
-            Dicionário com resposta e metadados
+            Dicionário com resposta e metadados (incluindo o tempo de cada
+            etapa em "timings_ms")
         """
+        with track_request() as timings:
+            result = self._process_query(query, mode, self._deadline(budget_ms), session)
+        return self._with_timings(result, timings)
+    
+    def _process_query(self, query: str, mode: str = "auto", deadline: Optional[float] = None,
+                       session: Optional[Session] = None) -> dict:
+        """Corpo de process_query, executado dentro da medição da requisição"""
         try:
             # Validar entrada
             if not query or not query.strip():
@@ -143,30 +763,461 @@ com base nessas informações abaixo:
                     "status": "error"
                 }
             
-            # Buscar na base de conhecimento
-            relevant_texts, score = self.search_knowledge_base(query.strip())
+            query = query.strip()
+            
+            # Perguntas de uma sessão dependem da conversa: sem cache, FAQ nem coalescência
+            if session is not None:
+                return self._answer_turn(session, query, mode, deadline)
+            
+            # Consultar o nível exato do cache de respostas
+            cached, cache_key = self._lookup_exact(query, mode)
+            if cached is not None:
+                return cached
+            
+            # Perguntas idênticas já em andamento aguardam o mesmo processamento
+            flight_key = self._flight_key(cache_key, mode, deadline)
+            if flight_key is None:
+                return self._answer_query(query, cache_key, mode, deadline)
+            result, source = self.singleflight.do(flight_key, lambda: self._answer_query(query, cache_key, mode, deadline))
+            return self._coalesced_response(cache_key, mode, result, source)
+            
+        except Exception as e:
+            logger.error(f"Erro no processamento da pergunta: {str(e)}")
+            return {
+                "erro": str(e),
+                "status": "error"
+            }
+    
+    def _answer_query(self, query: str, cache_key: str, mode: str = "auto", deadline: Optional[float] = None) -> dict:
+        """Responde uma pergunta que não está no nível exato do cache"""
+        # Consultar o nível aproximado do cache de respostas
+        query_embedding = self._embed_query(query)
+        if self._has_similar_lookup():
+            cached = self._lookup_similar(query_embedding, mode)
+            if cached is not None:
+                return cached
+        
+        # Buscar na base de conhecimento
+        relevant_texts, score = self.search_knowledge_base(query, query_embedding)
+        
+        if not relevant_texts:
+            result = self._build_result(
+                "Não encontrei informações relevantes na base de conhecimento.", score, 0
+            )
+        else:
+            # Gerar resposta
+            result = self._generate_or_fallback(query, relevant_texts, score, query_embedding, mode, deadline)
+        
+        self._store_cache(cache_key, mode, query_embedding, result)
+        return result
+    
+    def _answer_turn(self, session: Session, query: str, mode: str = "auto", deadline: Optional[float] = None) -> dict:
+        """
+        Responde uma pergunta de uma sessão de conversa
+        
+        Só a nova pergunta passa pelo embedding. Se ela seguir o assunto da
+        sessão, os chunks recuperados antes são reaproveitados sem nova
+        busca; o prompt leva o resumo das trocas anteriores, de tamanho
+        limitado, então o custo de cada turno não cresce com a conversa.
+        """
+        self._check_kb_version()
+        query_embedding = self._embed_query(query)
+        relevant_texts, score, reused = self._turn_context(session, query, query_embedding)
+        
+        if not relevant_texts:
+            result = self._build_result(
+                "Não encontrei informações relevantes na base de conhecimento.", score, 0
+            )
+        else:
+            result = self._generate_or_fallback(
+                query, relevant_texts, score, query_embedding, mode, deadline, session.history()
+            )
+        return self._finish_turn(session, query, result, reused)
+    
+    def _turn_context(self, session: Session, query: str,
+                      query_embedding: Optional[List[float]]) -> Tuple[List[str], float, bool]:
+        """
+        Chunks para a pergunta da sessão: os do assunto atual ou uma nova busca
+        
+        A pergunta segue o assunto quando a similaridade de cosseno do seu
+        embedding com o da sessão é de pelo menos SESSION_TOPIC_MIN_SIMILARITY
+        (e a coleção e a versão da base são as mesmas da busca anterior).
+        
+        Returns:
+            Tupla (textos relevantes, score, se os chunks foram reaproveitados)
+        """
+        follows_topic = (
+            bool(session.chunk_texts)
+            and session.collection == self.collection
+            and session.kb_version == self.kb_version
+            and (query_embedding is None
+                 or session.topic_similarity(query_embedding) >= self.config.SESSION_TOPIC_MIN_SIMILARITY)
+        )
+        if follows_topic:
+            session.follow_topic(query_embedding)
+            registry.inc("api_session_turns_total", context="reused")
+            return list(session.chunk_texts), session.score, True
+        
+        relevant_texts, score, chunk_ids = self._search_documents(query, query_embedding)
+        registry.inc("api_session_turns_total", context="retrieved")
+        session.collection = self.collection
+        if relevant_texts:
+            session.set_context(chunk_ids, relevant_texts, score, query_embedding, self.kb_version)
+        return relevant_texts, score, False
+    
+    def _finish_turn(self, session: Session, query: str, result: dict, reused: bool) -> dict:
+        """Registra o turno no resumo da sessão e grava a sessão"""
+        if result.get("status") != "success":
+            return result
+        result["metadata"]["session"] = self._session_metadata(session, reused)
+        session.record_turn(
+            query, result["resposta"],
+            max_answer_chars=self.config.SESSION_ANSWER_MAX_CHARS,
+            max_tokens=self.config.SESSION_HISTORY_MAX_TOKENS,
+            encoding=self.config.TOKENIZER_ENCODING
+        )
+        self.session_store.save(session)
+        return result
+    
+    @staticmethod
+    def _session_metadata(session: Session, reused: bool) -> dict:
+        """Metadados do turno atual da sessão"""
+        return {
+            "id": session.id,
+            "turn": session.turn_count + 1,
+            "context": "reused" if reused else "retrieved"
+        }
+    
+    def process_query_stream(self, query: str, mode: str = "auto", budget_ms: Optional[float] = None,
+                             session: Optional[Session] = None) -> Iterator[dict]:
+        """
+        Processa uma pergunta emitindo eventos à medida que ficam prontos
+        
+        Os metadados da busca são emitidos assim que a recuperação termina,
+        seguidos dos trechos da resposta do modelo conforme são gerados.
+        
+        Args:
+            query: Pergunta do usuário
+            mode: Modo de resposta (ver process_query)
+            budget_ms: Orçamento de latência da requisição, em ms (opcional)
+            session: Sessão de conversa (opcional, ver process_query)
+            
+        Returns:
+            Iterador de eventos {"event": ..., "data": ...}, com os tipos
+            "metadata", "token", "done" e "error"; o evento "done" traz o
+            tempo de cada etapa em "timings_ms"
+        """
+        with track_request() as timings:
+            for event in self._process_query_stream(query, mode, self._deadline(budget_ms), session):
+                if event["event"] == "done":
+                    event["data"]["timings_ms"] = timings.snapshot()
+                yield event
+    
+    def _process_query_stream(self, query: str, mode: str = "auto", deadline: Optional[float] = None,
+                              session: Optional[Session] = None) -> Iterator[dict]:
+        """Corpo de process_query_stream, executado dentro da medição da requisição"""
+        try:
+            # Validar entrada
+            if not query or not query.strip():
+                yield {"event": "error", "data": {"erro": "Pergunta vazia ou inválida", "status": "error"}}
+                return
+            
+            query = query.strip()
+            
+            reused = False
+            if session is not None:
+                # Perguntas de uma sessão dependem da conversa: sem cache de respostas nem FAQ
+                self._check_kb_version()
+                cache_key = None
+                query_embedding = self._embed_query(query)
+                relevant_texts, score, reused = self._turn_context(session, query, query_embedding)
+            else:
+                # Consultar cache de respostas
+                cached, cache_key, query_embedding = self._lookup_cache(query, mode)
+                if cached is not None:
+                    yield {"event": "metadata", "data": cached["metadata"]}
+                    yield {"event": "token", "data": {"content": cached["resposta"]}}
+                    yield {"event": "done", "data": {"status": "success"}}
+                    return
+                
+                # Buscar na base de conhecimento
+                if query_embedding is None:
+                    query_embedding = self._embed_query(query)
+                relevant_texts, score = self.search_knowledge_base(query, query_embedding)
             
             if not relevant_texts:
-                return {
-                    "resposta": "Não encontrei informações relevantes na base de conhecimento.",
-                    "status": "success",
-                    "metadata": {
-                        "relevance_score": score,
-                        "sources_found": 0
+                result = self._build_result(
+                    "Não encontrei informações relevantes na base de conhecimento.", score, 0
+                )
+                self._store_cache(cache_key, mode, query_embedding, result)
+            elif self._use_fallback():
+                # Modelo indisponível: responder apenas com os trechos recuperados
+                result = self._retrieval_only_result(relevant_texts, score)
+            else:
+                # Modo lite: resposta extrativa, sem chamar o modelo
+                lite_reason = self._lite_reason(score, query_embedding is not None, mode, deadline)
+                result = self._lite_result(query, relevant_texts, score, lite_reason) if lite_reason else None
+            if result is not None:
+                if session is not None:
+                    self._finish_turn(session, query, result, reused)
+                yield {"event": "metadata", "data": result["metadata"]}
+                yield {"event": "token", "data": {"content": result["resposta"]}}
+                yield {"event": "done", "data": {"status": "success"}}
+                return
+            
+            metadata = self._build_result("", score, len(relevant_texts))["metadata"]
+            if session is not None:
+                metadata["session"] = self._session_metadata(session, reused)
+            elif self.answer_cache is not None:
+                metadata["cache"] = "miss"
+            yield {"event": "metadata", "data": metadata}
+            
+            # Repassar os tokens conforme chegam do modelo
+            parts = []
+            history = session.history() if session is not None else None
+            for token in self.stream_response(query, relevant_texts, history):
+                parts.append(token)
+                yield {"event": "token", "data": {"content": token}}
+            
+            result = self._build_result("".join(parts), score, len(relevant_texts))
+            if session is not None:
+                self._finish_turn(session, query, result, reused)
+            else:
+                self._store_cache(cache_key, mode, query_embedding, result)
+            yield {"event": "done", "data": {"status": "success"}}
+            
+        except Exception as e:
+            logger.error(f"Erro no processamento da pergunta (streaming): {str(e)}")
+            yield {"event": "error", "data": {"erro": str(e), "status": "error"}}
+    
+    def process_batch(self, queries: List[str], mode: str = "auto") -> List[dict]:
+        """
+        Processa várias perguntas de uma vez
+        
+        Perguntas repetidas (após normalização) são processadas uma única
+        vez. Os embeddings das perguntas fora do cache são calculados numa
+        única chamada, a busca vetorial é feita para o lote inteiro e as
+        respostas do modelo são geradas em paralelo (até BATCH_MAX_PARALLEL
+        simultâneas). Cada pergunta passa pelas mesmas etapas de
+        process_query, e a falha de uma não interrompe as demais.
+        
+        Args:
+            queries: Lista de perguntas
+            mode: Modo de resposta (ver process_query)
+            
+        Returns:
+            Lista de resultados no formato de process_query, na mesma ordem
+            das perguntas
+        """
+        results: List[Optional[dict]] = [None] * len(queries)
+        groups: Dict[str, List[int]] = {}
+        unique_queries: Dict[str, str] = {}
+        for position, query in enumerate(queries):
+            if not isinstance(query, str) or not query.strip():
+                results[position] = {"erro": "Pergunta vazia ou inválida", "status": "error"}
+                continue
+            cache_key = normalize_question(query.strip())
+            groups.setdefault(cache_key, []).append(position)
+            unique_queries.setdefault(cache_key, query.strip())
+        
+        logger.info(f"Processando lote: {len(queries)} perguntas ({len(unique_queries)} distintas)")
+        answers = self._process_unique_batch(unique_queries, mode)
+        for cache_key, positions in groups.items():
+            for position in positions:
+                result = answers[cache_key]
+                results[position] = {**result, "metadata": dict(result["metadata"])} if "metadata" in result else dict(result)
+        return results
+    
+    def _process_unique_batch(self, queries: Dict[str, str], mode: str = "auto") -> Dict[str, dict]:
+        """
+        Processa perguntas distintas de um lote
+        
+        Args:
+            queries: {chave do cache: pergunta}
+            mode: Modo de resposta (ver process_query)
+            
+        Returns:
+            {chave do cache: resultado no formato de process_query}
+        """
+        answers: Dict[str, dict] = {}
+        try:
+            # Nível exato do cache
+            pending: Dict[str, str] = {}
+            for cache_key, query in queries.items():
+                cached, _ = self._lookup_exact(query, mode)
+                if cached is not None:
+                    answers[cache_key] = cached
+                else:
+                    pending[cache_key] = query
+            if not pending:
+                return answers
+            
+            # Um único pedido de embeddings para o lote
+            keys = list(pending)
+            embeddings = dict(zip(keys, self._embed_batch([pending[key] for key in keys])))
+            
+            # Nível aproximado do cache e do FAQ
+            if self._has_similar_lookup():
+                for cache_key in keys:
+                    cached = self._lookup_similar(embeddings[cache_key], mode)
+                    if cached is not None:
+                        answers[cache_key] = cached
+                keys = [key for key in keys if key not in answers]
+            
+            # Busca vetorial do lote inteiro numa única consulta
+            with_embedding = [key for key in keys if embeddings[key] is not None]
+            vector_results = {}
+            if with_embedding:
+                with span("vector_search"):
+                    batch = self._similarity_search_batch(
+                        [embeddings[key] for key in with_embedding], self._vector_fetch_k()
+                    )
+                vector_results = dict(zip(with_embedding, batch))
+            
+            to_generate: Dict[str, Tuple[List[str], float]] = {}
+            for cache_key in keys:
+                try:
+                    relevant_texts, score = self._search_with_embedding(
+                        pending[cache_key], embeddings[cache_key], vector_results.get(cache_key)
+                    )
+                except Exception as e:
+                    answers[cache_key] = {"erro": str(e), "status": "error"}
+                    continue
+                
+                if not relevant_texts:
+                    result = self._build_result(
+                        "Não encontrei informações relevantes na base de conhecimento.", score, 0
+                    )
+                    self._store_cache(cache_key, mode, embeddings[cache_key], result)
+                    answers[cache_key] = result
+                else:
+                    to_generate[cache_key] = (relevant_texts, score)
+            
+            # Respostas do modelo em paralelo, com limite de chamadas simultâneas;
+            # os tempos de cada thread são somados aos do lote ao final
+            if to_generate:
+                workers = max(1, min(self.config.BATCH_MAX_PARALLEL, len(to_generate)))
+                worker_timings = {cache_key: {} for cache_key in to_generate}
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-llm") as executor:
+                    futures = {
+                        cache_key: executor.submit(
+                            collect_timings, worker_timings[cache_key], self._generate_or_fallback,
+                            pending[cache_key], relevant_texts, score, embeddings[cache_key], mode
+                        )
+                        for cache_key, (relevant_texts, score) in to_generate.items()
                     }
-                }
+                    for cache_key, future in futures.items():
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            answers[cache_key] = {"erro": str(e), "status": "error"}
+                            continue
+                        self._store_cache(cache_key, mode, embeddings[cache_key], result)
+                        answers[cache_key] = result
+                merge_timings(*worker_timings.values())
             
-            # Gerar resposta
-            response = self.generate_response(query.strip(), relevant_texts)
+        except Exception as e:
+            logger.error(f"Erro no processamento do lote: {str(e)}")
+            for cache_key in queries:
+                answers.setdefault(cache_key, {"erro": str(e), "status": "error"})
+        
+        return answers
+    
+    async def asearch_knowledge_base(self, query: str, query_embedding: Optional[List[float]] = None) -> Tuple[List[str], float]:
+        """
+        Versão assíncrona de search_knowledge_base
+        
+        O embedding é obtido sem bloquear o event loop; a consulta ao Chroma,
+        que é local, roda numa thread auxiliar.
+        """
+        if query_embedding is None:
+            query_embedding = await self._aembed_query(query)
+        return await asyncio.to_thread(self._search_with_embedding, query, query_embedding)
+    
+    async def agenerate_response(self, query: str, knowledge_base: List[str], history: Optional[str] = None) -> str:
+        """Versão assíncrona de generate_response"""
+        try:
+            if not self.llm:
+                raise ValueError("Modelo de linguagem não inicializado")
             
-            return {
-                "resposta": response,
-                "status": "success",
-                "metadata": {
-                    "relevance_score": score,
-                    "sources_found": len(relevant_texts)
+            formatted_prompt = self.build_prompt(query, knowledge_base, history)
+            with span("llm_generation"):
+                response = await self.llm.ainvoke(formatted_prompt)
+            record_token_usage(response)
+            
+            logger.info("Resposta gerada com sucesso")
+            return response.content
+            
+        except Exception as e:
+            logger.error(f"Erro na geração de resposta: {str(e)}")
+            raise
+    
+    async def astream_response(self, query: str, knowledge_base: List[str],
+                               history: Optional[str] = None) -> AsyncIterator[str]:
+        """Versão assíncrona de stream_response"""
+        try:
+            if not self.llm:
+                raise ValueError("Modelo de linguagem não inicializado")
+            
+            formatted_prompt = self.build_prompt(query, knowledge_base, history)
+            
+            started = time.perf_counter()
+            first_token = True
+            with span("llm_generation"):
+                async for chunk in self.llm.astream(formatted_prompt):
+                    record_token_usage(chunk)
+                    if chunk.content:
+                        if first_token:
+                            record_stage("llm_first_token", time.perf_counter() - started)
+                            first_token = False
+                        yield chunk.content
+            
+            logger.info("Resposta gerada com sucesso (streaming)")
+            
+        except Exception as e:
+            logger.error(f"Erro na geração de resposta: {str(e)}")
+            raise
+    
+    async def aprocess_query(self, query: str, mode: str = "auto", budget_ms: Optional[float] = None,
+                             session: Optional[Session] = None) -> dict:
+        """
+        Versão assíncrona de process_query
+        
+        As chamadas de embedding e ao modelo de linguagem usam as APIs
+        assíncronas, de forma que um único processo atende muitas perguntas
+        simultâneas sem ocupar uma thread por requisição.
+        """
+        with track_request() as timings:
+            result = await self._aprocess_query(query, mode, self._deadline(budget_ms), session)
+        return self._with_timings(result, timings)
+    
+    async def _aprocess_query(self, query: str, mode: str = "auto", deadline: Optional[float] = None,
+                              session: Optional[Session] = None) -> dict:
+        """Corpo de aprocess_query, executado dentro da medição da requisição"""
+        try:
+            # Validar entrada
+            if not query or not query.strip():
+                return {
+                    "erro": "Pergunta vazia ou inválida",
+                    "status": "error"
                 }
-            }
+            
+            query = query.strip()
+            
+            if session is not None:
+                return await self._aanswer_turn(session, query, mode, deadline)
+            
+            # Consultar o nível exato do cache de respostas
+            cached, cache_key = self._lookup_exact(query, mode)
+            if cached is not None:
+                return cached
+            
+            # Perguntas idênticas já em andamento aguardam o mesmo processamento
+            flight_key = self._flight_key(cache_key, mode, deadline)
+            if flight_key is None:
+                return await self._aanswer_query(query, cache_key, mode, deadline)
+            result, source = await self.singleflight.ado(flight_key, lambda: self._aanswer_query(query, cache_key, mode, deadline))
+            return self._coalesced_response(cache_key, mode, result, source)
             
         except Exception as e:
             logger.error(f"Erro no processamento da pergunta: {str(e)}")
@@ -174,6 +1225,431 @@ com base nessas informações abaixo:
                 "erro": str(e),
                 "status": "error"
             }
+    
+    async def _aanswer_query(self, query: str, cache_key: str, mode: str = "auto", deadline: Optional[float] = None) -> dict:
+        """Versão assíncrona de _answer_query"""
+        query_embedding = await self._aembed_query(query)
+        if self._has_similar_lookup():
+            cached = self._lookup_similar(query_embedding, mode)
+            if cached is not None:
+                return cached
+        
+        relevant_texts, score = await self.asearch_knowledge_base(query, query_embedding)
+        
+        if not relevant_texts:
+            result = self._build_result(
+                "Não encontrei informações relevantes na base de conhecimento.", score, 0
+            )
+        else:
+            result = await self._agenerate_or_fallback(query, relevant_texts, score, query_embedding, mode, deadline)
+        
+        self._store_cache(cache_key, mode, query_embedding, result)
+        return result
+    
+    async def _aanswer_turn(self, session: Session, query: str, mode: str = "auto",
+                            deadline: Optional[float] = None) -> dict:
+        """Versão assíncrona de _answer_turn"""
+        self._check_kb_version()
+        query_embedding = await self._aembed_query(query)
+        relevant_texts, score, reused = await asyncio.to_thread(self._turn_context, session, query, query_embedding)
+        
+        if not relevant_texts:
+            result = self._build_result(
+                "Não encontrei informações relevantes na base de conhecimento.", score, 0
+            )
+        else:
+            result = await self._agenerate_or_fallback(
+                query, relevant_texts, score, query_embedding, mode, deadline, session.history()
+            )
+        return self._finish_turn(session, query, result, reused)
+    
+    async def aprocess_query_stream(self, query: str, mode: str = "auto", budget_ms: Optional[float] = None,
+                                    session: Optional[Session] = None) -> AsyncIterator[dict]:
+        """Versão assíncrona de process_query_stream"""
+        with track_request() as timings:
+            async for event in self._aprocess_query_stream(query, mode, self._deadline(budget_ms), session):
+                if event["event"] == "done":
+                    event["data"]["timings_ms"] = timings.snapshot()
+                yield event
+    
+    async def _aprocess_query_stream(self, query: str, mode: str = "auto", deadline: Optional[float] = None,
+                                     session: Optional[Session] = None) -> AsyncIterator[dict]:
+        """Corpo de aprocess_query_stream, executado dentro da medição da requisição"""
+        try:
+            # Validar entrada
+            if not query or not query.strip():
+                yield {"event": "error", "data": {"erro": "Pergunta vazia ou inválida", "status": "error"}}
+                return
+            
+            query = query.strip()
+            
+            reused = False
+            if session is not None:
+                # Perguntas de uma sessão dependem da conversa: sem cache de respostas nem FAQ
+                self._check_kb_version()
+                cache_key = None
+                query_embedding = await self._aembed_query(query)
+                relevant_texts, score, reused = await asyncio.to_thread(self._turn_context, session, query, query_embedding)
+            else:
+                # Consultar cache de respostas
+                cached, cache_key, query_embedding = await self._alookup_cache(query, mode)
+                if cached is not None:
+                    yield {"event": "metadata", "data": cached["metadata"]}
+                    yield {"event": "token", "data": {"content": cached["resposta"]}}
+                    yield {"event": "done", "data": {"status": "success"}}
+                    return
+                
+                # Buscar na base de conhecimento
+                if query_embedding is None:
+                    query_embedding = await self._aembed_query(query)
+                relevant_texts, score = await self.asearch_knowledge_base(query, query_embedding)
+            
+            if not relevant_texts:
+                result = self._build_result(
+                    "Não encontrei informações relevantes na base de conhecimento.", score, 0
+                )
+                self._store_cache(cache_key, mode, query_embedding, result)
+            elif self._use_fallback():
+                # Modelo indisponível: responder apenas com os trechos recuperados
+                result = self._retrieval_only_result(relevant_texts, score)
+            else:
+                # Modo lite: resposta extrativa, sem chamar o modelo
+                lite_reason = self._lite_reason(score, query_embedding is not None, mode, deadline)
+                result = self._lite_result(query, relevant_texts, score, lite_reason) if lite_reason else None
+            if result is not None:
+                if session is not None:
+                    self._finish_turn(session, query, result, reused)
+                yield {"event": "metadata", "data": result["metadata"]}
+                yield {"event": "token", "data": {"content": result["resposta"]}}
+                yield {"event": "done", "data": {"status": "success"}}
+                return
+            
+            metadata = self._build_result("", score, len(relevant_texts))["metadata"]
+            if session is not None:
+                metadata["session"] = self._session_metadata(session, reused)
+            elif self.answer_cache is not None:
+                metadata["cache"] = "miss"
+            yield {"event": "metadata", "data": metadata}
+            
+            # Repassar os tokens conforme chegam do modelo
+            parts = []
+            history = session.history() if session is not None else None
+            async for token in self.astream_response(query, relevant_texts, history):
+                parts.append(token)
+                yield {"event": "token", "data": {"content": token}}
+            
+            result = self._build_result("".join(parts), score, len(relevant_texts))
+            if session is not None:
+                self._finish_turn(session, query, result, reused)
+            else:
+                self._store_cache(cache_key, mode, query_embedding, result)
+            yield {"event": "done", "data": {"status": "success"}}
+            
+        except Exception as e:
+            logger.error(f"Erro no processamento da pergunta (streaming): {str(e)}")
+            yield {"event": "error", "data": {"erro": str(e), "status": "error"}}
+    
+    def _generate_or_fallback(self, query: str, relevant_texts: List[str], score: float,
+                              query_embedding: Optional[List[float]] = None, mode: str = "auto",
+                              deadline: Optional[float] = None, history: Optional[str] = None) -> dict:
+        """
+        Resposta do modelo para os trechos recuperados
+        
+        No modo lite (ver _lite_reason) a resposta é extrativa. Com o circuito
+        do modelo aberto (e UPSTREAM_FALLBACK_RETRIEVAL_ONLY), a resposta traz
+        apenas os trechos recuperados, sem chamar o modelo.
+        """
+        lite_reason = self._lite_reason(score, query_embedding is not None, mode, deadline)
+        if lite_reason is not None:
+            result = self._lite_result(query, relevant_texts, score, lite_reason)
+            if result is not None:
+                return result
+        
+        if not self._use_fallback():
+            try:
+                response = self.generate_response(query, relevant_texts, history)
+                return self._build_result(response, score, len(relevant_texts))
+            except Exception:
+                # A falha pode ter sido justamente a que abriu o circuito
+                if not self._use_fallback():
+                    raise
+        return self._retrieval_only_result(relevant_texts, score)
+    
+    async def _agenerate_or_fallback(self, query: str, relevant_texts: List[str], score: float,
+                                     query_embedding: Optional[List[float]] = None, mode: str = "auto",
+                                     deadline: Optional[float] = None, history: Optional[str] = None) -> dict:
+        """Versão assíncrona de _generate_or_fallback"""
+        lite_reason = self._lite_reason(score, query_embedding is not None, mode, deadline)
+        if lite_reason is not None:
+            result = self._lite_result(query, relevant_texts, score, lite_reason)
+            if result is not None:
+                return result
+        
+        if not self._use_fallback():
+            try:
+                response = await self.agenerate_response(query, relevant_texts, history)
+                return self._build_result(response, score, len(relevant_texts))
+            except Exception:
+                if not self._use_fallback():
+                    raise
+        return self._retrieval_only_result(relevant_texts, score)
+    
+    @staticmethod
+    def _deadline(budget_ms: Optional[float]) -> Optional[float]:
+        """Instante (time.monotonic) em que o orçamento de latência da requisição se esgota"""
+        return time.monotonic() + budget_ms / 1000 if budget_ms else None
+    
+    def _flight_key(self, cache_key: str, mode: str, deadline: Optional[float]) -> Optional[str]:
+        """
+        Chave da coalescência de perguntas em andamento (None para não coalescer)
+        
+        Requisições com orçamento de latência não esperam outras; os modos
+        explícitos só coalescem com requisições do mesmo modo. A coleção e a
+        versão da base fazem parte da chave, já que o lock e o resultado são
+        compartilhados com os outros workers.
+        """
+        if self.singleflight is None or deadline is not None:
+            return None
+        key = f"{self.collection}|{self.kb_version}|{cache_key}"
+        return key if mode == "auto" else f"{key}|{mode}"
+    
+    def _lite_reason(self, score: float, vector_score: bool, mode: str, deadline: Optional[float]) -> Optional[str]:
+        """
+        Motivo para responder no modo lite, ou None para gerar com o modelo
+        
+        LITE_AUTO_MIN_SCORE é um limiar de similaridade de cosseno: o score
+        só é comparado com ele quando vem da busca vetorial (``vector_score``).
+        Sem embedding da pergunta o score é a cobertura lexical do BM25, que
+        chega a 1.0 com todos os termos presentes e não indica uma resposta
+        quase literal.
+        
+        Returns:
+            "requested" (modo lite pedido), "score" (score da busca vetorial
+            de pelo menos LITE_AUTO_MIN_SCORE) ou "budget" (o tempo restante
+            do orçamento é menor que o p50 recente da geração do modelo)
+        """
+        if mode == "lite":
+            return "requested"
+        if mode != "auto" or not self.config.LITE_AUTO_ENABLED:
+            return None
+        if vector_score and score >= self.config.LITE_AUTO_MIN_SCORE:
+            return "score"
+        if deadline is not None:
+            expected_ms = registry.stage_quantile("llm_generation", 0.5) or self.config.LITE_DEFAULT_LLM_MS
+            if (deadline - time.monotonic()) * 1000 < expected_ms:
+                return "budget"
+        return None
+    
+    def _lite_result(self, query: str, relevant_texts: List[str], score: float, reason: str) -> Optional[dict]:
+        """
+        Resposta extrativa do modo lite (None se não houver frases nos trechos)
+        
+        As frases são escolhidas só com o score lexical, sem chamadas ao
+        serviço de embeddings; serve às rotas síncronas e assíncronas.
+        """
+        with span("extractive"):
+            candidates = self.extractive.candidates(query, relevant_texts)
+            if not candidates:
+                return None
+            response, sentence_score = self.extractive.select(query, relevant_texts, candidates)
+        return self._lite_response(response, score, len(relevant_texts), reason, sentence_score)
+    
+    def _lite_response(self, response: str, score: float, sources_found: int, reason: str, sentence_score: float) -> dict:
+        """Resultado do modo lite (não entra no cache de respostas)"""
+        registry.inc("api_lite_responses_total", reason=reason)
+        result = self._build_result(response, score, sources_found)
+        result["metadata"]["mode"] = "lite"
+        result["metadata"]["lite_reason"] = reason
+        result["metadata"]["extractive_score"] = round(sentence_score, 4)
+        return result
+    
+    def _use_fallback(self) -> bool:
+        """Se as respostas devem dispensar o modelo por ele estar indisponível"""
+        return (
+            self.config.UPSTREAM_FALLBACK_RETRIEVAL_ONLY
+            and self.upstream is not None
+            and not self.upstream.available("llm")
+        )
+    
+    def _retrieval_only_result(self, relevant_texts: List[str], score: float) -> dict:
+        """Resposta degradada com os trechos recuperados (não entra no cache)"""
+        logger.warning("Modelo de linguagem indisponível, respondendo apenas com os trechos recuperados")
+        registry.inc("api_degraded_responses_total", mode="retrieval_only")
+        response = (
+            "Não foi possível gerar uma resposta no momento. "
+            "Estes são os trechos mais relevantes da base de conhecimento:\n\n"
+            + "\n\n----\n\n".join(relevant_texts)
+        )
+        result = self._build_result(response, score, len(relevant_texts))
+        result["metadata"]["degraded"] = "retrieval_only"
+        return result
+    
+    def _lookup_cache(self, query: str, mode: str = "auto") -> Tuple[Optional[dict], str, Optional[List[float]]]:
+        """
+        Consulta o cache de respostas nos dois níveis, entre as respostas do modo pedido
+        
+        Returns:
+            Tupla (resposta em cache ou None, chave do cache, embedding da
+            pergunta quando já calculado)
+        """
+        cached, cache_key = self._lookup_exact(query, mode)
+        if cached is not None or not self._has_similar_lookup():
+            return cached, cache_key, None
+        
+        query_embedding = self._embed_query(query)
+        return self._lookup_similar(query_embedding, mode), cache_key, query_embedding
+    
+    async def _alookup_cache(self, query: str, mode: str = "auto") -> Tuple[Optional[dict], str, Optional[List[float]]]:
+        """Versão assíncrona de _lookup_cache"""
+        cached, cache_key = self._lookup_exact(query, mode)
+        if cached is not None or not self._has_similar_lookup():
+            return cached, cache_key, None
+        
+        query_embedding = await self._aembed_query(query)
+        return self._lookup_similar(query_embedding, mode), cache_key, query_embedding
+    
+    def _lookup_exact(self, query: str, mode: str = "auto") -> Tuple[Optional[dict], str]:
+        """Nível exato do cache (respostas do modo ``mode``) e do FAQ, pela pergunta normalizada"""
+        self._check_kb_version()
+        cache_key = normalize_question(query)
+        if self.answer_cache is not None:
+            with span("cache_lookup"):
+                cached = self.answer_cache.get_exact(cache_key, mode)
+            if cached is not None:
+                logger.info("Resposta encontrada no cache (exato)")
+                return self._cached_response(cached, "exact"), cache_key
+        
+        if self.faq_store is not None:
+            faq = self.faq_store.get_exact(cache_key)
+            if faq is not None:
+                logger.info("Resposta encontrada no FAQ pré-calculado (exato)")
+                return self._faq_response(faq[0], faq[1], 0.0, "exact"), cache_key
+        return None, cache_key
+    
+    def _lookup_similar(self, query_embedding: List[float], mode: str = "auto") -> Optional[dict]:
+        """Nível aproximado do cache (respostas do modo ``mode``) e do FAQ, pelo embedding da pergunta"""
+        if query_embedding is None:
+            return None
+        if self.answer_cache is not None:
+            with span("cache_lookup"):
+                similar = self.answer_cache.get_similar(query_embedding, mode)
+            if similar is not None:
+                cached, distance = similar
+                logger.info(f"Resposta encontrada no cache (aproximado, distância: {distance:.4f})")
+                return self._cached_response(cached, "semantic", distance)
+        
+        if self.faq_store is not None:
+            with span("cache_lookup"):
+                faq = self.faq_store.get_similar(query_embedding)
+            if faq is not None:
+                question, answer, distance = faq
+                logger.info(f"Resposta encontrada no FAQ pré-calculado (distância: {distance:.4f})")
+                return self._faq_response(question, answer, distance, "semantic")
+        return None
+    
+    def _has_similar_lookup(self) -> bool:
+        """Se há cache de respostas ou FAQ a consultar pelo embedding da pergunta"""
+        return self.answer_cache is not None or self.faq_store is not None
+    
+    def _store_cache(self, cache_key: Optional[str], mode: str, query_embedding: Optional[List[float]], result: dict):
+        """Guarda a resposta no cache, associada ao modo pedido, e marca o resultado como falha de cache"""
+        if self.answer_cache is None or cache_key is None or result["metadata"].get("degraded") or result["metadata"].get("mode") == "lite":
+            return
+        self.answer_cache.put(cache_key, query_embedding, self._cached_response(result, None), mode)
+        result["metadata"]["cache"] = "miss"
+    
+    def _coalesced_response(self, cache_key: str, mode: str, result: dict, source: Optional[str]) -> dict:
+        """
+        Resultado de uma pergunta coalescida
+        
+        Quem aguardou outra requisição recebe uma cópia marcada com a origem
+        em metadata["coalesced"]; resultados vindos de outro worker também
+        entram no cache de respostas local.
+        """
+        if source is None:
+            return result
+        if "metadata" not in result:
+            return dict(result)
+        
+        registry.inc("api_coalesced_requests_total", source=source)
+        if source == PROCESS:
+            self._store_cache(cache_key, mode, None, result)
+        copy = {**result, "metadata": dict(result["metadata"])}
+        copy["metadata"]["coalesced"] = source
+        return copy
+    
+    def _cache_hit_ratios(self) -> dict:
+        """Fração de acertos dos caches de respostas e de embeddings"""
+        ratios = {}
+        if self.answer_cache is not None:
+            stats = self.answer_cache.stats()
+            hits = stats["hits_exact"] + stats["hits_semantic"]
+            ratios["answer"] = hits / max(hits + stats["misses"], 1)
+        if hasattr(self.embedding_function, "stats"):
+            stats = self.embedding_function.stats()
+            if "hits" in stats:
+                ratios["embedding"] = stats["hits"] / max(stats["hits"] + stats["misses"], 1)
+        return ratios
+    
+    @staticmethod
+    def _with_timings(result: dict, timings: dict) -> dict:
+        """Inclui o tempo de cada etapa nos metadados da resposta"""
+        if "metadata" in result:
+            result["metadata"]["timings_ms"] = dict(timings)
+        return result
+    
+    @staticmethod
+    def _build_result(response: str, score: float, sources_found: int) -> dict:
+        """Monta o dicionário de resposta da API"""
+        return {
+            "resposta": response,
+            "status": "success",
+            "metadata": {
+                "relevance_score": score,
+                "sources_found": sources_found
+            }
+        }
+    
+    def _check_kb_version(self):
+        """Invalida o cache de respostas quando a base é reconstruída"""
+        if self.kb_watcher is not None and self.kb_watcher.changed():
+            logger.info("Base de conhecimento reconstruída, limpando cache de respostas")
+            self.kb_version = read_kb_version(self.config.CHROMA_DB_PATH)
+            if self.answer_cache is not None:
+                self.answer_cache.clear()
+            if self.config.RETRIEVAL_BACKEND in ("numpy", "snapshot"):
+                self._load_vector_index()
+            if self.config.RETRIEVAL_MODE == "hybrid":
+                self._load_lexical_index()
+            if self.config.FAQ_ENABLED:
+                self._load_faq_store()
+        elif self.snapshot_watcher is not None and self.snapshot_watcher.changed():
+            # Snapshot regravado depois da troca de versão da base
+            self._load_vector_index()
+        elif self.faq_watcher is not None and self.faq_watcher.changed():
+            # FAQ regerado para a versão atual da base
+            self._load_faq_store()
+    
+    @staticmethod
+    def _cached_response(result: dict, cache_status: Optional[str], distance: Optional[float] = None) -> dict:
+        """Copia a resposta marcando o status do cache nos metadados"""
+        metadata = dict(result.get("metadata", {}))
+        metadata.pop("cache", None)
+        metadata.pop("cache_distance", None)
+        metadata.pop("timings_ms", None)
+        if cache_status is not None:
+            metadata["cache"] = cache_status
+        if distance is not None:
+            metadata["cache_distance"] = round(distance, 6)
+        return {**result, "metadata": metadata}
+    
+    @staticmethod
+    def _faq_response(question: str, answer: dict, distance: float, match: str) -> dict:
+        """Copia a resposta pré-calculada indicando a pergunta do FAQ usada"""
+        registry.inc("api_faq_hits_total", match=match)
+        metadata = dict(answer.get("metadata", {}))
+        metadata["faq"] = {"pergunta": question, "distance": round(distance, 6)}
+        return {**answer, "metadata": metadata}
 
 # Instância global do serviço
 semantic_service = SemanticSearchService()
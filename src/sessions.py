@@ -0,0 +1,293 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from src.context_packer import count_tokens
+
+
+class SessionNotFoundError(LookupError):
+    """Sessão pedida não existe ou expirou"""
+
+
+class Session:
+    """
+    Estado de uma conversa
+
+    Guarda os chunks recuperados para o assunto atual (ids, textos e score),
+    o embedding do assunto (média das perguntas que o seguiram) e um resumo
+    das trocas anteriores: cada turno vira uma linha com a pergunta e o
+    início da resposta, e as linhas mais antigas saem quando o resumo passa
+    do orçamento de tokens.
+    """
+
+    def __init__(self, session_id: str, collection: str):
+        self.id = session_id
+        self.collection = collection
+        self.turn_count = 0
+        self.summary: List[str] = []
+        self.chunk_ids: List[Optional[str]] = []
+        self.chunk_texts: List[str] = []
+        self.score = 0.0
+        self.kb_version: Optional[str] = None
+        self.topic: Optional[List[float]] = None
+        self.updated_at = time.time()
+
+    def topic_similarity(self, embedding: List[float]) -> float:
+        """Similaridade de cosseno entre a pergunta e o assunto atual"""
+        if self.topic is None or embedding is None:
+            return 0.0
+        topic = np.asarray(self.topic, dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        return float(topic @ query / max(float(np.linalg.norm(topic) * np.linalg.norm(query)), 1e-12))
+
+    def set_context(self, chunk_ids: List[Optional[str]], chunk_texts: List[str], score: float,
+                    embedding: Optional[List[float]], kb_version: Optional[str]):
+        """Troca o assunto: novos chunks recuperados para a pergunta"""
+        self.chunk_ids = list(chunk_ids)
+        self.chunk_texts = list(chunk_texts)
+        self.score = score
+        self.kb_version = kb_version
+        self.topic = self._normalized(embedding) if embedding is not None else None
+
+    def follow_topic(self, embedding: Optional[List[float]]):
+        """Inclui a pergunta de continuação no embedding do assunto"""
+        if embedding is None or self.topic is None:
+            return
+        topic = np.asarray(self.topic, dtype=np.float32) + np.asarray(self._normalized(embedding), dtype=np.float32)
+        self.topic = self._normalized(topic)
+
+    def record_turn(self, question: str, answer: str, max_answer_chars: int = 300,
+                    max_tokens: int = 400, encoding: str = "cl100k_base"):
+        """Acrescenta o turno ao resumo, mantendo-o dentro de ``max_tokens``"""
+        answer = " ".join(answer.split())
+        if len(answer) > max_answer_chars:
+            answer = answer[:max_answer_chars].rsplit(" ", 1)[0] + "..."
+        self.summary.append(f"Usuário: {' '.join(question.split())}\nAssistente: {answer}")
+        while len(self.summary) > 1 and count_tokens(self.history(), encoding) > max_tokens:
+            self.summary.pop(0)
+        self.turn_count += 1
+        self.updated_at = time.time()
+
+    def history(self) -> str:
+        """Resumo das trocas anteriores, para o prompt"""
+        return "\n\n".join(self.summary)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "collection": self.collection,
+            "turn_count": self.turn_count,
+            "summary": self.summary,
+            "chunk_ids": self.chunk_ids,
+            "chunk_texts": self.chunk_texts,
+            "score": self.score,
+            "kb_version": self.kb_version,
+            "topic": self.topic,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        session = cls(data["id"], data["collection"])
+        session.turn_count = data["turn_count"]
+        session.summary = list(data["summary"])
+        session.chunk_ids = list(data["chunk_ids"])
+        session.chunk_texts = list(data["chunk_texts"])
+        session.score = data["score"]
+        session.kb_version = data.get("kb_version")
+        session.topic = data.get("topic")
+        session.updated_at = data["updated_at"]
+        return session
+
+    @staticmethod
+    def _normalized(embedding) -> List[float]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return (vector / max(float(np.linalg.norm(vector)), 1e-12)).tolist()
+
+
+class SessionStore(ABC):
+    """
+    Armazenamento das sessões de conversa
+
+    Cada ``get`` devolve uma cópia da sessão; as alterações valem depois de
+    ``save``. Sessões sem atividade por ``ttl_seconds`` expiram, e as menos
+    recentes são descartadas quando há mais de ``max_sessions``.
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+
+    def create(self, collection: str) -> Session:
+        """Cria e grava uma nova sessão"""
+        session = Session(uuid.uuid4().hex, collection)
+        self.save(session)
+        return session
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Session]:
+        """Sessão ativa com o id, ou None se não existir ou tiver expirado"""
+
+    @abstractmethod
+    def save(self, session: Session):
+        """Grava a sessão (nova ou atualizada)"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Remove a sessão; retorna se ela existia"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Sessões guardadas"""
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessões num LRU em memória (válidas apenas no próprio processo)"""
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 1800.0):
+        super().__init__(max_sessions, ttl_seconds)
+        self._sessions: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            data = self._sessions.get(session_id)
+            if data is None:
+                return None
+            if data["updated_at"] + self.ttl_seconds < time.time():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return Session.from_dict(data)
+
+    def save(self, session: Session):
+        data = session.to_dict()
+        with self._lock:
+            self._sessions[session.id] = data
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Sessões em SQLite (modo WAL)
+
+    Compartilhadas entre os workers da mesma máquina, o que dispensa afinidade
+    de sessão no balanceador, e preservadas entre reinicializações.
+    """
+
+    # Remoção de sessões expiradas e excedentes a cada N gravações
+    PRUNE_EVERY = 100
+
+    def __init__(self, db_path: str, max_sessions: int = 10000, ttl_seconds: float = 1800.0):
+        super().__init__(max_sessions, ttl_seconds)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        conn.commit()
+
+    def get(self, session_id: str) -> Optional[Session]:
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.ttl_seconds)
+        ).fetchone()
+        return Session.from_dict(json.loads(row[0])) if row else None
+
+    def save(self, session: Session):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+            (session.id, json.dumps(session.to_dict(), ensure_ascii=False), session.updated_at)
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM sessions WHERE id IN ("
+                " SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            )
+        conn.commit()
+
+    def delete(self, session_id: str) -> bool:
+        conn = self._connection()
+        deleted = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+        conn.commit()
+        return deleted > 0
+
+    def __len__(self) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (time.time() - self.ttl_seconds,)
+        ).fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        # Conexões não podem atravessar um fork, por isso guardamos o pid
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+def create_session_store(kind: str, db_path: Optional[str] = None, max_sessions: int = 10000,
+                         ttl_seconds: float = 1800.0) -> SessionStore:
+    """
+    Armazenamento de sessões do tipo configurado
+
+    Args:
+        kind: "memory" ou "sqlite"
+        db_path: Arquivo SQLite (para "sqlite")
+    """
+    if kind == "sqlite":
+        return SqliteSessionStore(db_path, max_sessions, ttl_seconds)
+    if kind == "memory":
+        return InMemorySessionStore(max_sessions, ttl_seconds)
+    raise ValueError(f"Armazenamento de sessões desconhecido: {kind}")
+
+
+def lookup_session(store: Optional[SessionStore], session_id) -> Optional[Session]:
+    """
+    Sessão indicada no campo "sessao" da requisição (None sem o campo)
+
+    Raises:
+        ValueError: Id inválido ou sessões desativadas
+        SessionNotFoundError: A sessão não existe ou expirou
+    """
+    if session_id is None:
+        return None
+    if store is None:
+        raise ValueError("Sessões de conversa desativadas")
+    if not isinstance(session_id, str) or not session_id:
+        raise ValueError("Campo 'sessao' deve ser o id de uma sessão criada em POST /api/sessions")
+    session = store.get(session_id)
+    if session is None:
+        raise SessionNotFoundError(f"Sessão '{session_id}' não encontrada ou expirada")
+    return session
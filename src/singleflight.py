@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescência apenas dentro do processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre tentativas de obter o lock de outro processo
+POLL_INTERVAL = 0.02
+# Origem de um resultado que não foi calculado pela própria chamada
+INFLIGHT = "inflight"
+PROCESS = "process"
+
+# Arquivos de lock sem uso há mais tempo que isso são removidos
+STALE_LOCK_SECONDS = 3600
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas idênticas em andamento
+
+    Enquanto a primeira chamada para uma chave está em execução, as demais
+    com a mesma chave aguardam e recebem o mesmo resultado (ou exceção), em
+    vez de repetir o trabalho. Dentro do processo isso vale tanto para
+    threads quanto para corrotinas.
+
+    O resultado vem acompanhado da origem: None quando calculado pela
+    própria chamada, "inflight" quando compartilhado por outra chamada do
+    processo e "process" quando lido do resultado de outro worker.
+
+    Com ``lock_dir``, a coordenação se estende aos outros workers da mesma
+    máquina: o processo líder segura um lock de arquivo (flock) por chave e,
+    ao terminar, grava o resultado num arquivo JSON ao lado do lock. Os
+    processos que esperavam pelo lock leem esse resultado se ele tiver sido
+    gravado depois do início da espera (e há menos de ``result_ttl``
+    segundos); caso contrário executam a chamada normalmente. Um resultado
+    que já estava no disco quando a chamada começou nunca é reaproveitado,
+    para que a coalescência não vire um cache de respostas.
+    """
+
+    def __init__(self, lock_dir: Optional[str] = None, wait_timeout: float = 60.0,
+                 result_ttl: float = 10.0):
+        self.lock_dir = lock_dir if (lock_dir and fcntl is not None) else None
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_from_process = 0
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, Optional[str]]:
+        """
+        Executa ``fn`` uma única vez por chave em andamento
+
+        Returns:
+            Tupla (resultado, origem)
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), INFLIGHT
+
+        try:
+            result, source = self._run_locked(key, fn)
+            future.set_result(result)
+            return result, source
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[str]]:
+        """Versão assíncrona de ``do``, para corrotinas"""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), INFLIGHT
+
+        try:
+            result, source = await self._arun_locked(key, fn)
+            future.set_result(result)
+            return result, source
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+
+    def stats(self) -> dict:
+        """Execuções, chamadas coalescidas no processo e resultados vindos de outros processos"""
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "shared_from_process": self.shared_from_process,
+            "in_flight": len(self._flights),
+        }
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._flights[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def _leave(self, key: str):
+        with self._lock:
+            self._flights.pop(key, None)
+
+    # Coordenação entre processos
+
+    def _run_locked(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, Optional[str]]:
+        if not self.lock_dir:
+            return fn(), None
+
+        lock_path, result_path = self._paths(key)
+        waiting_since = time.time()
+        with open(lock_path, "a") as lock_file:
+            deadline = time.monotonic() + self.wait_timeout
+            while not self._try_lock(lock_file):
+                if time.monotonic() >= deadline:
+                    # Líder de outro processo demorando demais: executar aqui mesmo
+                    return fn(), None
+                time.sleep(POLL_INTERVAL)
+            try:
+                return self._run_as_leader(result_path, fn, waiting_since)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    async def _arun_locked(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[str]]:
+        if not self.lock_dir:
+            return await fn(), None
+
+        lock_path, result_path = self._paths(key)
+        waiting_since = time.time()
+        with open(lock_path, "a") as lock_file:
+            deadline = time.monotonic() + self.wait_timeout
+            while not self._try_lock(lock_file):
+                if time.monotonic() >= deadline:
+                    return await fn(), None
+                await asyncio.sleep(POLL_INTERVAL)
+            try:
+                shared = self._read_result(result_path, waiting_since)
+                if shared is not None:
+                    return shared, PROCESS
+                result = await fn()
+                self._write_result(result_path, result)
+                return result, None
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _run_as_leader(self, result_path: str, fn: Callable[[], Any],
+                       waiting_since: float) -> Tuple[Any, Optional[str]]:
+        # Outro processo pode ter calculado o mesmo resultado enquanto esperávamos o lock
+        shared = self._read_result(result_path, waiting_since)
+        if shared is not None:
+            return shared, PROCESS
+        result = fn()
+        self._write_result(result_path, result)
+        return result, None
+
+    @staticmethod
+    def _try_lock(lock_file) -> bool:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        base = os.path.join(self.lock_dir, digest)
+        return base + ".lock", base + ".json"
+
+    def _read_result(self, result_path: str, waiting_since: float) -> Optional[Any]:
+        """Resultado gravado por outro processo desde ``waiting_since`` (time.time)"""
+        try:
+            modified = os.path.getmtime(result_path)
+            if modified < waiting_since or time.time() - modified > self.result_ttl:
+                return None
+            with open(result_path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.shared_from_process += 1
+        return result
+
+    def _write_result(self, result_path: str, result: Any):
+        # Só respostas bem-sucedidas são compartilhadas entre processos
+        if not isinstance(result, dict) or result.get("status") != "success":
+            return
+        try:
+            tmp_path = f"{result_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, result_path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Não foi possível compartilhar o resultado entre processos: {str(e)}")
+        self._cleanup()
+
+    def _cleanup(self):
+        """Remove locks e resultados antigos (no máximo uma vez por minuto)"""
+        now = time.time()
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        try:
+            for name in os.listdir(self.lock_dir):
+                path = os.path.join(self.lock_dir, name)
+                max_age = self.result_ttl if name.endswith(".json") else STALE_LOCK_SECONDS
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,196 @@
+import json
+import mmap
+import os
+import struct
+import time
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.vector_index import NumpyVectorIndex, quantize_binary, quantize_int8
+
+SNAPSHOT_MAGIC = b"KBSNAP\x00\x00"
+SNAPSHOT_FORMAT = 1
+
+# Início de cada seção alinhado para que as matrizes possam ser lidas
+# diretamente do mapeamento, sem cópia
+SECTION_ALIGNMENT = 64
+
+# Prefixo fixo: assinatura + tamanho do cabeçalho JSON (uint64 little-endian)
+_PREFIX = struct.Struct("<8sQ")
+
+
+class PackedStrings(Sequence):
+    """
+    Lista de strings somente leitura sobre um buffer UTF-8
+
+    As strings ficam concatenadas em ``data`` e ``offsets[i]:offsets[i + 1]``
+    delimita a i-ésima; cada acesso decodifica apenas o item pedido. Com
+    ``as_json=True`` cada item é um objeto JSON (os metadados dos chunks).
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray, as_json: bool = False):
+        self.offsets = offsets
+        self.data = data
+        self.as_json = as_json
+
+    def __len__(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        value = self.data[int(self.offsets[position]):int(self.offsets[position + 1])].tobytes().decode("utf-8")
+        return json.loads(value) if self.as_json else value
+
+
+def _pack_strings(values: List[str]):
+    """(offsets uint64, bytes uint8) das strings concatenadas"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _aligned(position: int) -> int:
+    return -(-position // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+
+
+def save_snapshot(index: NumpyVectorIndex, path: str, collection: Optional[str] = None) -> dict:
+    """
+    Grava o índice num único arquivo de snapshot
+
+    O arquivo traz os vetores normalizados, os códigos quantizados, os ids,
+    os textos e os metadados dos chunks, cada um numa seção alinhada, após
+    um cabeçalho JSON com a versão da base. É gravado num arquivo temporário
+    e trocado de forma atômica: um snapshot nunca é alterado no lugar, então
+    os processos que ainda mapeiam a versão anterior continuam lendo-a.
+
+    Args:
+        index: Índice exportado da base Chroma
+        path: Arquivo do snapshot
+        collection: Nome da coleção, registrado no cabeçalho
+
+    Returns:
+        Cabeçalho gravado
+    """
+    vectors = np.ascontiguousarray(index.vectors, dtype=np.float32)
+    codes, scales = quantize_int8(vectors)
+    sections: Dict[str, np.ndarray] = {
+        "vectors": vectors,
+        "codes_int8": codes,
+        "scales_int8": scales,
+        "codes_binary": quantize_binary(vectors),
+    }
+    for name, values in (("ids", index.ids), ("texts", index.texts),
+                         ("metadatas", [json.dumps(m, ensure_ascii=False) for m in index.metadatas])):
+        sections[f"{name}_offsets"], sections[f"{name}_data"] = _pack_strings(list(values))
+
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": index.version,
+        "collection": collection,
+        "count": len(index),
+        "dimensions": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "created_at": time.time(),
+        "sections": {},
+    }
+    # Posições relativas ao início dos dados, que vem logo após o cabeçalho
+    position = 0
+    for name, array in sections.items():
+        position = _aligned(position)
+        header["sections"][name] = {"offset": position, "dtype": array.dtype.str, "shape": list(array.shape)}
+        position += array.nbytes
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(SNAPSHOT_MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        data_start = _aligned(f.tell())
+        for name, array in sections.items():
+            f.write(b"\0" * (data_start + header["sections"][name]["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return header
+
+
+def _parse_header(buffer, path: str):
+    """(cabeçalho, posição do início dos dados) de um snapshot"""
+    if len(buffer) < _PREFIX.size:
+        raise ValueError(f"Arquivo não é um snapshot da base: {path}")
+    magic, header_size = _PREFIX.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"Arquivo não é um snapshot da base: {path}")
+    header = json.loads(bytes(buffer[_PREFIX.size:_PREFIX.size + header_size]))
+    if header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Formato de snapshot não suportado: {header.get('format')}")
+    return header, _aligned(_PREFIX.size + header_size)
+
+
+def read_snapshot_header(path: str) -> dict:
+    """Cabeçalho de um snapshot, sem mapear os dados"""
+    with open(path, "rb") as f:
+        prefix = f.read(_PREFIX.size)
+        _, header_size = _PREFIX.unpack(prefix) if len(prefix) == _PREFIX.size else (None, 0)
+        return _parse_header(prefix + f.read(header_size), path)[0]
+
+
+def load_snapshot(path: str, quantization: str = "none", rerank_factor: int = 10,
+                  prefetch: bool = True) -> NumpyVectorIndex:
+    """
+    Abre um snapshot gravado por ``save_snapshot``
+
+    O arquivo inteiro é mapeado somente leitura e cada seção vira uma
+    matriz sobre o mapeamento, sem leitura nem cópia: abrir leva poucos
+    milissegundos independentemente do tamanho da base, e os processos que
+    abrem o mesmo arquivo compartilham as páginas pelo cache do sistema
+    operacional. Ids, textos e metadados são decodificados apenas quando
+    um chunk é devolvido pela busca.
+
+    Args:
+        path: Arquivo do snapshot
+        quantization: Quantização da busca ("none", "int8" ou "binary")
+        rerank_factor: Candidatos da primeira passada por resultado pedido
+        prefetch: Pede ao sistema a leitura antecipada do arquivo, para que
+            a primeira busca já encontre as páginas em memória
+
+    Returns:
+        Índice com os dados do snapshot
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header, data_start = _parse_header(mapped, path)
+    if prefetch and hasattr(mapped, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+        mapped.madvise(mmap.MADV_WILLNEED)
+
+    def section(name: str) -> np.ndarray:
+        spec = header["sections"][name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        if count == 0:
+            return np.empty(spec["shape"], dtype=dtype)
+        return np.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + spec["offset"]).reshape(spec["shape"])
+
+    index = NumpyVectorIndex(
+        section("vectors"),
+        PackedStrings(section("ids_offsets"), section("ids_data")),
+        PackedStrings(section("texts_offsets"), section("texts_data")),
+        PackedStrings(section("metadatas_offsets"), section("metadatas_data"), as_json=True),
+        header.get("version")
+    )
+    codes = scales = None
+    if quantization == "int8":
+        codes, scales = section("codes_int8"), section("scales_int8")
+    elif quantization == "binary":
+        codes = section("codes_binary")
+    index.quantize(quantization, codes, scales, rerank_factor)
+    return index
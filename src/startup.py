@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+class StartupTracker:
+    """
+    Progresso da inicialização do serviço, consultado pelo readiness probe
+
+    Cada etapa registra sua duração; ``ready`` é sinalizado uma única vez ao
+    final e pode ser aguardado por outras threads com ``wait``.
+    """
+
+    def __init__(self):
+        self.status = PENDING
+        self.current_step: Optional[str] = None
+        self.steps: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def begin(self) -> bool:
+        """Marca o início da inicialização; False se ela já foi iniciada"""
+        with self._lock:
+            if self.status != PENDING:
+                return False
+            self.status = STARTING
+            self._started_at = time.monotonic()
+            return True
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        """Mede uma etapa da inicialização"""
+        self.current_step = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = round((time.perf_counter() - started) * 1000, 2)
+            self.current_step = None
+
+    def mark_ready(self):
+        self._finish(READY)
+        logger.info(f"Serviço pronto em {self._elapsed_ms():.0f}ms ({self.steps})")
+
+    def mark_failed(self, error: str):
+        self.error = error
+        self._finish(FAILED)
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set() and self.status == READY
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda o fim da inicialização; True se o serviço ficou pronto"""
+        self._ready.wait(timeout)
+        return self.is_ready
+
+    def snapshot(self) -> dict:
+        """Estado atual, etapas concluídas e tempo decorrido"""
+        snapshot = {
+            "status": self.status,
+            "steps_ms": dict(self.steps),
+            "elapsed_ms": round(self._elapsed_ms(), 2),
+        }
+        if self.current_step is not None:
+            snapshot["current_step"] = self.current_step
+        if self.error is not None:
+            snapshot["erro"] = self.error
+        return snapshot
+
+    def _finish(self, status: str):
+        with self._lock:
+            self.status = status
+            self._finished_at = time.monotonic()
+        self._ready.set()
+
+    def _elapsed_ms(self) -> float:
+        if self._started_at is None:
+            return 0.0
+        end = self._finished_at if self._finished_at is not None else time.monotonic()
+        return (end - self._started_at) * 1000
@@ -0,0 +1,339 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Respostas que valem uma nova tentativa
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Chamada recusada sem acessar a rede porque o circuito está aberto"""
+
+
+class CircuitBreaker:
+    """
+    Disjuntor por etapa (embedding, llm)
+
+    Após ``failure_threshold`` falhas consecutivas (já esgotadas as novas
+    tentativas) o circuito abre e as chamadas falham imediatamente por
+    ``reset_timeout`` segundos. Depois disso uma única chamada de teste é
+    liberada (meio aberto): se der certo o circuito fecha, senão reabre.
+    Erros inesperados também contam como falha; uma chamada cancelada só
+    libera a vaga de teste.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Se uma chamada pode ser feita agora"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # Meio aberto: só uma chamada de teste por vez
+            if self._trial_in_flight:
+                return False
+            self._state = HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"Circuito {self.name} fechado")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"Circuito {self.name} aberto após {self._failures} falhas")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Libera a chamada de teste interrompida sem resultado (ex.: cancelada pelo cliente)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class RetryPolicy:
+    """
+    Novas tentativas com backoff exponencial e jitter, dentro de um orçamento
+
+    O intervalo é sorteado entre 0 e ``base_delay * 2**tentativa`` (limitado
+    a ``max_delay``), ou segue o cabeçalho Retry-After quando presente. Uma
+    nova tentativa só é feita se couber em ``budget`` segundos contados a
+    partir da primeira.
+    """
+
+    def __init__(self, max_attempts: int = 4, budget: float = 30.0,
+                 base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Espera antes da tentativa seguinte a ``attempt`` (1 = primeira)"""
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            try:
+                if retry_after is not None:
+                    return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class _ResilientTransportBase:
+    """Decisões compartilhadas pelos transportes síncrono e assíncrono"""
+
+    def __init__(self, policy: RetryPolicy, breakers: Dict[str, CircuitBreaker]):
+        self.policy = policy
+        self.breakers = breakers
+
+    @staticmethod
+    def stage(request: httpx.Request) -> str:
+        path = request.url.path
+        if path.endswith("/embeddings"):
+            return "embedding"
+        if path.endswith("/chat/completions"):
+            return "llm"
+        return "other"
+
+    def _admit(self, request: httpx.Request) -> Optional[CircuitBreaker]:
+        breaker = self.breakers.get(self.stage(request))
+        if breaker is not None and not breaker.allow():
+            registry.inc("api_upstream_rejected_total", stage=breaker.name)
+            raise CircuitOpenError(f"Circuito {breaker.name} aberto: serviço upstream indisponível", request=request)
+        return breaker
+
+    def _limit_timeout(self, request: httpx.Request, deadline: float):
+        # Nenhuma tentativa pode passar do fim do orçamento total
+        remaining = max(deadline - time.monotonic(), 0.001)
+        timeout = dict(request.extensions.get("timeout") or {})
+        for key in ("connect", "read", "write", "pool"):
+            timeout[key] = remaining if timeout.get(key) is None else min(timeout[key], remaining)
+        request.extensions["timeout"] = timeout
+
+    def _next_delay(self, attempt: int, deadline: float, response: Optional[httpx.Response]) -> Optional[float]:
+        """Espera até a próxima tentativa, ou None se não houver mais tentativas"""
+        if attempt >= self.policy.max_attempts:
+            return None
+        delay = self.policy.delay(attempt, response)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    @staticmethod
+    def _finish(breaker: Optional[CircuitBreaker], success: Optional[bool]):
+        """Registra o resultado da chamada no disjuntor (None: interrompida, sem resultado)"""
+        if breaker is None:
+            return
+        if success is None:
+            breaker.release_trial()
+        elif success:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def _count_retry(self, request: httpx.Request, response: Optional[httpx.Response]):
+        reason = str(response.status_code) if response is not None else "connection"
+        registry.inc("api_upstream_retries_total", stage=self.stage(request), reason=reason)
+
+
+class ResilientTransport(_ResilientTransportBase, httpx.BaseTransport):
+    """Transporte httpx com novas tentativas e disjuntor em volta de outro transporte"""
+
+    def __init__(self, inner: httpx.BaseTransport, policy: RetryPolicy, breakers: Dict[str, CircuitBreaker]):
+        super().__init__(policy, breakers)
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = self._admit(request)
+        # Sempre registrado no disjuntor, para não deixar a chamada de teste presa
+        success = None
+        try:
+            response = self._send(request)
+            success = response.status_code not in RETRYABLE_STATUS
+            return response
+        except Exception:
+            success = False
+            raise
+        finally:
+            self._finish(breaker, success)
+
+    def _send(self, request: httpx.Request) -> httpx.Response:
+        """Envia a requisição com as novas tentativas da política"""
+        deadline = time.monotonic() + self.policy.budget
+        attempt = 0
+        while True:
+            attempt += 1
+            self._limit_timeout(request, deadline)
+            try:
+                response = self.inner.handle_request(request)
+            except httpx.TransportError as e:
+                delay = self._next_delay(attempt, deadline, None)
+                if delay is None:
+                    raise
+                logger.warning(f"Falha de conexão com o upstream, nova tentativa em {delay:.2f}s: {str(e)}")
+                self._count_retry(request, None)
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRYABLE_STATUS:
+                return response
+
+            delay = self._next_delay(attempt, deadline, response)
+            if delay is None:
+                return response
+            logger.warning(f"Upstream respondeu {response.status_code}, nova tentativa em {delay:.2f}s")
+            self._count_retry(request, response)
+            response.close()
+            time.sleep(delay)
+
+    def close(self):
+        self.inner.close()
+
+
+class AsyncResilientTransport(_ResilientTransportBase, httpx.AsyncBaseTransport):
+    """Versão assíncrona de ResilientTransport"""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, policy: RetryPolicy, breakers: Dict[str, CircuitBreaker]):
+        super().__init__(policy, breakers)
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = self._admit(request)
+        success = None
+        try:
+            response = await self._send(request)
+            success = response.status_code not in RETRYABLE_STATUS
+            return response
+        except Exception:
+            success = False
+            raise
+        finally:
+            self._finish(breaker, success)
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        """Versão assíncrona de ResilientTransport._send"""
+        deadline = time.monotonic() + self.policy.budget
+        attempt = 0
+        while True:
+            attempt += 1
+            self._limit_timeout(request, deadline)
+            try:
+                response = await self.inner.handle_async_request(request)
+            except httpx.TransportError as e:
+                delay = self._next_delay(attempt, deadline, None)
+                if delay is None:
+                    raise
+                logger.warning(f"Falha de conexão com o upstream, nova tentativa em {delay:.2f}s: {str(e)}")
+                self._count_retry(request, None)
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code not in RETRYABLE_STATUS:
+                return response
+
+            delay = self._next_delay(attempt, deadline, response)
+            if delay is None:
+                return response
+            logger.warning(f"Upstream respondeu {response.status_code}, nova tentativa em {delay:.2f}s")
+            self._count_retry(request, response)
+            await response.aclose()
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class UpstreamClients:
+    """
+    Clientes HTTP compartilhados pelas chamadas à OpenAI
+
+    Um pool de conexões keep-alive (síncrono e assíncrono) dimensionado pela
+    configuração, com novas tentativas e um disjuntor por etapa. Os prazos de
+    conexão e leitura de cada etapa são passados aos modelos via
+    ``timeout(etapa)``.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.policy = RetryPolicy(
+            max_attempts=config.UPSTREAM_RETRY_MAX_ATTEMPTS,
+            budget=config.UPSTREAM_RETRY_BUDGET,
+            base_delay=config.UPSTREAM_RETRY_BASE_DELAY,
+            max_delay=config.UPSTREAM_RETRY_MAX_DELAY
+        )
+        self.breakers = {
+            stage: CircuitBreaker(
+                stage,
+                failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=config.CIRCUIT_RESET_TIMEOUT
+            )
+            for stage in ("embedding", "llm")
+        }
+        limits = httpx.Limits(
+            max_connections=config.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=config.UPSTREAM_KEEPALIVE_EXPIRY
+        )
+        self.http_client = httpx.Client(
+            transport=ResilientTransport(httpx.HTTPTransport(limits=limits), self.policy, self.breakers),
+            timeout=self.timeout("llm")
+        )
+        self.http_async_client = httpx.AsyncClient(
+            transport=AsyncResilientTransport(httpx.AsyncHTTPTransport(limits=limits), self.policy, self.breakers),
+            timeout=self.timeout("llm")
+        )
+
+    def timeout(self, stage: str) -> httpx.Timeout:
+        """Prazos de conexão e de leitura da etapa"""
+        read = self.config.UPSTREAM_EMBEDDING_TIMEOUT if stage == "embedding" else self.config.UPSTREAM_LLM_TIMEOUT
+        return httpx.Timeout(read, connect=self.config.UPSTREAM_CONNECT_TIMEOUT)
+
+    def available(self, stage: str) -> bool:
+        """Se o circuito da etapa permite chamadas (fechado ou em teste)"""
+        breaker = self.breakers.get(stage)
+        return breaker is None or breaker.state != OPEN
+
+    def circuit_states(self) -> Dict[str, float]:
+        """Estado de cada circuito: 0 fechado, 1 meio aberto, 2 aberto"""
+        values = {CLOSED: 0.0, HALF_OPEN: 1.0, OPEN: 2.0}
+        return {name: values[breaker.state] for name, breaker in self.breakers.items()}
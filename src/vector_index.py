@@ -0,0 +1,279 @@
+import json
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+VECTORS_FILENAME = "vectors.npy"
+CHUNKS_FILENAME = "chunks.json"
+INT8_CODES_FILENAME = "codes_int8.npy"
+INT8_SCALES_FILENAME = "scales_int8.npy"
+BINARY_CODES_FILENAME = "codes_binary.npy"
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# Linhas convertidas por vez na primeira passada sobre os códigos int8
+# (limita a matriz temporária em float32 a alguns MB)
+SCAN_BLOCK_ROWS = 1024
+
+
+def relevance_from_cosine(cosine: np.ndarray) -> np.ndarray:
+    """
+    Converte similaridade de cosseno no mesmo score de relevância do Chroma
+
+    O Chroma usa a distância L2 ao quadrado, que para vetores normalizados é
+    2 - 2·cos, e o langchain_chroma a converte com 1 - d/√2. Reproduzir a
+    conversão mantém o SIMILARITY_THRESHOLD válido para os dois backends.
+    """
+    return 1.0 - (2.0 - 2.0 * cosine) / math.sqrt(2)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantização escalar simétrica por dimensão
+
+    Returns:
+        Tupla (códigos int8, escala float32 de cada dimensão)
+    """
+    scales = np.abs(vectors).max(axis=0).astype(np.float32) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+        codes[start:start + SCAN_BLOCK_ROWS] = np.clip(np.rint(block / scales), -127, 127)
+    return codes, scales
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sinal de cada dimensão, 8 dimensões por byte"""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+class NumpyVectorIndex:
+    """
+    Índice vetorial em memória para bases pequenas
+
+    Todos os embeddings ficam numa única matriz float32 contígua, com linhas
+    normalizadas (L2), que pode ser mapeada do disco (mmap). A busca top-k é
+    um produto matriz-vetor seguido de ``argpartition``.
+
+    Com quantização ("int8" ou "binary") a primeira passada percorre apenas
+    os códigos compactos (1 byte ou 1 bit por dimensão) e seleciona
+    ``k * rerank_factor`` candidatos, reordenados com os vetores exatos. Só
+    as linhas desses candidatos são lidas da matriz float32 mapeada, então
+    a memória residente da busca fica próxima do tamanho dos códigos, e os
+    arquivos mapeados somente leitura são compartilhados entre processos.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: List[str], texts: List[str],
+                 metadatas: List[dict], version: Optional[str] = None):
+        self.vectors = vectors
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.version = version
+        self._positions: Optional[Dict[str, int]] = None
+        self.quantization = "none"
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.rerank_factor = 10
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimensions(self) -> int:
+        return self.vectors.shape[1]
+
+    def search(self, query_embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+        """
+        Busca os k chunks mais próximos
+
+        Returns:
+            Lista de (Document, score de relevância), do mais ao menos relevante
+        """
+        return self.search_batch([query_embedding], k)[0]
+
+    def search_batch(self, query_embeddings: List[List[float]], k: int) -> List[List[Tuple[Document, float]]]:
+        """Busca várias perguntas com um único produto de matrizes"""
+        if len(self) == 0 or not query_embeddings:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        if self.quantization != "none":
+            return self._search_quantized(queries, k)
+        similarities = queries @ self.vectors.T
+
+        k = min(k, len(self))
+        results = []
+        for row in similarities:
+            if k < len(row):
+                top = np.argpartition(-row, k - 1)[:k]
+            else:
+                top = np.arange(len(row))
+            top = top[np.argsort(-row[top])]
+            relevance = relevance_from_cosine(row[top])
+            results.append([
+                (self.document(int(i)), float(score))
+                for i, score in zip(top, relevance)
+            ])
+        return results
+
+    def quantize(self, mode: str, codes: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None,
+                 rerank_factor: int = 10):
+        """
+        Ativa a busca sobre códigos quantizados
+
+        Args:
+            mode: "none", "int8" ou "binary"
+            codes: Códigos já calculados (por padrão, calculados da matriz)
+            scales: Escalas por dimensão dos códigos int8
+            rerank_factor: Candidatos da primeira passada por resultado pedido
+        """
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Quantização desconhecida: {mode}")
+        self.quantization = mode
+        self.rerank_factor = max(1, rerank_factor)
+        if mode == "int8" and codes is None:
+            codes, scales = quantize_int8(self.vectors)
+        elif mode == "binary" and codes is None:
+            codes = quantize_binary(self.vectors)
+        self.codes, self.scales = (codes, scales) if mode != "none" else (None, None)
+
+    def _approximate_scores(self, queries: np.ndarray) -> np.ndarray:
+        """Scores da primeira passada (maior é melhor) de cada pergunta para todos os chunks"""
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        if self.quantization == "int8":
+            # codes · (escala ⊙ pergunta) aproxima vetores · pergunta
+            scaled = (queries * self.scales).T
+            for start in range(0, len(self), SCAN_BLOCK_ROWS):
+                block = self.codes[start:start + SCAN_BLOCK_ROWS].astype(np.float32)
+                scores[:, start:start + len(block)] = (block @ scaled).T
+        else:
+            # Menos bits de sinal diferentes (distância de Hamming) é melhor;
+            # com 64 bits por palavra o popcount processa 8 bytes por vez
+            codes, query_bits = self.codes, quantize_binary(queries)
+            if codes.shape[1] % 8 == 0:
+                codes, query_bits = codes.view(np.uint64), query_bits.view(np.uint64)
+            for row, bits in enumerate(query_bits):
+                distances = np.bitwise_count(codes ^ bits).sum(axis=1, dtype=np.int32)
+                scores[row] = -distances
+        return scores
+
+    def _search_quantized(self, queries: np.ndarray, k: int) -> List[List[Tuple[Document, float]]]:
+        """Primeira passada nos códigos e reordenação dos candidatos com os vetores exatos"""
+        k = min(k, len(self))
+        shortlist_k = min(len(self), k * self.rerank_factor)
+        results = []
+        for query, row in zip(queries, self._approximate_scores(queries)):
+            if shortlist_k < len(row):
+                shortlist = np.argpartition(-row, shortlist_k - 1)[:shortlist_k]
+            else:
+                shortlist = np.arange(len(row))
+            # Posições em ordem crescente: leitura sequencial das linhas mapeadas
+            shortlist.sort()
+            exact = np.asarray(self.vectors[shortlist], dtype=np.float32) @ query
+            order = np.argsort(-exact)[:k]
+            relevance = relevance_from_cosine(exact[order])
+            results.append([
+                (self.document(int(shortlist[i])), float(score))
+                for i, score in zip(order, relevance)
+            ])
+        return results
+
+    def vectors_for(self, ids: List[str]) -> Optional[np.ndarray]:
+        """Linhas da matriz dos chunks com os ids informados; None se algum não existir"""
+        if self._positions is None:
+            self._positions = {doc_id: position for position, doc_id in enumerate(self.ids)}
+        try:
+            return self.vectors[[self._positions[doc_id] for doc_id in ids]]
+        except KeyError:
+            return None
+
+    def document(self, position: int) -> Document:
+        """Documento do chunk na posição informada"""
+        return Document(
+            id=self.ids[position],
+            page_content=self.texts[position],
+            metadata=self.metadatas[position]
+        )
+
+    def save(self, path: str):
+        """Grava o índice em ``path`` (vectors.npy + chunks.json)"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, VECTORS_FILENAME + ".tmp.npy"), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        os.replace(os.path.join(path, VECTORS_FILENAME + ".tmp.npy"), os.path.join(path, VECTORS_FILENAME))
+
+        chunks_path = os.path.join(path, CHUNKS_FILENAME)
+        with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "version": self.version,
+                "ids": self.ids,
+                "texts": self.texts,
+                "metadatas": self.metadatas
+            }, f, ensure_ascii=False)
+        os.replace(chunks_path + ".tmp", chunks_path)
+
+        # Códigos quantizados, para carregar com quantization="int8" ou "binary"
+        codes, scales = quantize_int8(self.vectors)
+        _save_array(os.path.join(path, INT8_CODES_FILENAME), codes)
+        _save_array(os.path.join(path, INT8_SCALES_FILENAME), scales)
+        _save_array(os.path.join(path, BINARY_CODES_FILENAME), quantize_binary(self.vectors))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, quantization: str = "none",
+             rerank_factor: int = 10) -> "NumpyVectorIndex":
+        """
+        Carrega o índice gravado por ``save``
+
+        Com ``mmap=True`` a matriz e os códigos são mapeados somente leitura, e
+        as páginas são compartilhadas entre processos pelo cache do sistema
+        operacional. Sem os arquivos de códigos (índices gravados antes da
+        quantização), os códigos são calculados a partir da matriz.
+        """
+        mmap_mode = "r" if mmap else None
+        vectors = np.load(os.path.join(path, VECTORS_FILENAME), mmap_mode=mmap_mode)
+        with open(os.path.join(path, CHUNKS_FILENAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(vectors, data["ids"], data["texts"], data["metadatas"], data.get("version"))
+
+        codes = scales = None
+        if quantization == "int8" and os.path.exists(os.path.join(path, INT8_CODES_FILENAME)):
+            codes = np.load(os.path.join(path, INT8_CODES_FILENAME), mmap_mode=mmap_mode)
+            scales = np.load(os.path.join(path, INT8_SCALES_FILENAME))
+        elif quantization == "binary" and os.path.exists(os.path.join(path, BINARY_CODES_FILENAME)):
+            codes = np.load(os.path.join(path, BINARY_CODES_FILENAME), mmap_mode=mmap_mode)
+        index.quantize(quantization, codes, scales, rerank_factor)
+        return index
+
+    @classmethod
+    def from_chroma(cls, db_path: str, collection_name: str = "langchain",
+                    version: Optional[str] = None) -> "NumpyVectorIndex":
+        """Exporta todos os chunks de uma base Chroma persistida"""
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=db_path).get_collection(collection_name)
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        if len(vectors):
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        else:
+            vectors = vectors.reshape(0, 0)
+
+        return cls(
+            vectors,
+            list(data["ids"]),
+            list(data["documents"]),
+            [dict(m or {}) for m in data["metadatas"]],
+            version
+        )
+
+
+def _save_array(path: str, array: np.ndarray):
+    """Grava um .npy de forma atômica"""
+    np.save(path + ".tmp.npy", np.ascontiguousarray(array))
+    os.replace(path + ".tmp.npy", path)